@@ -128,6 +128,55 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
 }
 
+# Daily summary maintenance: signals queue dirty (employee, date) marks and
+# the `manage.py drain_summary_marks` worker (geotime-summary-drain.service)
+# drains them. Enable SUMMARY_DRAIN_THREAD to drain in a thread of the web
+# process instead, for development only: every gunicorn worker would start
+# one and they would recompute the same marks.
+SUMMARY_DRAIN_THREAD = env.bool('SUMMARY_DRAIN_THREAD', default=False)
+
+# Cache (in-process by default; point CACHE_URL at a shared cache such as
+# redis:// or dbcache://<table> when running several workers so dashboard
+# invalidation is global; the database table is created by createcachetable)
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
+# Dashboard response cache: role dashboards are cached per scope for up to
+# DASHBOARD_CACHE_TIMEOUT seconds and invalidated by clock events and summary
+# changes. For DASHBOARD_CACHE_STALE_SECONDS after an invalidation, one request
+# rebuilds while the others get the previous response. 0 disables the cache,
+# and so does an in-process CACHE_URL (locmem), which workers cannot share.
+DASHBOARD_CACHE_TIMEOUT = env.int('DASHBOARD_CACHE_TIMEOUT', default=60)
+DASHBOARD_CACHE_STALE_SECONDS = env.int('DASHBOARD_CACHE_STALE_SECONDS', default=5)
+
+# Clock event stream (server-sent events): how long one stream stays open
+# before the client reconnects, and the longest wait between log polls
+CLOCK_EVENT_STREAM_SECONDS = env.int('CLOCK_EVENT_STREAM_SECONDS', default=300)
+CLOCK_EVENT_POLL_SECONDS = env.int('CLOCK_EVENT_POLL_SECONDS', default=2)
+# Streams are served by the ASGI stream server (geotime-stream.service), one
+# database poll per process for all its streams, up to CLOCK_EVENT_MAX_STREAMS.
+# Served from gunicorn (development) each stream holds a worker thread, so at
+# most CLOCK_EVENT_WSGI_MAX_STREAMS per process. Further streams get a 503
+# asking the client to retry after CLOCK_EVENT_BUSY_RETRY_SECONDS.
+CLOCK_EVENT_MAX_STREAMS = env.int('CLOCK_EVENT_MAX_STREAMS', default=2000)
+CLOCK_EVENT_WSGI_MAX_STREAMS = env.int('CLOCK_EVENT_WSGI_MAX_STREAMS', default=2)
+CLOCK_EVENT_BUSY_RETRY_SECONDS = env.int('CLOCK_EVENT_BUSY_RETRY_SECONDS', default=30)
+# Lifetime of the tickets EventSource clients open streams with (?ticket=)
+CLOCK_EVENT_TICKET_SECONDS = env.int('CLOCK_EVENT_TICKET_SECONDS', default=60)
+
+# Offline clock event ingestion: oldest client-stamped event accepted, and
+# how far ahead of the server clock an event may be (device clock skew)
+OFFLINE_INGEST_MAX_AGE_DAYS = env.int('OFFLINE_INGEST_MAX_AGE_DAYS', default=7)
+OFFLINE_INGEST_CLOCK_SKEW_SECONDS = env.int('OFFLINE_INGEST_CLOCK_SKEW_SECONDS', default=120)
+
+# Background report jobs: artifacts are written to REPORT_ARTIFACT_DIR by the
+# `manage.py run_report_jobs` worker (geotime-report-jobs.service). Enable
+# REPORT_JOB_THREAD to run them in a thread of the web process instead, for
+# development only: reports are CPU-bound and would compete with requests.
+REPORT_ARTIFACT_DIR = env.str('REPORT_ARTIFACT_DIR', default=os.path.join(BASE_DIR, 'report_artifacts'))
+REPORT_JOB_THREAD = env.bool('REPORT_JOB_THREAD', default=False)
+
 # CORS Settings
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[
@@ -0,0 +1,103 @@
+"""
+Today's attendance snapshot for a group of employees.
+
+Dashboards used to run a handful of queries per employee (today's entries,
+yesterday's entries, exists/first/last and the filtered time-in/time-out
+lookups). The snapshot loads every employee's entries of today in
+one ordered query and derives present/first/last for all
+of them in a single pass; open sessions come from EmployeePresence.
+"""
+
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .presence import get_presence_map, is_session_active
+from .summary_engine import local_day_bounds
+
+
+def _local_dates(entry):
+    """Local calendar dates an entry counts for (by timestamp and by event_time)"""
+    dates = {timezone.localtime(entry.timestamp).date()}
+    if entry.event_time:
+        dates.add(timezone.localtime(entry.event_time).date())
+    return dates
+
+
+def build_attendance_snapshot(employees, now=None):
+    """
+    Today's attendance for every employee, from two queries.
+
+    An employee is present when they have an entry today (by timestamp or
+    event_time), and active when they are also clocked in with a session
+    started today or yesterday (a night shift not yet closed).
+
+    Args:
+        employees: Iterable or queryset of Employee instances
+        now: Reference time (defaults to timezone.now())
+
+    Returns:
+        dict: employee id -> {
+            'today_entries': list of today's entries ordered by timestamp,
+            'present': bool, 'is_active': bool,
+            'status': 'clocked_in' / 'clocked_out' / 'absent',
+            'first_entry': TimeEntry or None, 'last_entry': TimeEntry or None,
+        }
+    """
+    from .models import TimeEntry
+
+    if now is None:
+        now = timezone.now()
+    today = timezone.localdate(now)
+    window_start = local_day_bounds(today, today)[0]
+
+    employee_ids = [employee.id for employee in employees]
+    entries_by_employee = defaultdict(list)
+    entries = TimeEntry.objects.filter(
+        employee_id__in=employee_ids
+    ).filter(
+        Q(timestamp__gte=window_start) | Q(event_time__gte=window_start)
+    ).order_by('employee_id', 'timestamp', 'id')
+    for entry in entries:
+        entries_by_employee[entry.employee_id].append(entry)
+
+    # Open sessions come from the presence rows rather than the entries
+    presence_map = get_presence_map(employee_ids)
+
+    snapshot = {}
+    for employee_id in employee_ids:
+        today_entries = [
+            entry for entry in entries_by_employee.get(employee_id, [])
+            if today in _local_dates(entry)
+        ]
+
+        if not today_entries:
+            snapshot[employee_id] = {
+                'today_entries': [],
+                'present': False,
+                'is_active': False,
+                'status': 'absent',
+                'first_entry': None,
+                'last_entry': None,
+            }
+            continue
+
+        first_entry = today_entries[0]
+        last_entry = today_entries[-1]
+        is_active = is_session_active(presence_map.get(employee_id), now)
+
+        if first_entry.entry_type == 'time_in':
+            status = 'clocked_in' if last_entry.entry_type == 'time_in' else 'clocked_out'
+        else:
+            status = 'clocked_out'
+
+        snapshot[employee_id] = {
+            'today_entries': today_entries,
+            'present': True,
+            'is_active': is_active,
+            'status': status,
+            'first_entry': first_entry,
+            'last_entry': last_entry,
+        }
+    return snapshot
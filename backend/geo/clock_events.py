@@ -0,0 +1,530 @@
+"""
+Live clock event stream.
+
+Boards used to poll the dashboard and team_today to see people clock in,
+each poll a full recompute. Instead every time entry write appends a compact
+ClockEvent row (in the writer's transaction) and the server-sent events
+endpoint tails that log for the caller's visible employees.
+
+The log lives in the database so every worker process sees every event.
+
+In production the stream is served by a separate ASGI process (uvicorn,
+geotime-stream.service). There a ClockEventHub polls the log once per
+CLOCK_EVENT_POLL_SECONDS for the whole process and fans each event out to
+the open streams it is visible to. A stream is a coroutine waiting on its
+queue, not a thread, so one process serves every board, up to
+CLOCK_EVENT_MAX_STREAMS.
+
+Served from the WSGI workers (development), each stream is a generator
+polling on its own and holding a worker thread. An in-process broker wakes
+it as soon as an event of the same process commits. A process serves at most
+CLOCK_EVENT_WSGI_MAX_STREAMS of them, leaving threads for clock-ins.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Events committed up to this long after a later-numbered event are still
+# delivered (ids are allocated before commit, so they can commit out of order)
+COMMIT_LAG = timedelta(seconds=5)
+HEARTBEAT_SECONDS = 15
+MAX_EVENTS_PER_POLL = 200
+# Frames buffered per hub stream; a client this far behind is disconnected
+# and resumes from its Last-Event-ID
+STREAM_QUEUE_SIZE = 1000
+
+
+class LocalEventBroker:
+    """In-process wake-up for waiting streams; the database stays the source of truth"""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._sequence = 0
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def notify(self):
+        with self._condition:
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def wait(self, sequence, timeout):
+        """Wait until notified after sequence, or timeout. Returns the current sequence."""
+        with self._condition:
+            if self._sequence == sequence:
+                self._condition.wait(timeout)
+            return self._sequence
+
+
+broker = LocalEventBroker()
+
+
+class StreamSlots:
+    """Counts the open streams of this process against a limit"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+
+    def acquire(self, limit):
+        with self._lock:
+            if self.open >= limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+stream_slots = StreamSlots()
+
+
+class _SlotStream:
+    """
+    Iterator over a stream that frees its slot when closed. The response
+    closes it even when it was never iterated (a generator's finally would
+    not run then).
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._stream)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._stream.close()
+            stream_slots.release()
+
+
+def open_clock_event_stream(visibility, last_event_id=None):
+    """
+    stream_clock_events() in one of the process's stream slots.
+
+    Returns:
+        Iterator of SSE frames that frees the slot when closed, or None when
+        CLOCK_EVENT_WSGI_MAX_STREAMS streams are already open
+    """
+    if not stream_slots.acquire(getattr(settings, 'CLOCK_EVENT_WSGI_MAX_STREAMS', 2)):
+        return None
+    return _SlotStream(stream_clock_events(visibility, last_event_id))
+
+
+# Salt of stream tickets: a ticket is only valid for opening a stream
+STREAM_TICKET_SALT = 'geo.clock_events.stream_ticket'
+
+
+def issue_stream_ticket(employee):
+    """
+    Signed ticket to open a clock event stream as employee.
+
+    EventSource cannot send an Authorization header, and a JWT in the URL
+    would be recorded by access logs and proxies as a working credential.
+    The ticket goes in the URL instead: it opens streams only and expires
+    after CLOCK_EVENT_TICKET_SECONDS.
+    """
+    from django.core import signing
+
+    return signing.dumps({'employee_id': employee.id}, salt=STREAM_TICKET_SALT)
+
+
+def read_stream_ticket(ticket):
+    """Employee id of a valid, unexpired stream ticket, else None"""
+    from django.core import signing
+
+    try:
+        data = signing.loads(
+            ticket, salt=STREAM_TICKET_SALT,
+            max_age=getattr(settings, 'CLOCK_EVENT_TICKET_SECONDS', 60)
+        )
+    except signing.BadSignature:
+        return None
+    return data.get('employee_id')
+
+
+def publish_clock_event(entry, presence, change='created'):
+    """
+    Append a clock event for a time entry write. Call inside the writer's
+    transaction; streams see the event once it commits.
+
+    Returns:
+        ClockEvent
+    """
+    from .models import ClockEvent
+
+    department_id = getattr(entry.employee, 'department_id', None)
+    event = ClockEvent.objects.create(
+        employee_id=entry.employee_id,
+        department_id=department_id,
+        time_entry_id=entry.id,
+        change=change,
+        entry_type=entry.entry_type,
+        event_time=entry.event_time,
+        state=presence.state if presence else 'clocked_out',
+    )
+    transaction.on_commit(broker.notify)
+    return event
+
+
+def publish_clock_events(entries):
+    """
+    Append clock events for time entries inserted in bulk (which bypasses the
+    TimeEntry signals). Each event's state is the one its entry leaves the
+    employee in. Call inside the writer's transaction.
+
+    Returns:
+        list: ClockEvent objects
+    """
+    from .models import ClockEvent
+
+    events = ClockEvent.objects.bulk_create([
+        ClockEvent(
+            employee_id=entry.employee_id,
+            department_id=getattr(entry.employee, 'department_id', None),
+            time_entry_id=entry.id,
+            change='created',
+            entry_type=entry.entry_type,
+            event_time=entry.event_time,
+            state='clocked_in' if entry.entry_type == 'time_in' else 'clocked_out',
+        )
+        for entry in entries
+    ])
+    transaction.on_commit(broker.notify)
+    return events
+
+
+def visibility_scope(employee):
+    """
+    The events an employee may see (the same scoping as the time entry
+    endpoints), as ('company', None), ('department', department_id) or
+    ('employees', frozenset of employee ids).
+    """
+    if employee.can_view_company_data():
+        return ('company', None)
+    if employee.can_view_department_data():
+        return ('department', employee.department_id)
+    if employee.can_view_team_data():
+        team_member_ids = set(employee.get_team_members().values_list('id', flat=True))
+        return ('employees', frozenset(team_member_ids | {employee.id}))
+    return ('employees', frozenset([employee.id]))
+
+
+def scope_filter(scope):
+    """Q filter over ClockEvent for a visibility_scope()"""
+    kind, value = scope
+    if kind == 'company':
+        return Q()
+    if kind == 'department':
+        return Q(department_id=value)
+    return Q(employee_id__in=value)
+
+
+def scope_matches(scope, event):
+    """Whether a ClockEvent is visible in a visibility_scope()"""
+    kind, value = scope
+    if kind == 'company':
+        return True
+    if kind == 'department':
+        return event.department_id == value
+    return event.employee_id in value
+
+
+def visibility_filter(employee):
+    """Q filter over ClockEvent for the events an employee may see"""
+    return scope_filter(visibility_scope(employee))
+
+
+def event_payload(event):
+    """Compact JSON-serializable form of a ClockEvent"""
+    return {
+        'id': event.id,
+        'employee_id': event.employee_id,
+        'entry_id': event.time_entry_id,
+        'change': event.change,
+        'entry_type': event.entry_type,
+        'event_time': event.event_time.isoformat(),
+        'state': event.state,
+    }
+
+
+def format_sse(event):
+    """Format a ClockEvent as a server-sent event"""
+    return f"id: {event.id}\nevent: clock\ndata: {json.dumps(event_payload(event))}\n\n"
+
+
+def latest_event_id():
+    """Id of the newest event (a stream without Last-Event-ID starts after it)"""
+    from .models import ClockEvent
+
+    return ClockEvent.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def fetch_events(visibility, after_id, sent_ids):
+    """
+    Events after after_id, plus recent ones that committed out of order and
+    are not in sent_ids.
+
+    Returns:
+        list: ClockEvent objects ordered by id
+    """
+    from .models import ClockEvent
+
+    recent = timezone.now() - COMMIT_LAG
+    events = ClockEvent.objects.filter(visibility).filter(
+        Q(id__gt=after_id) | Q(created_at__gte=recent)
+    ).order_by('id')[:MAX_EVENTS_PER_POLL]
+    return [event for event in events if event.id not in sent_ids]
+
+
+def stream_clock_events(visibility, last_event_id=None, duration=None, poll_seconds=None):
+    """
+    Generator of server-sent events for the visible clock events.
+
+    Args:
+        visibility: Q filter from visibility_filter()
+        last_event_id: Resume after this event id (the Last-Event-ID header)
+        duration: Seconds before the stream ends (the client reconnects)
+        poll_seconds: Longest wait between database polls
+
+    Yields:
+        str: SSE frames (events and heartbeat comments)
+    """
+    if duration is None:
+        duration = getattr(settings, 'CLOCK_EVENT_STREAM_SECONDS', 300)
+    if poll_seconds is None:
+        poll_seconds = getattr(settings, 'CLOCK_EVENT_POLL_SECONDS', 2)
+
+    after_id = last_event_id if last_event_id is not None else latest_event_id()
+    # Ids sent recently, with when they were sent, to skip out-of-order re-reads
+    sent_ids = {}
+    deadline = time.monotonic() + duration
+    last_write = time.monotonic()
+    sequence = broker.sequence
+
+    yield f"retry: {poll_seconds * 1000}\n\n"
+    while time.monotonic() < deadline:
+        try:
+            events = fetch_events(visibility, after_id, sent_ids)
+        except Exception as e:
+            logger.error(f"Error reading clock events: {str(e)}", exc_info=True)
+            events = []
+
+        now = time.monotonic()
+        for event in events:
+            sent_ids[event.id] = now
+            after_id = max(after_id, event.id)
+            yield format_sse(event)
+            last_write = now
+        for event_id, sent_at in list(sent_ids.items()):
+            if now - sent_at > COMMIT_LAG.total_seconds() * 2:
+                del sent_ids[event_id]
+
+        if now - last_write >= HEARTBEAT_SECONDS:
+            yield ": heartbeat\n\n"
+            last_write = now
+
+        sequence = broker.wait(sequence, min(poll_seconds, max(0, deadline - time.monotonic())))
+
+
+def _poll_events(after_id, sent_ids):
+    from django.db import close_old_connections
+
+    # The hub's connection lives as long as the process
+    close_old_connections()
+    return fetch_events(Q(), after_id, sent_ids)
+
+
+def _catch_up_events(scope, after_id, until_id):
+    """Visible events after after_id up to until_id, in pages, ordered by id"""
+    from .models import ClockEvent
+
+    events = []
+    while True:
+        page = list(
+            ClockEvent.objects.filter(scope_filter(scope), id__gt=after_id, id__lte=until_id)
+            .order_by('id')[:MAX_EVENTS_PER_POLL]
+        )
+        events += page
+        if len(page) < MAX_EVENTS_PER_POLL:
+            return events
+        after_id = page[-1].id
+
+
+class _HubStream:
+    def __init__(self, scope):
+        self.scope = scope
+        self.queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, event_id, frame):
+        try:
+            self.queue.put_nowait((event_id, frame))
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class ClockEventHub:
+    """
+    One database poll per process, fanned out to every open stream.
+
+    The poll runs while streams are open; events are matched against each
+    stream's visibility scope in memory.
+    """
+
+    def __init__(self):
+        self._streams = set()
+        self._task = None
+        self._started = None
+        self.after_id = 0
+
+    def __len__(self):
+        return len(self._streams)
+
+    async def subscribe(self, scope, limit):
+        """
+        Open a stream for scope.
+
+        Returns:
+            _HubStream, or None when limit streams are already open or the
+            hub could not start
+        """
+        if len(self._streams) >= limit:
+            return None
+        stream = _HubStream(scope)
+        self._streams.add(stream)
+        # Started before any await so concurrent subscribers share one poll
+        if self._task is None:
+            self._started = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+        await self._started.wait()
+        # The hub failed to start
+        if stream not in self._streams:
+            return None
+        return stream
+
+    def unsubscribe(self, stream):
+        self._streams.discard(stream)
+
+    async def _run(self):
+        poll_seconds = getattr(settings, 'CLOCK_EVENT_POLL_SECONDS', 2)
+        # Ids sent recently, with when they were sent, to skip out-of-order re-reads
+        sent_ids = {}
+        try:
+            try:
+                self.after_id = await sync_to_async(latest_event_id)()
+            except Exception as e:
+                logger.error(f"Error starting the clock event hub: {str(e)}", exc_info=True)
+                self._streams.clear()
+                return
+            finally:
+                self._started.set()
+            while self._streams:
+                try:
+                    events = await sync_to_async(_poll_events)(self.after_id, sent_ids)
+                except Exception as e:
+                    logger.error(f"Error reading clock events: {str(e)}", exc_info=True)
+                    events = []
+
+                now = time.monotonic()
+                for event in events:
+                    sent_ids[event.id] = now
+                    self.after_id = max(self.after_id, event.id)
+                    frame = format_sse(event)
+                    for stream in list(self._streams):
+                        if scope_matches(stream.scope, event):
+                            stream.put(event.id, frame)
+                for event_id, sent_at in list(sent_ids.items()):
+                    if now - sent_at > COMMIT_LAG.total_seconds() * 2:
+                        del sent_ids[event_id]
+
+                # A full page means more events are waiting
+                if len(events) < MAX_EVENTS_PER_POLL:
+                    await asyncio.sleep(poll_seconds)
+        finally:
+            self._task = None
+
+
+hub = ClockEventHub()
+
+
+async def hub_clock_event_stream(scope, last_event_id=None, duration=None):
+    """
+    Async generator of server-sent events for the events visible in scope,
+    fed by the process's ClockEventHub (ASGI).
+
+    Returns:
+        Async iterator of SSE frames, or None when CLOCK_EVENT_MAX_STREAMS
+        streams are already open
+    """
+    if duration is None:
+        duration = getattr(settings, 'CLOCK_EVENT_STREAM_SECONDS', 300)
+    poll_seconds = getattr(settings, 'CLOCK_EVENT_POLL_SECONDS', 2)
+
+    stream = await hub.subscribe(scope, getattr(settings, 'CLOCK_EVENT_MAX_STREAMS', 2000))
+    if stream is None:
+        return None
+    # Events up to here were already fanned out before the stream opened
+    caught_up_to = hub.after_id
+
+    async def frames():
+        try:
+            yield f"retry: {poll_seconds * 1000}\n\n"
+            caught_up = set()
+            if last_event_id is not None and last_event_id < caught_up_to:
+                for event in await sync_to_async(_catch_up_events)(scope, last_event_id, caught_up_to):
+                    caught_up.add(event.id)
+                    yield format_sse(event)
+
+            deadline = time.monotonic() + duration
+            while not stream.overflowed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    event_id, frame = await asyncio.wait_for(
+                        stream.queue.get(), min(HEARTBEAT_SECONDS, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event_id not in caught_up:
+                    yield frame
+        finally:
+            hub.unsubscribe(stream)
+
+    return frames()
+
+
+def prune_clock_events(older_than):
+    """
+    Delete events created before older_than.
+
+    Returns:
+        int: Number of events deleted
+    """
+    from .models import ClockEvent
+
+    deleted, _ = ClockEvent.objects.filter(created_at__lt=older_than).delete()
+    return deleted
@@ -0,0 +1,144 @@
+"""
+Scoped cache for the role dashboards.
+
+Dashboards are polled frequently and each load used to rebuild everything
+(for management, every TimeEntry of the day serialized). Responses are now
+cached per role and scope (an employee, a team leader's departments, a
+department, the company).
+
+Each scope has a generation in the cache: the time it last changed. A cached
+response stores the generations it was built from and is served while they
+are unchanged. Clock events and summary changes bump the generations of the
+employee, their department and the company on commit, so only the affected
+dashboards are rebuilt. For DASHBOARD_CACHE_STALE_SECONDS after a change, one
+request rebuilds while concurrent ones are served the previous response.
+
+The generations only reach every worker through a shared cache (CACHE_URL,
+e.g. redis:// or dbcache://). With a process-local backend the dashboard
+cache is skipped, as other workers would keep serving invalidated responses.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'dashboard'
+
+_local = threading.local()
+
+
+def _generation_key(scope):
+    return f'{CACHE_PREFIX}:gen:{scope}'
+
+
+def employee_scope(employee_id):
+    return f'employee:{employee_id}'
+
+
+def department_scope(department_id):
+    return f'department:{department_id}'
+
+
+COMPANY_SCOPE = 'company'
+
+# Cache backends that are not shared between worker processes
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def dashboard_cache_enabled():
+    """True when dashboards are cached: a timeout is set and the cache is shared"""
+    if getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 0) <= 0:
+        return False
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
+
+
+def cached_dashboard(key, scopes, builder):
+    """
+    Return the cached dashboard data for key, rebuilding it when one of its
+    scopes changed since it was built.
+
+    Args:
+        key: Cache key of the response (role and scope, e.g. 'supervisor:department:3')
+        scopes: Scopes the response depends on
+        builder: Callable returning the dashboard data
+
+    Returns:
+        dict: Dashboard data
+    """
+    if not dashboard_cache_enabled():
+        return builder()
+    timeout = settings.DASHBOARD_CACHE_TIMEOUT
+    stale_seconds = getattr(settings, 'DASHBOARD_CACHE_STALE_SECONDS', 0)
+
+    body_key = f'{CACHE_PREFIX}:body:{key}'
+    lock_key = f'{CACHE_PREFIX}:lock:{key}'
+    generation_keys = [_generation_key(scope) for scope in scopes]
+
+    values = cache.get_many([body_key] + generation_keys)
+    generations = [values.get(generation_key, 0) for generation_key in generation_keys]
+    cached = values.get(body_key)
+
+    if cached is not None:
+        if cached['generations'] == generations:
+            return cached['data']
+        # Changed recently: let one request rebuild, serve the rest stale
+        changed_at = max(generations)
+        if time.time() - changed_at <= stale_seconds and not cache.add(lock_key, 1, stale_seconds):
+            return cached['data']
+
+    # Generations are read before building, so a change made while building
+    # triggers another rebuild on the next load
+    data = builder()
+    cache.set(body_key, {'generations': generations, 'data': data}, timeout)
+    cache.delete(lock_key)
+    return data
+
+
+def invalidate_dashboard_scopes(scopes):
+    """Mark the scopes as changed now; responses built from them are rebuilt"""
+    now = time.time()
+    cache.set_many({_generation_key(scope): now for scope in scopes}, None)
+
+
+def _flush_dashboard_changes():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    if not dashboard_cache_enabled():
+        return
+    try:
+        from .models import Employee
+
+        department_ids = set(
+            Employee.objects.filter(id__in=pending).exclude(
+                department_id__isnull=True
+            ).order_by().values_list('department_id', flat=True)
+        )
+        scopes = {employee_scope(employee_id) for employee_id in pending}
+        scopes |= {department_scope(department_id) for department_id in department_ids}
+        scopes.add(COMPANY_SCOPE)
+        invalidate_dashboard_scopes(scopes)
+    except Exception as e:
+        logger.error(f"Error invalidating dashboard cache: {str(e)}", exc_info=True)
+
+
+def record_dashboard_changes(employee_ids):
+    """
+    Record employees whose dashboard data changed (clock events, summaries).
+    Their employee, department and company scopes are invalidated once per
+    transaction, on commit (immediately in autocommit mode).
+    """
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    _local.pending.update(employee_ids)
+    transaction.on_commit(_flush_dashboard_changes)
@@ -0,0 +1,91 @@
+"""
+Keyset pagination for time entry feeds.
+
+Feeds are ordered by (event_time, id) and paged with a cursor holding the
+last row's (event_time, id), so each page is an index range scan of `limit`
+rows however many entries exist, unlike offset pagination or returning
+every entry of the day.
+"""
+
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_FEED_LIMIT = 50
+MAX_FEED_LIMIT = 200
+
+
+def encode_cursor(entry):
+    """Opaque cursor for the position right after entry"""
+    raw = f"{entry.event_time.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor into (event_time, id).
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        event_time_str, entry_id = raw.rsplit('|', 1)
+        event_time = parse_datetime(event_time_str)
+        entry_id = int(entry_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if event_time is None:
+        raise ValueError('Invalid cursor')
+    return event_time, entry_id
+
+
+def parse_feed_limit(value, default=DEFAULT_FEED_LIMIT):
+    """Parse a limit query parameter, clamped to 1..MAX_FEED_LIMIT"""
+    try:
+        limit = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        limit = default
+    return max(1, min(limit, MAX_FEED_LIMIT))
+
+
+def keyset_page(queryset, cursor=None, limit=DEFAULT_FEED_LIMIT, descending=True):
+    """
+    One page of a time entry queryset in (event_time, id) order.
+
+    Args:
+        queryset: TimeEntry queryset (any filters applied)
+        cursor: Cursor returned with the previous page, or None for the first
+        limit: Page size
+        descending: Newest first (True) or oldest first (False)
+
+    Returns:
+        tuple: (list of entries, next cursor or None when this is the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if descending:
+        queryset = queryset.order_by('-event_time', '-id')
+    else:
+        queryset = queryset.order_by('event_time', 'id')
+
+    if cursor:
+        event_time, entry_id = decode_cursor(cursor)
+        if descending:
+            queryset = queryset.filter(
+                Q(event_time__lt=event_time) | Q(event_time=event_time, id__lt=entry_id)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(event_time__gt=event_time) | Q(event_time=event_time, id__gt=entry_id)
+            )
+
+    # One extra row tells whether there is a next page
+    entries = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1])
+    return entries, next_cursor
@@ -0,0 +1,254 @@
+"""
+Batch geofence validation.
+
+GeofenceValidationAPIView checks one coordinate per request with the scalar
+haversine of Location.calculate_distance_to. Clients replaying points
+recorded offline and the audit of historical entries check many points at
+once, so here the employees and locations are loaded in bulk and the
+distances of every point are computed in one NumPy pass.
+
+Verdicts have the same shape and messages as
+TimeInOutAPIView.validate_geofence.
+"""
+
+import numpy as np
+
+from .geofence_index import EARTH_RADIUS_METERS, get_geofence_index
+
+MAX_BATCH_POINTS = 1000
+AUDIT_CHUNK_SIZE = 50000
+
+
+def haversine_meters(lat1, lng1, lat2, lng2):
+    """
+    Haversine distance in meters between arrays of coordinates (degrees),
+    the same formula as Location.calculate_distance_to.
+    """
+    lat1, lng1, lat2, lng2 = (
+        np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lng1, lat2, lng2)
+    )
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return EARTH_RADIUS_METERS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _optional_float(value):
+    return None if value in (None, '') else float(value)
+
+
+def _optional_int(value):
+    return None if value in (None, '') else int(value)
+
+
+def _parse_point(point):
+    """(employee_id, latitude, longitude, accuracy, location_id); raises ValueError/TypeError"""
+    return (
+        int(point.get('employee_id')),
+        _optional_float(point.get('latitude')),
+        _optional_float(point.get('longitude')),
+        _optional_float(point.get('accuracy')),
+        _optional_int(point.get('location_id')),
+    )
+
+
+def validate_points(points):
+    """
+    Validate many (employee, latitude, longitude, accuracy) points.
+
+    Args:
+        points: List of dicts with employee_id, latitude, longitude and
+                optionally accuracy and location_id (as accepted by
+                GeofenceValidationAPIView)
+
+    Returns:
+        list: One verdict dict per point, in input order, each with the
+              point's employee_id and the keys returned by validate_geofence
+    """
+    from .models import Employee, Location
+
+    results = [None] * len(points)
+    parsed = {}
+    for i, point in enumerate(points):
+        try:
+            parsed[i] = _parse_point(point)
+        except (AttributeError, TypeError, ValueError):
+            results[i] = {'valid': False, 'message': 'Invalid point: employee_id, latitude and longitude must be numbers'}
+
+    employees = Employee.objects.select_related('department__location').in_bulk(
+        {values[0] for values in parsed.values()}
+    )
+    locations = Location.objects.in_bulk(
+        {values[4] for values in parsed.values() if values[4] is not None}
+    )
+    roaming_ids = {
+        employee.id for employee in employees.values() if employee.geofence_mode == 'any_site'
+    }
+    permitted_by_employee = {}
+    if roaming_ids:
+        through = Employee.allowed_locations.through
+        for employee_id, location_id in through.objects.filter(
+            employee_id__in=roaming_ids
+        ).values_list('employee_id', 'location_id'):
+            permitted_by_employee.setdefault(employee_id, set()).add(location_id)
+
+    # Points checked against one known location, computed together below
+    fixed = []
+    for i, (employee_id, latitude, longitude, accuracy, location_id) in parsed.items():
+        employee = employees.get(employee_id)
+        if employee is None:
+            results[i] = {'valid': False, 'message': 'Employee not found'}
+        elif latitude is None or longitude is None:
+            results[i] = {'valid': True, 'message': 'No coordinates provided - geofencing bypassed'}
+        elif not location_id and employee.geofence_mode == 'any_site':
+            results[i] = validate_roaming_point(
+                latitude, longitude, accuracy, permitted_by_employee.get(employee_id)
+            )
+        else:
+            if location_id:
+                target = locations.get(location_id)
+                if target is None:
+                    results[i] = {'valid': False, 'message': 'Specified location not found'}
+                    continue
+            else:
+                target = employee.department.location if employee.department else None
+                if target is None:
+                    results[i] = {'valid': False, 'message': 'No location assigned to employee'}
+                    continue
+            fixed.append((i, latitude, longitude, accuracy, target))
+
+    if fixed:
+        columns = list(zip(*fixed))
+        targets = columns[4]
+        accuracies = np.array(columns[3], dtype=np.float64)
+        min_accuracies = np.array([target.min_accuracy_meters for target in targets], dtype=np.float64)
+        radii = np.array([target.geofence_radius for target in targets], dtype=np.float64)
+        distances = haversine_meters(
+            [float(target.latitude) for target in targets],
+            [float(target.longitude) for target in targets],
+            columns[1], columns[2],
+        )
+        low_accuracy = accuracies > min_accuracies  # NaN (no accuracy) compares False
+        inside = distances <= radii
+
+        for k, (i, _, _, accuracy, target) in enumerate(fixed):
+            if low_accuracy[k]:
+                results[i] = {
+                    'valid': False,
+                    'message': f'Location accuracy is too low: {accuracy:.1f}m (min required: {target.min_accuracy_meters}m)'
+                }
+            else:
+                results[i] = _distance_verdict(target.name, float(distances[k]), target.geofence_radius, bool(inside[k]))
+
+    for i, point in enumerate(points):
+        if i in parsed:
+            results[i]['employee_id'] = parsed[i][0]
+        elif isinstance(point, dict):
+            results[i]['employee_id'] = point.get('employee_id')
+    return results
+
+
+def _distance_verdict(location_name, distance, allowed_radius, inside):
+    if inside:
+        message = f'Within geofence ({distance:.1f}m from {location_name})'
+    else:
+        message = (f'Too far away from allowed area: you are {distance:.1f}m from {location_name}, '
+                   f'but the allowed radius is {allowed_radius}m.')
+    return {
+        'valid': inside,
+        'message': message,
+        'distance': round(distance, 1),
+        'allowed_radius': allowed_radius,
+        'location_name': location_name
+    }
+
+
+def public_verdict(verdict):
+    """The verdict without the resolved Location instance, for JSON responses"""
+    return {key: value for key, value in verdict.items() if key != 'location'}
+
+
+def validate_roaming_point(latitude, longitude, accuracy, permitted=None):
+    """
+    Verdict for a roaming employee's point, against the site resolved by the
+    geofence index. Valid verdicts include its location_id and the Location
+    itself as location (see public_verdict), so callers need no second lookup
+    in an index that may have been rebuilt since.
+
+    Args:
+        latitude, longitude, accuracy: The point
+        permitted: Set of the employee's allowed location ids, or None for all sites
+    """
+    resolved = get_geofence_index().resolve(latitude, longitude, permitted)
+    site = resolved['site']
+    if site is None:
+        return {'valid': False, 'message': 'No permitted site configured for employee'}
+    if accuracy is not None and accuracy > site.min_accuracy:
+        return {
+            'valid': False,
+            'message': f'Location accuracy is too low: {accuracy:.1f}m (min required: {site.min_accuracy}m)'
+        }
+    verdict = _distance_verdict(site.name, resolved['distance'], site.radius, resolved['inside'])
+    verdict['location_id'] = site.id
+    verdict['location'] = site.location
+    return verdict
+
+
+def audit_time_entries(queryset, chunk_size=AUDIT_CHUNK_SIZE):
+    """
+    Re-validate recorded time entries against the location they were recorded at.
+
+    Only coordinates and location columns are read (no model instances) and
+    distances are computed per chunk in one NumPy pass.
+
+    Args:
+        queryset: TimeEntry queryset to audit (entries without coordinates or
+                  location are skipped)
+        chunk_size: Rows per NumPy pass
+
+    Returns:
+        dict: {'checked': int, 'outside': int, 'low_accuracy': int,
+               'flagged': list of dicts with entry_id, employee_id, event_time,
+               distance, allowed_radius, accuracy and reason}
+    """
+    rows = queryset.filter(
+        latitude__isnull=False, longitude__isnull=False, location__isnull=False
+    ).order_by('id').values_list(
+        'id', 'employee_id', 'event_time', 'latitude', 'longitude', 'accuracy',
+        'location__latitude', 'location__longitude',
+        'location__geofence_radius', 'location__min_accuracy_meters',
+    )
+
+    summary = {'checked': 0, 'outside': 0, 'low_accuracy': 0, 'flagged': []}
+    chunk = []
+    for row in rows.iterator(chunk_size=chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            _audit_chunk(chunk, summary)
+            chunk = []
+    if chunk:
+        _audit_chunk(chunk, summary)
+    return summary
+
+
+def _audit_chunk(chunk, summary):
+    (entry_ids, employee_ids, event_times, latitudes, longitudes, accuracies,
+     location_latitudes, location_longitudes, radii, min_accuracies) = zip(*chunk)
+
+    accuracies = np.array(accuracies, dtype=np.float64)
+    radii = np.array(radii, dtype=np.float64)
+    distances = haversine_meters(location_latitudes, location_longitudes, latitudes, longitudes)
+    outside = distances > radii
+    low_accuracy = accuracies > np.array(min_accuracies, dtype=np.float64)
+
+    summary['checked'] += len(chunk)
+    summary['outside'] += int(outside.sum())
+    summary['low_accuracy'] += int(low_accuracy.sum())
+    for k in np.flatnonzero(outside | low_accuracy):
+        summary['flagged'].append({
+            'entry_id': entry_ids[k],
+            'employee_id': employee_ids[k],
+            'event_time': event_times[k],
+            'distance': round(float(distances[k]), 1),
+            'allowed_radius': int(radii[k]),
+            'accuracy': None if np.isnan(accuracies[k]) else float(accuracies[k]),
+            'reason': 'outside_geofence' if outside[k] else 'low_accuracy',
+        })
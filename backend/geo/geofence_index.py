@@ -0,0 +1,206 @@
+"""
+Spatial index over Location rows for multi-site geofence resolution.
+
+Roaming staff may clock in at any permitted site. Scanning every Location and
+recomputing radians from Decimals per check does not scale with the number of
+sites, so each worker keeps a KD-tree of the sites as points on the unit
+sphere (precomputed from the radians once). Euclidean (chord) distance between
+unit vectors orders points exactly like great-circle distance, so nearest and
+radius queries are ordinary KD-tree searches: O(log n) on average, with the
+splitting planes acting as the bounding-box prefilter.
+
+The index is rebuilt lazily after any Location change. Its version is read
+from the database (the latest Location.updated_at and the number of rows, so
+saves, additions and deletes all change it) at most every
+VERSION_CHECK_SECONDS, so every worker picks up changes made through any
+other; saves and deletes in the worker itself drop its index immediately.
+"""
+
+import math
+import threading
+import time
+
+EARTH_RADIUS_METERS = 6371000
+VERSION_CHECK_SECONDS = 5
+
+
+def _unit_vector(lat_rad, lon_rad):
+    cos_lat = math.cos(lat_rad)
+    return (cos_lat * math.cos(lon_rad), cos_lat * math.sin(lon_rad), math.sin(lat_rad))
+
+
+def _chord_to_meters(chord):
+    return EARTH_RADIUS_METERS * 2 * math.asin(min(1.0, chord / 2))
+
+
+def _meters_to_chord(meters):
+    return 2 * math.sin(min(math.pi, meters / EARTH_RADIUS_METERS) / 2)
+
+
+class GeofenceSite:
+    """A Location in the index, with its coordinates precomputed"""
+
+    __slots__ = ('location', 'id', 'name', 'radius', 'min_accuracy', 'point')
+
+    def __init__(self, location):
+        self.location = location
+        self.id = location.id
+        self.name = location.name
+        self.radius = location.geofence_radius
+        self.min_accuracy = location.min_accuracy_meters
+        self.point = _unit_vector(math.radians(float(location.latitude)), math.radians(float(location.longitude)))
+
+
+class _Node:
+    __slots__ = ('site', 'axis', 'left', 'right')
+
+    def __init__(self, site, axis, left, right):
+        self.site = site
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+
+def _build(sites, depth=0):
+    if not sites:
+        return None
+    axis = depth % 3
+    sites.sort(key=lambda site: site.point[axis])
+    middle = len(sites) // 2
+    return _Node(
+        sites[middle], axis,
+        _build(sites[:middle], depth + 1),
+        _build(sites[middle + 1:], depth + 1)
+    )
+
+
+class GeofenceIndex:
+    """KD-tree over geofence sites"""
+
+    def __init__(self, locations):
+        self.sites = [GeofenceSite(location) for location in locations]
+        self.sites_by_id = {site.id: site for site in self.sites}
+        self.max_radius = max((site.radius for site in self.sites), default=0)
+        self._root = _build(list(self.sites))
+
+    def __len__(self):
+        return len(self.sites)
+
+    def nearest(self, lat, lng, permitted=None):
+        """
+        Nearest site, optionally among permitted site ids.
+
+        Returns:
+            tuple: (GeofenceSite, distance in meters), or (None, None) when
+                   there is no (permitted) site
+        """
+        target = _unit_vector(math.radians(float(lat)), math.radians(float(lng)))
+        best = [None, float('inf')]
+
+        def search(node):
+            if node is None:
+                return
+            point = node.site.point
+            squared = sum((point[i] - target[i]) ** 2 for i in range(3))
+            if squared < best[1] and (permitted is None or node.site.id in permitted):
+                best[0], best[1] = node.site, squared
+            offset = target[node.axis] - point[node.axis]
+            near, far = (node.left, node.right) if offset < 0 else (node.right, node.left)
+            search(near)
+            # The other side can only hold a closer site if the splitting
+            # plane is closer than the best match so far
+            if offset * offset < best[1]:
+                search(far)
+
+        search(self._root)
+        if best[0] is None:
+            return None, None
+        return best[0], _chord_to_meters(math.sqrt(best[1]))
+
+    def within(self, lat, lng, meters, permitted=None):
+        """
+        Sites within the given distance, nearest first.
+
+        Returns:
+            list: (GeofenceSite, distance in meters) tuples
+        """
+        target = _unit_vector(math.radians(float(lat)), math.radians(float(lng)))
+        limit = _meters_to_chord(meters) ** 2
+        found = []
+
+        def search(node):
+            if node is None:
+                return
+            point = node.site.point
+            squared = sum((point[i] - target[i]) ** 2 for i in range(3))
+            if squared <= limit and (permitted is None or node.site.id in permitted):
+                found.append((node.site, _chord_to_meters(math.sqrt(squared))))
+            offset = target[node.axis] - point[node.axis]
+            if offset <= 0 or offset * offset <= limit:
+                search(node.left)
+            if offset >= 0 or offset * offset <= limit:
+                search(node.right)
+
+        search(self._root)
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def resolve(self, lat, lng, permitted=None):
+        """
+        Resolve the site an employee is at: the nearest permitted site whose
+        geofence contains the point, else the nearest permitted site.
+
+        Args:
+            lat, lng: Coordinates to resolve
+            permitted: Set of permitted site ids, or None for all sites
+
+        Returns:
+            dict: {'site': GeofenceSite or None, 'distance': meters or None,
+                   'inside': whether the point is inside the site's geofence}
+        """
+        for site, distance in self.within(lat, lng, self.max_radius, permitted):
+            if distance <= site.radius:
+                return {'site': site, 'distance': distance, 'inside': True}
+        site, distance = self.nearest(lat, lng, permitted)
+        return {'site': site, 'distance': distance, 'inside': False}
+
+
+_lock = threading.Lock()
+_index = None
+_index_version = None
+_checked_at = 0
+
+
+def _locations_version():
+    from django.db.models import Count, Max
+    from .models import Location
+
+    version = Location.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    return version['updated'], version['count']
+
+
+def get_geofence_index():
+    """
+    The worker's GeofenceIndex, rebuilt when Location rows changed since it
+    was built (checked against the database at most every VERSION_CHECK_SECONDS).
+    """
+    global _index, _index_version, _checked_at
+    from .models import Location
+
+    with _lock:
+        now = time.monotonic()
+        if _index is not None and now - _checked_at < VERSION_CHECK_SECONDS:
+            return _index
+        version = _locations_version()
+        if _index is None or _index_version != version:
+            _index = GeofenceIndex(Location.objects.all())
+            _index_version = version
+        _checked_at = now
+        return _index
+
+
+def invalidate_geofence_index():
+    """Drop this worker's index (called when Location rows change); others notice the new version"""
+    global _index
+    with _lock:
+        _index = None
@@ -0,0 +1,201 @@
+"""
+Company-wide HR report (DailyTimeSummaryViewSet.hr_report).
+
+Totals are computed with aggregate and GROUP BY queries (or read from the
+rollups) and employee details are served in keyset pages by employee id, so
+every call is a bounded number of queries however many employees there are.
+Report jobs use the same functions to write the whole report to disk.
+"""
+
+from django.db.models import Count, Q, Sum
+
+from .feeds import DEFAULT_FEED_LIMIT
+
+# Roles allowed to read the company-wide report
+HR_REPORT_ROLES = ('hr', 'management', 'supervisor', 'it_support')
+
+
+def hr_report_querysets(start_date, end_date, department_id=None, employee_id=None, status_filter=None):
+    """
+    The report's base querysets.
+
+    Returns:
+        tuple: (DailyTimeSummary queryset, active Employee queryset)
+    """
+    from .models import DailyTimeSummary, Employee
+
+    # Base queryset for daily summaries
+    summaries_queryset = DailyTimeSummary.objects.filter(
+        date__gte=start_date,
+        date__lte=end_date
+    )
+
+    # Apply filters
+    if department_id:
+        summaries_queryset = summaries_queryset.filter(employee__department_id=department_id)
+
+    if employee_id:
+        summaries_queryset = summaries_queryset.filter(employee__employee_id=employee_id)
+
+    if status_filter:
+        summaries_queryset = summaries_queryset.filter(status=status_filter)
+
+    # Get all employees for summary
+    employees_queryset = Employee.objects.filter(employment_status='active')
+    if department_id:
+        employees_queryset = employees_queryset.filter(department_id=department_id)
+    return summaries_queryset, employees_queryset
+
+
+def hr_report_totals(start_date, end_date, department_id=None, employee_id=None, status_filter=None):
+    """
+    Company and department totals of the HR report.
+
+    Returns:
+        dict: {'company_summary': dict, 'departments': list}
+    """
+    from .models import Department, Employee
+
+    summaries_queryset, employees_queryset = hr_report_querysets(
+        start_date, end_date, department_id, employee_id, status_filter
+    )
+
+    # Calculate company-wide statistics
+    total_employees = employees_queryset.count()
+    if status_filter:
+        # One aggregate query over the filtered summaries
+        company_totals = summaries_queryset.aggregate(
+            present=Count('id', filter=Q(status='present')),
+            absent=Count('id', filter=Q(status='absent')),
+            late=Count('id', filter=Q(status='late')),
+            overtime=Sum('overtime_hours')
+        )
+        total_present = company_totals['present']
+        total_absent = company_totals['absent']
+        total_late = company_totals['late']
+        total_overtime = float(company_totals['overtime'] or 0)
+    else:
+        # Unfiltered by status, the totals come from the period rollups
+        from .rollups import get_period_totals, sum_totals
+        summary_employees = Employee.objects.all()
+        if department_id:
+            summary_employees = summary_employees.filter(department_id=department_id)
+        if employee_id:
+            summary_employees = summary_employees.filter(employee_id=employee_id)
+        company_totals = sum_totals(
+            get_period_totals(summary_employees.values_list('id', flat=True), start_date, end_date)
+        )
+        total_present = company_totals['present_days']
+        total_absent = company_totals['absent_days']
+        total_late = company_totals['late_days']
+        total_overtime = float(company_totals['total_overtime_hours'])
+
+    # Get department summary
+    departments = Department.objects.all()
+    department_summary = []
+    employee_counts = dict(
+        employees_queryset.order_by().values('department_id')
+        .annotate(count=Count('id')).values_list('department_id', 'count')
+    )
+    if status_filter or employee_id:
+        # One GROUP BY over the filtered summaries
+        dept_counts = {
+            row['employee__department_id']: row
+            for row in summaries_queryset.order_by().values('employee__department_id').annotate(
+                present_count=Count('id', filter=Q(status='present')),
+                absent_count=Count('id', filter=Q(status='absent'))
+            )
+        }
+        for dept in departments:
+            counts = dept_counts.get(dept.id)
+            department_summary.append({
+                'id': dept.id,
+                'name': dept.name,
+                'employee_count': employee_counts.get(dept.id, 0),
+                'present_count': counts['present_count'] if counts else 0,
+                'absent_count': counts['absent_count'] if counts else 0
+            })
+    else:
+        # One grouped read of the department daily stats
+        from .rollups import get_department_stats
+        dept_stats = get_department_stats(
+            start_date, end_date, [department_id] if department_id else None
+        )
+        for dept in departments:
+            stats = dept_stats.get(dept.id)
+            department_summary.append({
+                'id': dept.id,
+                'name': dept.name,
+                'employee_count': employee_counts.get(dept.id, 0),
+                'present_count': stats['present_count'] if stats else 0,
+                'absent_count': stats['absent_count'] if stats else 0
+            })
+
+    return {
+        'company_summary': {
+            'total_employees': total_employees,
+            'total_present': total_present,
+            'total_absent': total_absent,
+            'total_late': total_late,
+            'total_overtime_hours': round(total_overtime, 2)
+        },
+        'departments': department_summary
+    }
+
+
+def hr_report_employee_page(start_date, end_date, department_id=None, employee_id=None, status_filter=None,
+                            after_id=0, limit=DEFAULT_FEED_LIMIT):
+    """
+    One keyset page of the HR report's employee details (by employee id).
+
+    Returns:
+        tuple: (list of employee dicts with their daily summaries,
+                cursor of the next page or None on the last page)
+    """
+    summaries_queryset, employees_queryset = hr_report_querysets(
+        start_date, end_date, department_id, employee_id, status_filter
+    )
+
+    # Employee details, one keyset page at a time (by employee id):
+    # the page's employees and then all their summaries in one query
+    page_queryset = employees_queryset.select_related('user', 'department')
+    if employee_id:
+        page_queryset = page_queryset.filter(employee_id=employee_id)
+    page = list(page_queryset.filter(id__gt=after_id).order_by('id')[:limit + 1])
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = str(page[-1].id)
+
+    summaries_by_employee = {}
+    for summary in summaries_queryset.filter(employee__in=page).order_by('employee_id', '-date'):
+        summaries_by_employee.setdefault(summary.employee_id, []).append(summary)
+
+    employees_data = []
+    for emp in page:
+        emp_summaries_data = []
+
+        for summary in summaries_by_employee.get(emp.id, []):
+            emp_summaries_data.append({
+                'id': summary.id,
+                'date': summary.date.isoformat(),
+                'time_in': summary.time_in.isoformat() if summary.time_in else None,
+                'time_out': summary.time_out.isoformat() if summary.time_out else None,
+                'scheduled_time_in': summary.scheduled_time_in.isoformat() if summary.scheduled_time_in else None,
+                'scheduled_time_out': summary.scheduled_time_out.isoformat() if summary.scheduled_time_out else None,
+                'status': summary.status,
+                'billed_hours': str(summary.billed_hours),
+                'late_minutes': summary.late_minutes,
+                'undertime_minutes': summary.undertime_minutes,
+                'night_differential_hours': str(summary.night_differential_hours),
+                'overtime_hours': str(summary.overtime_hours)
+            })
+
+        employees_data.append({
+            'employee_id': emp.employee_id,
+            'name': emp.full_name,
+            'department': emp.department.name if emp.department else None,
+            'daily_summaries': emp_summaries_data
+        })
+
+    return employees_data, next_cursor
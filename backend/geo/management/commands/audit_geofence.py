@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from geo.geofence_batch import audit_time_entries
+from geo.models import TimeEntry
+
+
+class Command(BaseCommand):
+    help = 'Re-validate recorded time entries against the geofence of their location'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=str,
+            help='First date to audit (YYYY-MM-DD, default: 30 days ago)',
+        )
+        parser.add_argument(
+            '--end-date',
+            type=str,
+            help='Last date to audit (YYYY-MM-DD, default: today)',
+        )
+        parser.add_argument(
+            '--employee',
+            type=int,
+            help='Only audit this employee (id)',
+        )
+        parser.add_argument(
+            '--show',
+            type=int,
+            default=20,
+            help='Number of flagged entries to list (default: 20)',
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            start_date = (datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+                          if options['start_date'] else today - timedelta(days=30))
+            end_date = (datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+                        if options['end_date'] else today)
+        except ValueError:
+            raise CommandError('Invalid date format. Use YYYY-MM-DD')
+
+        entries = TimeEntry.objects.filter(
+            event_time__date__gte=start_date, event_time__date__lte=end_date
+        )
+        if options['employee']:
+            entries = entries.filter(employee_id=options['employee'])
+
+        started = timezone.now()
+        summary = audit_time_entries(entries)
+        elapsed = (timezone.now() - started).total_seconds()
+
+        self.stdout.write(
+            f"Checked {summary['checked']} entries from {start_date} to {end_date} in {elapsed:.1f}s: "
+            f"{summary['outside']} outside their geofence, {summary['low_accuracy']} with low accuracy"
+        )
+        for flagged in summary['flagged'][:options['show']]:
+            self.stdout.write(
+                f"  entry {flagged['entry_id']} (employee {flagged['employee_id']}, "
+                f"{timezone.localtime(flagged['event_time']):%Y-%m-%d %H:%M}): {flagged['reason']}, "
+                f"{flagged['distance']}m (radius {flagged['allowed_radius']}m, accuracy {flagged['accuracy']})"
+            )
+        if summary['flagged']:
+            self.stdout.write(self.style.WARNING(f"{len(summary['flagged'])} entries flagged"))
+        else:
+            self.stdout.write(self.style.SUCCESS('No entries flagged'))
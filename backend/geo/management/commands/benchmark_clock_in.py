@@ -0,0 +1,209 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time as dt_time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from geo.models import Location, Department, Employee, EmployeeSchedule
+from geo.views import TimeInOutAPIView
+
+# Published latency target of the clock-in/out fast path
+P99_TARGET_MS = 50
+
+BENCHMARK_PREFIX = 'bench-clock-'
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark TimeInOutAPIView.post (clock in/out) against temporary employees. '
+        f'Target: p99 under {P99_TARGET_MS} ms with no summary work in-request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employees',
+            type=int,
+            default=50,
+            help='Number of temporary employees (default: 50)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Number of clock in/out requests (default: 500)',
+        )
+        parser.add_argument(
+            '--p99-target-ms',
+            type=float,
+            default=P99_TARGET_MS,
+            help=f'p99 latency target in milliseconds (default: {P99_TARGET_MS})',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Threads sending requests at once, each over its own employees (default: 1)',
+        )
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Fail when the target is missed or summaries are touched in-request',
+        )
+        parser.add_argument(
+            '--allow-live-db',
+            action='store_true',
+            help='Run even though DEBUG is off (creates and deletes temporary rows in the configured database)',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['allow_live_db']:
+            raise CommandError(
+                'The benchmark creates and deletes temporary employees in the configured database '
+                f"({connection.settings_dict['NAME']}). Run it with DEBUG on, or pass --allow-live-db."
+            )
+        concurrency = options['concurrency']
+        if concurrency < 1 or concurrency > options['employees']:
+            raise CommandError('--concurrency must be between 1 and --employees')
+
+        location, department, employees = self._create_fixtures(options['employees'])
+        try:
+            started = time.perf_counter()
+            latencies, query_counts, summary_queries = self._run(
+                location, employees, options['requests'], concurrency
+            )
+            elapsed = time.perf_counter() - started
+        finally:
+            self._delete_fixtures(department, location)
+
+        latencies.sort()
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+        p50, p95, p99 = percentile(0.50), percentile(0.95), percentile(0.99)
+        self.stdout.write(
+            f'{len(latencies)} requests over {len(employees)} employees: '
+            f'p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms, max {latencies[-1]:.1f} ms'
+        )
+        self.stdout.write(
+            f'Concurrency {concurrency}: {len(latencies) / elapsed:.1f} requests/s'
+        )
+        self.stdout.write(
+            f'Queries per request: avg {sum(query_counts) / len(query_counts):.1f}, max {max(query_counts)}; '
+            f'summary queries in-request: {summary_queries}'
+        )
+
+        target = options['p99_target_ms']
+        if p99 <= target and summary_queries == 0:
+            self.stdout.write(self.style.SUCCESS(f'Within target (p99 < {target:g} ms, no summary work)'))
+        else:
+            message = f'Target missed: p99 {p99:.1f} ms (target {target:g} ms), {summary_queries} summary queries'
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+
+    def _create_fixtures(self, count):
+        location = Location.objects.create(
+            name=f'{BENCHMARK_PREFIX}location',
+            latitude=Decimal('14.5995'),
+            longitude=Decimal('120.9842'),
+            geofence_radius=100,
+        )
+        department = Department.objects.create(
+            name=f'{BENCHMARK_PREFIX}department',
+            code=f'BENCH{int(time.time()) % 100000}',
+            location=location,
+        )
+        today = timezone.localdate()
+        employees = []
+        for i in range(count):
+            user = User.objects.create(username=f'{BENCHMARK_PREFIX}{i}')
+            employee = Employee.objects.create(
+                user=user,
+                employee_id=f'{BENCHMARK_PREFIX}{i}',
+                department=department,
+                hire_date=today,
+            )
+            EmployeeSchedule.objects.create(
+                employee=employee,
+                date=today,
+                scheduled_time_in=dt_time(0, 0),
+                scheduled_time_out=dt_time(23, 59),
+            )
+            employees.append(employee)
+        return location, department, employees
+
+    def _delete_fixtures(self, department, location):
+        User.objects.filter(username__startswith=BENCHMARK_PREFIX).delete()
+        department.delete()
+        location.delete()
+
+    def _run(self, location, employees, total_requests, concurrency):
+        """
+        Send total_requests split over concurrency threads. Each thread owns
+        a disjoint share of the employees, so their in/out order stays valid.
+        """
+        if concurrency == 1:
+            return self._run_thread(0, location, employees, total_requests)
+
+        def run_share(k):
+            try:
+                count = total_requests // concurrency + (k < total_requests % concurrency)
+                return self._run_thread(k, location, employees[k::concurrency], count)
+            finally:
+                # Each thread opened its own database connection
+                connection.close()
+
+        latencies, query_counts, summary_queries = [], [], 0
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for share in executor.map(run_share, range(concurrency)):
+                latencies += share[0]
+                query_counts += share[1]
+                summary_queries += share[2]
+        return latencies, query_counts, summary_queries
+
+    def _run_thread(self, seed, location, employees, total_requests):
+        rnd = random.Random(seed)
+        factory = APIRequestFactory()
+        view = TimeInOutAPIView.as_view()
+        clocked_in = set()
+        latencies = []
+        query_counts = []
+        summary_queries = 0
+
+        for _ in range(total_requests):
+            employee = rnd.choice(employees)
+            action = 'time-out' if employee.id in clocked_in else 'time-in'
+            request = factory.post(f'/api/{action}/', {
+                'employee_id': employee.id,
+                'latitude': float(location.latitude),
+                'longitude': float(location.longitude),
+                'accuracy': 10,
+            }, format='json')
+            force_authenticate(request, user=employee.user)
+
+            queries = []
+
+            def record(execute, sql, params, many, context):
+                queries.append(sql)
+                return execute(sql, params, many, context)
+
+            with connection.execute_wrapper(record):
+                started = time.perf_counter()
+                response = view(request, action=action)
+                latencies.append((time.perf_counter() - started) * 1000)
+
+            if response.status_code != 201:
+                raise CommandError(f'{action} failed for {employee.employee_id}: {response.data}')
+            clocked_in ^= {employee.id}
+            query_counts.append(len(queries))
+            summary_queries += sum(1 for sql in queries if 'geo_dailytimesummary' in sql)
+
+        return latencies, query_counts, summary_queries
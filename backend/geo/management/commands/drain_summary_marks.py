@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand
+from geo.summary_queue import drain_dirty_marks, DRAIN_BATCH_SIZE, DRAIN_INTERVAL_SECONDS
+
+
+class Command(BaseCommand):
+    help = 'Recompute DailyTimeSummary rows for queued dirty marks (one recompute per employee/date)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue once and exit instead of polling',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=DRAIN_INTERVAL_SECONDS,
+            help=f'Seconds to wait between polls when the queue is empty (default: {DRAIN_INTERVAL_SECONDS})',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DRAIN_BATCH_SIZE,
+            help=f'Marks recomputed per batch (default: {DRAIN_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        
+        while True:
+            try:
+                result = drain_dirty_marks(batch_size)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error draining dirty marks: {e}'))
+                result = {'marks': 0}
+            
+            if result['marks']:
+                self.stdout.write(
+                    f"Drained {result['marks']} marks - "
+                    f"Created: {result['created']}, "
+                    f"Updated: {result['updated']}, "
+                    f"Skipped: {result['skipped']}, "
+                    f"Unchanged: {result['unchanged']}"
+                )
+            
+            # Keep going while full batches come back
+            if result['marks'] >= batch_size:
+                continue
+            
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS('Dirty mark queue drained'))
+                return
+            
+            time.sleep(options['interval'])
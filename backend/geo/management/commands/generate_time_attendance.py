@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import date, timedelta
 from geo.models import Employee
 from geo.utils import generate_daily_summaries_for_period, get_employee_time_attendance_report
+from geo.summary_workers import run_sharded, rebuild_shard
 
 
 class Command(BaseCommand):
@@ -34,6 +35,12 @@ class Command(BaseCommand):
             action='store_true',
             help='Generate and display a sample TIME ATTENDANCE report',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes; employees are sharded across them (default: 1)',
+        )
 
     def handle(self, *args, **options):
         # Determine date range
@@ -78,20 +85,42 @@ class Command(BaseCommand):
         total_created = 0
         total_updated = 0
         total_skipped = 0
+        total_unchanged = 0
         
-        for employee in employees:
-            self.stdout.write(f"Processing {employee.full_name}...")
+        if options['workers'] > 1:
+            result = run_sharded(
+                rebuild_shard,
+                [employee.id for employee in employees],
+                options['workers'],
+                task_args=(start_date, end_date),
+                progress=self._report_progress,
+            )
+            total_created = result.get('created', 0)
+            total_updated = result.get('updated', 0)
+            total_skipped = result.get('skipped', 0)
+            total_unchanged = result.get('unchanged', 0)
+            for error in result['errors']:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Shard {error['shard']} failed ({len(error['employee_ids'])} employees): {error['error']}"
+                    )
+                )
+        else:
+            for employee in employees:
+                self.stdout.write(f"Processing {employee.full_name}...")
             
-            result = generate_daily_summaries_for_period(start_date, end_date, employee)
-            total_created += result['total_created']
-            total_updated += result['total_updated']
-            total_skipped += result['total_skipped']
+                result = generate_daily_summaries_for_period(start_date, end_date, employee)
+                total_created += result['total_created']
+                total_updated += result['total_updated']
+                total_skipped += result['total_skipped']
+                total_unchanged += result['total_unchanged']
             
-            self.stdout.write(
-                f"  Created: {result['total_created']}, "
-                f"Updated: {result['total_updated']}, "
-                f"Skipped: {result['total_skipped']}"
-            )
+                self.stdout.write(
+                    f"  Created: {result['total_created']}, "
+                    f"Updated: {result['total_updated']}, "
+                    f"Skipped: {result['total_skipped']}, "
+                    f"Unchanged: {result['total_unchanged']}"
+                )
 
         # Summary
         self.stdout.write(
@@ -100,7 +129,8 @@ class Command(BaseCommand):
                 f"Total Created: {total_created}\n"
                 f"Total Updated: {total_updated}\n"
                 f"Total Skipped: {total_skipped}\n"
-                f"Total Processed: {total_created + total_updated + total_skipped}"
+                f"Total Unchanged: {total_unchanged}\n"
+                f"Total Processed: {total_created + total_updated + total_skipped + total_unchanged}"
             )
         )
 
@@ -140,4 +170,15 @@ class Command(BaseCommand):
             self.stdout.write(f"Total BH: {report['summary']['total_billed_hours']}")
             self.stdout.write(f"Total LT: {report['summary']['total_late_minutes']}")
             self.stdout.write(f"Total UT: {report['summary']['total_undertime_minutes']}")
-            self.stdout.write(f"Total ND: {report['summary']['total_night_differential']}") 
\ No newline at end of file
+            self.stdout.write(f"Total ND: {report['summary']['total_night_differential']}") 
+
+    def _report_progress(self, done, total, totals, error):
+        """Print aggregate progress as each shard finishes"""
+        status = self.style.ERROR('failed') if error else 'done'
+        self.stdout.write(
+            f"  Shard {done}/{total} {status} - "
+            f"Created: {totals.get('created', 0)}, "
+            f"Updated: {totals.get('updated', 0)}, "
+            f"Skipped: {totals.get('skipped', 0)}, "
+            f"Unchanged: {totals.get('unchanged', 0)}"
+        )
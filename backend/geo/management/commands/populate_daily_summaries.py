@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import datetime, timedelta
 from geo.models import Employee, DailyTimeSummary, EmployeeSchedule
 from geo.utils import calculate_daily_summary, generate_daily_summaries_for_period
+from geo.summary_workers import run_sharded, rebuild_shard
 
 
 class Command(BaseCommand):
@@ -27,7 +28,13 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force-update',
             action='store_true',
-            help='Force update existing summaries',
+            help='Recompute every summary, even those whose time entries and schedule are unchanged',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes; employees are sharded across them (default: 1)',
         )
 
     def handle(self, *args, **options):
@@ -62,30 +69,55 @@ class Command(BaseCommand):
         total_processed = 0
         total_created = 0
         total_updated = 0
+        total_unchanged = 0
         
-        for employee in employees:
-            self.stdout.write(f'Processing employee: {employee.full_name}')
-            
-            # Generate summaries for the period
-            summaries = generate_daily_summaries_for_period(employee, start_date, end_date)
-            
-            for summary in summaries:
-                total_processed += 1
-                
-                if summary.pk:  # Existing summary
-                    if options['force_update']:
-                        summary.calculate_metrics()
-                        total_updated += 1
-                else:  # New summary
-                    total_created += 1
-            
-            self.stdout.write(
-                f'  - Processed {len(summaries)} days for {employee.full_name}'
+        if options['workers'] > 1:
+            result = run_sharded(
+                rebuild_shard,
+                list(employees.values_list('id', flat=True)),
+                options['workers'],
+                task_args=(start_date, end_date, options['force_update']),
+                progress=self._report_progress,
             )
+            total_created = result.get('created', 0)
+            total_updated = result.get('updated', 0)
+            total_unchanged = result.get('unchanged', 0)
+            total_processed = result.get('total_processed', 0)
+            for error in result['errors']:
+                self.stdout.write(
+                    self.style.ERROR(
+                        f"Shard {error['shard']} failed ({len(error['employee_ids'])} employees): {error['error']}"
+                    )
+                )
+        else:
+            for employee in employees:
+                self.stdout.write(f'Processing employee: {employee.full_name}')
+                
+                # Generate summaries for the period
+                result = generate_daily_summaries_for_period(
+                    start_date, end_date, employee, force=options['force_update']
+                )
+                
+                total_processed += result['total_processed']
+                total_created += result['total_created']
+                total_updated += result['total_updated']
+                total_unchanged += result['total_unchanged']
+                
+                self.stdout.write(
+                    f'  - Processed {result["total_processed"]} days for {employee.full_name}'
+                )
         
         self.stdout.write(
             self.style.SUCCESS(
                 f'Completed! Processed {total_processed} summaries '
-                f'({total_created} created, {total_updated} updated)'
+                f'({total_created} created, {total_updated} updated, {total_unchanged} unchanged)'
             )
-        ) 
\ No newline at end of file
+        )
+
+    def _report_progress(self, done, total, totals, error):
+        """Print aggregate progress as each shard finishes"""
+        status = self.style.ERROR('failed') if error else 'done'
+        self.stdout.write(
+            f'  Shard {done}/{total} {status} - '
+            f'{totals.get("total_processed", 0)} summaries processed'
+        )
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from geo.clock_events import prune_clock_events
+
+
+class Command(BaseCommand):
+    help = 'Delete old clock events from the live stream log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=2,
+            help='Keep events from the last N days (default: 2)',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = prune_clock_events(cutoff)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} clock events older than {cutoff}'))
@@ -0,0 +1,22 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from geo.report_jobs import prune_report_jobs
+
+
+class Command(BaseCommand):
+    help = 'Delete finished report jobs and their artifacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Keep jobs created in the last N days (default: 7)',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        deleted = prune_report_jobs(cutoff)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} report jobs older than {cutoff}'))
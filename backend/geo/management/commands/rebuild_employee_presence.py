@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from geo.models import Employee
+from geo.presence import rebuild_presence
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the EmployeePresence rows (current clock state) from time entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employee-id',
+            type=str,
+            help='Specific employee ID to rebuild (optional)',
+        )
+
+    def handle(self, *args, **options):
+        employees = Employee.objects.all()
+        if options['employee_id']:
+            employees = employees.filter(employee_id=options['employee_id'])
+
+        employee_ids = list(employees.values_list('id', flat=True))
+        if not employee_ids:
+            self.stdout.write(self.style.WARNING('No employees found'))
+            return
+
+        self.stdout.write(f'Rebuilding presence for {len(employee_ids)} employees')
+        clocked_in = 0
+        for employee_id in employee_ids:
+            presence = rebuild_presence(employee_id)
+            if presence and presence.is_clocked_in:
+                clocked_in += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Presence rebuilt: {clocked_in} of {len(employee_ids)} employees currently clocked in'
+        ))
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from geo.models import DailyTimeSummary
+from geo.rollups import refresh_period_rollups, refresh_department_daily_stats, period_start
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the summary rollup tables from existing daily time summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=str,
+            help='Start date (YYYY-MM-DD) (default: January 1 of the current year)',
+        )
+        parser.add_argument(
+            '--end-date',
+            type=str,
+            help='End date (YYYY-MM-DD) (default: today)',
+        )
+        parser.add_argument(
+            '--employee-id',
+            type=str,
+            help='Specific employee ID to rebuild (optional)',
+        )
+
+    def handle(self, *args, **options):
+        if options['end_date']:
+            end_date = datetime.strptime(options['end_date'], '%Y-%m-%d').date()
+        else:
+            end_date = timezone.now().date()
+
+        if options['start_date']:
+            start_date = datetime.strptime(options['start_date'], '%Y-%m-%d').date()
+        else:
+            start_date = end_date.replace(month=1, day=1)
+
+        summaries = DailyTimeSummary.objects.filter(date__range=[start_date, end_date])
+        if options['employee_id']:
+            summaries = summaries.filter(employee__employee_id=options['employee_id'])
+        employee_ids = list(summaries.order_by().values_list('employee_id', flat=True).distinct())
+
+        if not employee_ids:
+            self.stdout.write(self.style.WARNING('No daily summaries found in the specified date range'))
+            return
+
+        # One key per week and per month is enough: each key refreshes the
+        # week and the month that contain it
+        days = set()
+        current = start_date
+        while current <= end_date:
+            days.add(current)
+            days.add(period_start('week', current))
+            current += timedelta(days=7)
+        days.add(end_date)
+        days |= {period_start('month', day) for day in days}
+
+        self.stdout.write(
+            f'Rebuilding rollups for {len(employee_ids)} employees from {start_date} to {end_date}'
+        )
+        refresh_period_rollups((employee_id, day) for employee_id in employee_ids for day in days)
+        
+        # Department stats cover every employee of a date, so whole dates are rebuilt
+        all_dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        self.stdout.write(f'Rebuilding department daily stats for {len(all_dates)} dates')
+        refresh_department_daily_stats(all_dates)
+
+        self.stdout.write(self.style.SUCCESS('Summary rollups rebuilt'))
@@ -1,7 +1,10 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from geo.models import DailyTimeSummary
+from geo.summary_engine import recalculate_summaries
+from geo.summary_workers import run_sharded, recalculate_shard
 from datetime import datetime, timedelta
+from decimal import Decimal
 
 
 class Command(BaseCommand):
@@ -26,7 +29,13 @@ class Command(BaseCommand):
         parser.add_argument(
             '--force',
             action='store_true',
-            help='Force recalculation even if no changes detected',
+            help='Recalculate every summary, even those whose inputs and calculation version are unchanged',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of worker processes; employees are sharded across them (default: 1)',
         )
 
     def handle(self, *args, **options):
@@ -56,7 +65,13 @@ class Command(BaseCommand):
             time_out__isnull=False
         )
         
-        summaries = list(summaries_query)
+        if options['workers'] > 1:
+            self._recalculate_in_parallel(
+                summaries_query, start_date, end_date, options['workers'], options['force']
+            )
+            return
+        
+        summaries = list(summaries_query.select_related('employee', 'employee__user'))
         
         if not summaries:
             self.stdout.write(
@@ -64,64 +79,83 @@ class Command(BaseCommand):
             )
             return
         
+        # Store old values for comparison
+        old_values = {
+            summary.pk: (
+                summary.billed_hours,
+                summary.late_minutes,
+                summary.undertime_minutes,
+                summary.night_differential_hours,
+                summary.overtime_hours,
+            )
+            for summary in summaries
+        }
+        
+        # Rebuild rows whose inputs changed, recompute the metrics of rows from
+        # an older calculation version and skip the rest
+        try:
+            result = recalculate_summaries(summaries, force=options['force'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'  ✗ Error recalculating summaries: {e}'))
+            return
+        
+        unchanged_count = result['unchanged']
+        error_count = result['skipped']
+        rebuilt_keys = set(result['rebuilt'])
+        processed = result['recalculated'] + list(
+            DailyTimeSummary.objects.filter(
+                pk__in=[s.pk for s in summaries if (s.employee_id, s.date) in rebuilt_keys]
+            ).select_related('employee', 'employee__user')
+        )
+        if not processed:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'All {unchanged_count} summaries are up to date (use --force to recalculate anyway)'
+                )
+            )
+            return
+        
         self.stdout.write(
             self.style.SUCCESS(
-                f'Found {len(summaries)} summaries to recalculate from {start_date} to {end_date}'
+                f'Recalculated {len(processed)} summaries from {start_date} to {end_date}'
+                f' ({len(rebuilt_keys)} rebuilt from changed inputs, {unchanged_count} unchanged skipped)'
             )
         )
         
-        # Recalculate each summary
         recalculated_count = 0
-        error_count = 0
-        
-        for summary in summaries:
-            try:
-                self.stdout.write(f'Recalculating {summary.employee.full_name} - {summary.date}')
-                
-                # Store old values for comparison
-                old_bh = summary.billed_hours
-                old_late = summary.late_minutes
-                old_ut = summary.undertime_minutes
-                old_nd = summary.night_differential_hours
-                old_ot = summary.overtime_hours
-                
-                # Force recalculation
-                summary.calculate_metrics()
-                summary.save()
-                
-                # Check if values changed
-                changed = (
-                    old_bh != summary.billed_hours or
-                    old_late != summary.late_minutes or
-                    old_ut != summary.undertime_minutes or
-                    old_nd != summary.night_differential_hours or
-                    old_ot != summary.overtime_hours
-                )
-                
-                if changed or options['force']:
-                    self.stdout.write(
-                        self.style.SUCCESS(
-                            f'  ✓ Recalculated: BH={summary.billed_hours:.2f}h, '
-                            f'Late={summary.late_minutes}m, UT={summary.undertime_minutes}m, '
-                            f'ND={summary.night_differential_hours:.2f}h, OT={summary.overtime_hours:.2f}h'
-                        )
-                    )
-                    recalculated_count += 1
-                else:
-                    self.stdout.write('  - No changes detected')
-                    
-            except Exception as e:
+        for summary in processed:
+            self.stdout.write(f'Recalculating {summary.employee.full_name} - {summary.date}')
+            
+            old_bh, old_late, old_ut, old_nd, old_ot = old_values[summary.pk]
+            
+            # Check if values changed
+            changed = (
+                old_bh != round(Decimal(str(summary.billed_hours)), 2) or
+                old_late != summary.late_minutes or
+                old_ut != summary.undertime_minutes or
+                old_nd != round(Decimal(str(summary.night_differential_hours)), 2) or
+                old_ot != round(Decimal(str(summary.overtime_hours)), 2)
+            )
+            
+            if changed or options['force']:
                 self.stdout.write(
-                    self.style.ERROR(f'  ✗ Error recalculating {summary}: {e}')
+                    self.style.SUCCESS(
+                        f'  ✓ Recalculated: BH={summary.billed_hours:.2f}h, '
+                        f'Late={summary.late_minutes}m, UT={summary.undertime_minutes}m, '
+                        f'ND={summary.night_differential_hours:.2f}h, OT={summary.overtime_hours:.2f}h'
+                    )
                 )
-                error_count += 1
+                recalculated_count += 1
+            else:
+                self.stdout.write('  - No changes detected')
         
         # Summary
         self.stdout.write('\n' + '='*60)
         self.stdout.write(
             self.style.SUCCESS(
                 f'Recalculation complete!\n'
-                f'  - Total processed: {len(summaries)}\n'
+                f'  - Total processed: {len(processed)}\n'
+                f'  - Unchanged (skipped): {unchanged_count}\n'
                 f'  - Successfully recalculated: {recalculated_count}\n'
                 f'  - Errors: {error_count}'
             )
@@ -135,3 +169,53 @@ class Command(BaseCommand):
                     'All existing summaries have been recalculated with the new logic.'
                 )
             )
+
+    def _recalculate_in_parallel(self, summaries_query, start_date, end_date, workers, force=False):
+        """Shard the recalculation by employee across worker processes"""
+        employee_ids = list(summaries_query.order_by().values_list('employee_id', flat=True).distinct())
+        
+        if not employee_ids:
+            self.stdout.write(
+                self.style.WARNING('No summaries found to recalculate in the specified date range')
+            )
+            return
+        
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Recalculating summaries of {len(employee_ids)} employees from {start_date} '
+                f'to {end_date} with {workers} workers'
+            )
+        )
+        
+        def report_progress(done, total, totals, error):
+            status = self.style.ERROR('failed') if error else 'done'
+            self.stdout.write(
+                f'  Shard {done}/{total} {status} - {totals.get("processed", 0)} summaries recalculated'
+            )
+        
+        result = run_sharded(
+            recalculate_shard,
+            employee_ids,
+            workers,
+            task_args=(start_date, end_date, force),
+            progress=report_progress,
+        )
+        
+        for error in result['errors']:
+            self.stdout.write(
+                self.style.ERROR(
+                    f"  ✗ Shard {error['shard']} failed ({len(error['employee_ids'])} employees): {error['error']}"
+                )
+            )
+        
+        self.stdout.write('\n' + '='*60)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Recalculation complete!\n'
+                f'  - Total processed: {result.get("processed", 0)}\n'
+                f'  - Rebuilt from changed inputs: {result.get("rebuilt", 0)}\n'
+                f'  - Unchanged (skipped): {result.get("unchanged", 0)}\n'
+                f'  - Shards: {result["shards"]}\n'
+                f'  - Failed shards: {len(result["errors"])}'
+            )
+        )
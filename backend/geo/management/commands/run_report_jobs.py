@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from geo.report_jobs import claim_next_job, requeue_stale_jobs, run_report_job, WORKER_INTERVAL_SECONDS
+
+
+class Command(BaseCommand):
+    help = 'Generate queued background report jobs to disk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the queued jobs once and exit instead of polling',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=WORKER_INTERVAL_SECONDS,
+            help=f'Seconds to wait between polls when the queue is empty (default: {WORKER_INTERVAL_SECONDS})',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                requeued = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale report jobs'))
+                job = claim_next_job()
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error claiming report job: {e}'))
+                job = None
+            
+            if job is not None:
+                job = run_report_job(job)
+                if job.status == 'completed':
+                    self.stdout.write(
+                        f'Report job {job.id} ({job.report_type}) - '
+                        f'Rows: {job.rows_written}, Size: {job.artifact_size} bytes'
+                    )
+                elif job.status == 'failed':
+                    self.stdout.write(self.style.ERROR(f'Report job {job.id} failed: {job.error}'))
+                else:
+                    self.stdout.write(self.style.WARNING(f'Report job {job.id} was taken over by another worker'))
+                continue
+            
+            if options['once']:
+                self.stdout.write(self.style.SUCCESS('Report job queue is empty'))
+                return
+            
+            time.sleep(options['interval'])
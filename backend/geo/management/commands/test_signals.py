@@ -100,9 +100,10 @@ class Command(BaseCommand):
             )
             self.stdout.write(f'Created new time entry with ID: {time_entry.id}')
 
-        # Wait a moment for the signal to process
-        import time
-        time.sleep(1)
+        # The signal only queues a dirty mark; drain it so the summary is recomputed now
+        from geo.summary_queue import drain_all
+        drain_result = drain_all()
+        self.stdout.write(f'Drained {drain_result["marks"]} dirty marks')
 
         # Check if the daily summary was updated
         try:
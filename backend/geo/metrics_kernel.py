@@ -0,0 +1,246 @@
+"""
+Vectorized DailyTimeSummary metrics kernel.
+
+A side-effect-free, column-oriented version of
+``DailyTimeSummary.calculate_comprehensive_status`` and
+``DailyTimeSummary.calculate_metrics``. Every input is a NumPy array with one
+element per summary row (scalars are broadcast), times are minute offsets from
+midnight of the summary date (fractions allowed, NaN when missing) and nothing
+is printed, saved or flagged. Rows that the model methods would send to
+``_flag_emergency_timeout`` are reported back so the caller can decide.
+
+Internally times are converted to integer microseconds so that truncation to
+whole minutes matches the ``int(timedelta.total_seconds() / 60)`` arithmetic of
+the model methods exactly.
+"""
+
+from datetime import datetime, time, timedelta
+
+import numpy as np
+
+# Status codes returned by compute_status (index into this tuple)
+STATUS_CODES = (
+    'present',
+    'late',
+    'undertime',
+    'incomplete',
+    'scheduled',
+    'absent',
+    'not_yet_scheduled',
+    'shift_void',
+)
+STATUS_INDEX = {name: code for code, name in enumerate(STATUS_CODES)}
+
+MINUTE_US = 60 * 1000000
+DAY_US = 1440 * MINUTE_US
+ND_START_US = 22 * 60 * MINUTE_US          # 10:00 PM
+ND_END_US = (24 + 6) * 60 * MINUTE_US      # 6:00 AM next day
+EARLY_ARRIVAL_ROUNDING_MINUTES = 60
+LATE_DEPARTURE_ROUNDING_MINUTES = 120
+MIN_SHIFT_MINUTES = 15
+FLEXIBLE_BREAK_MIN_MINUTES = 240
+
+
+def time_to_minutes(value):
+    """Convert a datetime.time to a minute offset from midnight (NaN for None)"""
+    if value is None:
+        return np.nan
+    return (value.hour * 60 + value.minute + value.second / 60.0
+            + value.microsecond / 60000000.0)
+
+
+def minutes_to_time(minutes):
+    """Convert a minute offset (possibly past midnight) back to a datetime.time"""
+    us = int(round(minutes * 60000000)) % DAY_US
+    return (datetime.combine(datetime.min.date(), time.min) + timedelta(microseconds=us)).time()
+
+
+def _to_us(minutes):
+    """Minute offsets (float, NaN allowed) -> (int64 microseconds, present mask)"""
+    minutes = np.asarray(minutes, dtype=np.float64)
+    present = ~np.isnan(minutes)
+    us = np.rint(np.where(present, minutes, 0.0) * MINUTE_US).astype(np.int64)
+    return us, present
+
+
+def _whole_minutes(delta_us):
+    """Truncate a microsecond difference toward zero to whole minutes"""
+    return np.sign(delta_us) * (np.abs(delta_us) // MINUTE_US)
+
+
+def _broadcast(value, n, dtype):
+    return np.broadcast_to(np.asarray(value, dtype=dtype), (n,))
+
+
+def compute_status(sched_in, sched_out, time_in, time_out, day_offset):
+    """
+    Vectorized calculate_comprehensive_status.
+
+    Args:
+        sched_in, sched_out: Scheduled times as minute offsets (NaN if missing)
+        time_in, time_out: Actual times as minute offsets (NaN if missing)
+        day_offset: Summary date minus today, in days (>0 future, 0 today)
+
+    Returns:
+        tuple: (status_codes int8 array, shift_void bool array)
+    """
+    si, has_si = _to_us(sched_in)
+    so, has_so = _to_us(sched_out)
+    ti, has_ti = _to_us(time_in)
+    to, has_to = _to_us(time_out)
+    n = si.shape[0]
+    day_offset = _broadcast(day_offset, n, np.int64)
+
+    has_sched = has_si & has_so
+    has_pair = has_ti & has_to
+
+    to_adj = np.where(to < ti, to + DAY_US, to)
+    so_adj = np.where(so < si, so + DAY_US, so)
+    duration = _whole_minutes(to_adj - ti)
+
+    worked_status = np.select(
+        [duration < MIN_SHIFT_MINUTES, ti > si, to_adj < so_adj],
+        [STATUS_INDEX['incomplete'], STATUS_INDEX['late'], STATUS_INDEX['undertime']],
+        default=STATUS_INDEX['present'],
+    )
+
+    status = np.select(
+        [
+            ~has_sched,
+            day_offset > 0,
+            (day_offset == 0) & ~has_ti,
+            has_pair,
+            has_ti,
+        ],
+        [
+            STATUS_INDEX['not_yet_scheduled'],
+            STATUS_INDEX['scheduled'],
+            STATUS_INDEX['absent'],
+            worked_status,
+            STATUS_INDEX['incomplete'],
+        ],
+        default=STATUS_INDEX['absent'],
+    )
+
+    # Shift void: both time in and time out before the scheduled start
+    shift_void = has_pair & has_si & (ti < si) & (to < si)
+    status = np.where(shift_void, STATUS_INDEX['shift_void'], status)
+
+    return status.astype(np.int8), shift_void
+
+
+def compute_metrics(sched_in, sched_out, time_in, time_out, flexible_break_minutes,
+                    grace_period_minutes, daily_work_minutes, overtime_threshold_hours):
+    """
+    Vectorized calculate_metrics (dayshift and nightshift rules).
+
+    Args:
+        sched_in, sched_out: Scheduled times as minute offsets (NaN if missing)
+        time_in, time_out: Actual times as minute offsets (NaN if missing)
+        flexible_break_minutes: int(employee.flexible_break_hours * 60)
+        grace_period_minutes: employee.grace_period_minutes
+        daily_work_minutes: int(employee.daily_work_hours * 60)
+        overtime_threshold_hours: employee.overtime_threshold_hours
+
+    Returns:
+        dict of arrays:
+            computed: rows that have both time in and time out (metrics apply)
+            has_late: rows with a scheduled time in (late_minutes applies)
+            billed_hours, late_minutes, undertime_minutes,
+            night_differential_hours, overtime_hours
+            emergency_minutes: time-out difference to flag (NaN if none)
+            emergency_time_out: effective time out for flagged rows (minutes)
+    """
+    si, has_si = _to_us(sched_in)
+    so, has_so = _to_us(sched_out)
+    ti, has_ti = _to_us(time_in)
+    to, has_to = _to_us(time_out)
+    n = si.shape[0]
+    flex = _broadcast(flexible_break_minutes, n, np.int64)
+    grace = _broadcast(grace_period_minutes, n, np.int64)
+    daily_work = _broadcast(daily_work_minutes, n, np.int64)
+    ot_threshold = _broadcast(overtime_threshold_hours, n, np.float64)
+
+    computed = has_ti & has_to
+    has_sched = has_si & has_so
+
+    sched_start = si
+    sched_end = np.where(so < si, so + DAY_US, so)
+    start = ti
+    end = np.where(to < ti, to + DAY_US, to)
+
+    dayshift = has_sched & (sched_end > sched_start)
+    nightshift = has_sched & ~dayshift
+
+    # Dayshift: early arrival within an hour rounds up to the scheduled start
+    early_minutes = _whole_minutes(sched_start - start)
+    round_up = dayshift & (early_minutes > 0) & (early_minutes <= EARLY_ARRIVAL_ROUNDING_MINUTES)
+    eff_start = np.where(round_up, sched_start, start)
+
+    # Dayshift: late departure rounds down, unless far enough to be an emergency
+    late_out = dayshift & (end > sched_end)
+    late_out_minutes = _whole_minutes(end - sched_end)
+    late_emergency = late_out & (late_out_minutes > LATE_DEPARTURE_ROUNDING_MINUTES)
+    early_emergency = dayshift & ~late_out & (end < sched_start)
+    eff_end = np.where(late_out & ~late_emergency, sched_end, end)
+
+    emergency_minutes = np.full(n, np.nan)
+    emergency_minutes = np.where(late_emergency & computed, late_out_minutes, emergency_minutes)
+    emergency_minutes = np.where(
+        early_emergency & computed, -_whole_minutes(sched_start - end), emergency_minutes
+    )
+
+    # Nightshift: clamp to the scheduled window
+    eff_start = np.where(nightshift, np.maximum(eff_start, sched_start), eff_start)
+    eff_end = np.where(nightshift, np.minimum(eff_end, sched_end), eff_end)
+
+    bh_minutes = _whole_minutes(eff_end - eff_start)
+    flexible_work = np.where(
+        bh_minutes < FLEXIBLE_BREAK_MIN_MINUTES,
+        bh_minutes,
+        bh_minutes - np.minimum(flex, bh_minutes),
+    )
+    work_minutes = np.where(dayshift, bh_minutes, flexible_work)
+    billed_hours = np.maximum(0, work_minutes) / 60
+
+    # Late (raw times, no overnight adjustment) with grace period
+    raw_late = _whole_minutes(ti - si)
+    late_minutes = np.where(raw_late <= grace, 0, raw_late - grace)
+
+    # Undertime against scheduled work (or the employee's daily work hours)
+    effective_bh_minutes = np.trunc(billed_hours * 60).astype(np.int64)
+    scheduled_duration = _whole_minutes(sched_end - sched_start)
+    scheduled_work = np.where(
+        scheduled_duration >= FLEXIBLE_BREAK_MIN_MINUTES,
+        scheduled_duration - flex,
+        scheduled_duration,
+    )
+    undertime_minutes = np.where(
+        has_sched,
+        np.maximum(0, scheduled_work - effective_bh_minutes),
+        np.maximum(0, daily_work - effective_bh_minutes),
+    )
+
+    overtime_hours = np.where(billed_hours > ot_threshold, billed_hours - ot_threshold, 0.0)
+
+    # Night differential on original actual times, 22:00-06:00, minus one hour
+    nd_start = np.where(start < ND_START_US, ND_START_US, start)
+    nd_end = np.where(has_so, np.minimum(end, sched_end), np.minimum(end, ND_END_US))
+    nd_minutes = _whole_minutes(nd_end - nd_start)
+    night_differential_hours = np.where(
+        nd_end > nd_start, np.maximum(0, nd_minutes / 60 - 1.0), 0.0
+    )
+
+    emergency_time_out = np.where(np.isnan(emergency_minutes), np.nan, eff_end / MINUTE_US)
+
+    return {
+        'computed': computed,
+        'has_late': computed & has_si,
+        'billed_hours': billed_hours,
+        'late_minutes': late_minutes.astype(np.int64),
+        'undertime_minutes': undertime_minutes.astype(np.int64),
+        'night_differential_hours': night_differential_hours,
+        'overtime_hours': overtime_hours,
+        'emergency_minutes': emergency_minutes,
+        'emergency_time_out': emergency_time_out,
+    }
@@ -40,7 +40,6 @@ class Location(models.Model):
         Returns distance in meters.
         """
         import math
-        print(f"Geofence center: ({self.latitude}, {self.longitude}), User: ({lat}, {lng}), Radius: {self.geofence_radius}")
         
         # Convert to radians
         lat1, lon1 = math.radians(float(self.latitude)), math.radians(float(self.longitude))
@@ -136,6 +135,17 @@ class Employee(models.Model):
     require_schedule_compliance = models.BooleanField(default=True,
                                                      help_text='Whether this employee must comply with scheduled times')
     
+    # Geofencing
+    GEOFENCE_MODE_CHOICES = [
+        ('assigned', 'Assigned Location'),
+        ('any_site', 'Any Permitted Site'),
+    ]
+    geofence_mode = models.CharField(max_length=20, choices=GEOFENCE_MODE_CHOICES, default='assigned',
+                                     help_text='Assigned: the department location (or the requested one). '
+                                               'Any site: the nearest permitted site (roaming staff).')
+    allowed_locations = models.ManyToManyField(Location, blank=True, related_name='roaming_employees',
+                                               help_text='Sites a roaming employee may clock in at (empty: all sites)')
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -217,11 +227,24 @@ class TimeEntry(models.Model):
         User, on_delete=models.SET_NULL, null=True, blank=True, related_name='updated_time_entries',
         help_text='User who last updated or corrected this entry'
     )
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True,
+                                       help_text='Client-generated key of an event replayed from an offline queue')
     
     class Meta:
         ordering = ['-timestamp']
         verbose_name = 'Time Entry'
         verbose_name_plural = 'Time Entries'
+        indexes = [
+            # Keyset feeds page by (event_time, id)
+            models.Index(fields=['event_time', 'id']),
+            # Exports and reports read timestamp ranges, per employee or overall
+            models.Index(fields=['employee', 'timestamp']),
+            models.Index(fields=['timestamp', 'id']),
+        ]
+        constraints = [
+            # A replayed offline event is stored at most once
+            models.UniqueConstraint(fields=['employee', 'idempotency_key'], name='unique_time_entry_idempotency_key'),
+        ]
     
     def __str__(self):
         return f"{self.employee.full_name} - {self.entry_type} at {self.timestamp}"
@@ -726,6 +749,12 @@ class DailyTimeSummary(models.Model):
     calculated_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Change detection for the batch summary engine
+    calc_version = models.PositiveSmallIntegerField(default=0,
+                                                    help_text='Calculation version the metrics were computed with')
+    input_fingerprint = models.CharField(max_length=40, blank=True, default='',
+                                         help_text='Hash of the entries, schedule and policy the row was built from')
+    
     class Meta:
         unique_together = ['employee', 'date']
         ordering = ['-date', 'employee__user__first_name']
@@ -739,6 +768,15 @@ class DailyTimeSummary(models.Model):
     def __str__(self):
         return f"{self.employee.full_name} - {self.date} ({self.status})"
     
+    def save(self, *args, **kwargs):
+        """Override save to drop the engine fingerprint of rows written outside the engine"""
+        # The row may no longer match the inputs it was fingerprinted from,
+        # so the next engine pass must recompute it
+        self.input_fingerprint = ''
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'input_fingerprint'}
+        super().save(*args, **kwargs)
+    
     @property
     def day_of_week(self):
         """Get day of week name"""
@@ -1517,3 +1555,226 @@ class EmergencyTimeOutRequest(models.Model):
         
         self.save()
         print(f"EMERGENCY POLICY: Time entries deleted for {self.employee.full_name} on {self.date}")
+
+
+class SummaryDirtyMark(models.Model):
+    """An (employee, date) whose DailyTimeSummary needs to be recomputed"""
+    
+    # No DB constraint: signals may mark a day while the employee itself is
+    # being deleted; the drain simply drops marks for missing employees
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='summary_dirty_marks',
+                                 db_constraint=False)
+    date = models.DateField()
+    marked_at = models.DateTimeField(default=timezone.now, help_text='When the summary was last marked dirty')
+    
+    class Meta:
+        ordering = ['marked_at']
+        verbose_name = 'Summary Dirty Mark'
+        verbose_name_plural = 'Summary Dirty Marks'
+        unique_together = ['employee', 'date']
+        indexes = [
+            models.Index(fields=['marked_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.date} (dirty since {self.marked_at})"
+
+
+class EmployeePeriodRollup(models.Model):
+    """Per-employee weekly/monthly totals of DailyTimeSummary rows, kept up to date incrementally"""
+    
+    PERIOD_TYPE_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='period_rollups')
+    period_type = models.CharField(max_length=10, choices=PERIOD_TYPE_CHOICES)
+    period_start = models.DateField(help_text='Monday of the week or first day of the month')
+    
+    # Day counts
+    days_recorded = models.IntegerField(default=0, help_text='Daily summaries in the period')
+    days_worked = models.IntegerField(default=0, help_text='Days with present, late or half day status')
+    present_days = models.IntegerField(default=0)
+    late_days = models.IntegerField(default=0)
+    absent_days = models.IntegerField(default=0)
+    
+    # Metrics summed over the worked days
+    billed_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    late_minutes = models.IntegerField(default=0)
+    undertime_minutes = models.IntegerField(default=0)
+    night_differential_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    overtime_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    
+    # Overtime summed over every day of the period
+    total_overtime_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-period_start', 'employee']
+        verbose_name = 'Employee Period Rollup'
+        verbose_name_plural = 'Employee Period Rollups'
+        unique_together = ['employee', 'period_type', 'period_start']
+        indexes = [
+            models.Index(fields=['period_type', 'period_start']),
+        ]
+    
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.get_period_type_display()} of {self.period_start}"
+
+
+class DepartmentDailyStats(models.Model):
+    """Per-department daily status counts and summed hours, derived from DailyTimeSummary rows"""
+    
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+    
+    # Day counts
+    summaries_count = models.IntegerField(default=0, help_text='Daily summaries of the department for the date')
+    clocked_in_count = models.IntegerField(default=0, help_text='Employees with a time in')
+    present_count = models.IntegerField(default=0)
+    late_count = models.IntegerField(default=0)
+    undertime_count = models.IntegerField(default=0)
+    absent_count = models.IntegerField(default=0)
+    
+    # Summed metrics
+    billed_hours = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    late_minutes = models.IntegerField(default=0)
+    undertime_minutes = models.IntegerField(default=0)
+    night_differential_hours = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    overtime_hours = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-date', 'department']
+        verbose_name = 'Department Daily Stats'
+        verbose_name_plural = 'Department Daily Stats'
+        unique_together = ['department', 'date']
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.department.name} - {self.date}"
+
+
+class EmployeePresence(models.Model):
+    """Current clock state of an employee, maintained on every time entry write"""
+    
+    STATE_CHOICES = [
+        ('clocked_in', 'Clocked In'),
+        ('clocked_out', 'Clocked Out'),
+    ]
+    
+    employee = models.OneToOneField(Employee, on_delete=models.CASCADE, related_name='presence')
+    state = models.CharField(max_length=12, choices=STATE_CHOICES, default='clocked_out')
+    
+    # Open session (set while clocked in)
+    open_time_in = models.ForeignKey(TimeEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    session_started_at = models.DateTimeField(null=True, blank=True, help_text='Timestamp of the open time in')
+    
+    # Latest entry by timestamp
+    last_entry = models.ForeignKey(TimeEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_entry_at = models.DateTimeField(null=True, blank=True, help_text='Timestamp of the latest entry')
+    last_event_time = models.DateTimeField(null=True, blank=True, help_text='Event time of the latest entry')
+    
+    # First entry of the local day of the latest entry
+    today_date = models.DateField(null=True, blank=True)
+    first_entry_today = models.ForeignKey(TimeEntry, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['employee']
+        verbose_name = 'Employee Presence'
+        verbose_name_plural = 'Employee Presence'
+        indexes = [
+            models.Index(fields=['state', 'session_started_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.employee.full_name} - {self.get_state_display()}"
+    
+    @property
+    def is_clocked_in(self):
+        """Check if the employee has an open session"""
+        return self.state == 'clocked_in'
+
+
+class ClockEvent(models.Model):
+    """Append-only log of clock events, read by the live event stream"""
+    
+    CHANGE_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+    ]
+    
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='clock_events')
+    # Denormalized for scoping the stream without a join
+    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    time_entry_id = models.BigIntegerField(help_text='TimeEntry the event was recorded for')
+    change = models.CharField(max_length=10, choices=CHANGE_CHOICES, default='created')
+    entry_type = models.CharField(max_length=10, choices=TimeEntry.ENTRY_TYPE_CHOICES)
+    event_time = models.DateTimeField()
+    state = models.CharField(max_length=12, choices=EmployeePresence.STATE_CHOICES,
+                             help_text='Presence state after the event')
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Clock Event'
+        verbose_name_plural = 'Clock Events'
+    
+    def __str__(self):
+        return f"{self.employee_id} {self.entry_type} at {self.event_time} ({self.change})"
+
+
+class ReportJob(models.Model):
+    """A report generated in the background to a file on disk"""
+    
+    REPORT_TYPE_CHOICES = [
+        ('time_entries_csv', 'Time Entries CSV'),
+        ('hr_report', 'HR Report'),
+        ('payroll_parquet', 'Payroll Parquet'),
+        ('payroll_xlsx', 'Payroll XLSX'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    requested_by = models.ForeignKey(Employee, on_delete=models.SET_NULL, null=True, blank=True,
+                                     related_name='report_jobs')
+    report_type = models.CharField(max_length=30, choices=REPORT_TYPE_CHOICES)
+    params = models.JSONField(default=dict, help_text='Normalized report parameters')
+    params_key = models.CharField(max_length=64, help_text='Hash of the report type and parameters')
+    input_version = models.CharField(max_length=64, blank=True,
+                                     help_text='Fingerprint of the input rows the artifact was built from')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0, help_text='Percent done')
+    rows_written = models.PositiveIntegerField(default=0)
+    artifact_path = models.CharField(max_length=500, blank=True)
+    artifact_size = models.PositiveBigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True,
+                                        help_text='Last sign of life of the running attempt')
+    attempt = models.PositiveIntegerField(default=0, help_text='Number of times the job was claimed')
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Report Job'
+        verbose_name_plural = 'Report Jobs'
+        indexes = [
+            models.Index(fields=['params_key', 'status']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_report_type_display()} #{self.id} ({self.status})"
@@ -0,0 +1,373 @@
+"""
+Batch ingestion of clock events queued offline by the mobile app.
+
+Replaying an offline queue through /api/time-in/ and /api/time-out/ costs a
+request, a full validation and a summary recompute per event. Here a batch of
+client-stamped events is validated in bulk (employees, schedules and presence
+loaded once, geofences checked in one NumPy pass), accepted entries are
+inserted with bulk_create and every affected (employee, date) summary is
+recomputed once after commit.
+
+Each event carries a client-generated idempotency key, stored on its
+TimeEntry: replaying an accepted event again returns the stored entry
+instead of inserting a duplicate. Rejected events are not stored, so they
+can be retried once the cause (a missing schedule, say) is fixed.
+
+Because bulk_create bypasses the TimeEntry signals, their work (presence,
+clock events, dirty summaries, dashboard invalidation) is done here once per
+batch.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+MAX_INGEST_EVENTS = 500
+IDEMPOTENCY_KEY_MAX_LENGTH = 64
+# Nightshift time-outs are accepted up to this long after the scheduled end
+NIGHTSHIFT_TIMEOUT_WINDOW = timedelta(hours=4)
+
+ENTRY_TYPES = {'time_in': 'time_in', 'time-in': 'time_in', 'time_out': 'time_out', 'time-out': 'time_out'}
+
+
+class _Rejected(Exception):
+    def __init__(self, error, details=None):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+
+
+def _optional_float(value):
+    return None if value in (None, '') else float(value)
+
+
+def _parse_event(event):
+    """Normalize one submitted event; raises _Rejected when it is malformed"""
+    if not isinstance(event, dict):
+        raise _Rejected('Invalid event', 'Each event must be an object')
+
+    key = event.get('idempotency_key')
+    if not isinstance(key, str) or not key.strip() or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise _Rejected('Invalid idempotency_key', f'A non-empty string of at most {IDEMPOTENCY_KEY_MAX_LENGTH} characters is required')
+
+    entry_type = ENTRY_TYPES.get(event.get('entry_type'))
+    if entry_type is None:
+        raise _Rejected('Invalid entry_type', 'entry_type must be time_in or time_out')
+
+    event_time = parse_datetime(event['event_time']) if isinstance(event.get('event_time'), str) else None
+    if event_time is None:
+        raise _Rejected('Invalid event_time', 'An ISO 8601 event_time is required')
+    if timezone.is_naive(event_time):
+        # Naive client times are taken as UTC, like the time-in/out timestamps
+        event_time = timezone.make_aware(event_time, dt_timezone.utc)
+
+    try:
+        location_id = event.get('location_id')
+        return {
+            'idempotency_key': key.strip(),
+            'employee_id': int(event.get('employee_id')),
+            'entry_type': entry_type,
+            'event_time': event_time,
+            'latitude': _optional_float(event.get('latitude')),
+            'longitude': _optional_float(event.get('longitude')),
+            'accuracy': _optional_float(event.get('accuracy')),
+            'location_id': None if location_id in (None, '') else int(location_id),
+            'notes': event.get('notes') or '',
+        }
+    except (TypeError, ValueError):
+        raise _Rejected('Invalid event', 'employee_id, latitude, longitude, accuracy and location_id must be numbers')
+
+
+def _can_clock_for(requester, employee, team_member_ids):
+    """Whether requester may submit events for employee (the time entry scoping)"""
+    if employee.id == requester.id or requester.can_view_company_data():
+        return True
+    if requester.can_view_department_data():
+        return employee.department_id == requester.department_id
+    if requester.can_view_team_data():
+        return employee.id in team_member_ids
+    return False
+
+
+def _check_schedule(schedules, employee_id, entry_type, event_time):
+    """
+    The schedule an event is validated against, with the rules of
+    TimeInOutAPIView (nightshift time-outs fall back to the previous day's
+    schedule within NIGHTSHIFT_TIMEOUT_WINDOW of its end). Raises _Rejected.
+    """
+    local_time = timezone.localtime(event_time).replace(tzinfo=None)
+    day = local_time.date()
+    schedule = schedules.get((employee_id, day))
+
+    if not schedule and entry_type == 'time_out':
+        yesterday = day - timedelta(days=1)
+        previous = schedules.get((employee_id, yesterday))
+        if (previous and previous.scheduled_time_in and previous.scheduled_time_out
+                and previous.scheduled_time_out < previous.scheduled_time_in):
+            scheduled_end = datetime.combine(yesterday, previous.scheduled_time_out) + timedelta(days=1)
+            if local_time - scheduled_end > NIGHTSHIFT_TIMEOUT_WINDOW:
+                raise _Rejected(
+                    'Nightshift timeout too late',
+                    f'The nightshift ended at {previous.scheduled_time_out} on {yesterday}. Timeout is only allowed within 4 hours after scheduled end time.'
+                )
+            schedule = previous
+
+    if not schedule:
+        raise _Rejected('Schedule required', f'No schedule found for {day.isoformat()}.')
+    if not schedule.scheduled_time_in or not schedule.scheduled_time_out:
+        raise _Rejected('Incomplete schedule', f'The schedule for {schedule.date.isoformat()} is incomplete.')
+    return schedule
+
+
+def ingest_clock_events(events, requester, user=None, ip_address=None, device_info=None):
+    """
+    Validate and store a batch of offline clock events.
+
+    Events are applied in the order given. Per employee they must be newer
+    than the employee's latest recorded entry and alternate time in / time out
+    from the employee's current state.
+
+    Args:
+        events: List of dicts with idempotency_key, employee_id, entry_type,
+                event_time (ISO 8601) and optionally latitude, longitude,
+                accuracy, location_id and notes
+        requester: Employee submitting the batch
+        user: User recorded as updated_by on the entries
+        ip_address, device_info: Client details recorded on the entries
+
+    Returns:
+        dict: {'results': one dict per event, in order, with idempotency_key,
+               status ('accepted', 'duplicate' or 'rejected'), time_entry_id
+               and for rejections error and details;
+               'accepted', 'duplicates', 'rejected': counts}
+    """
+    from .geofence_batch import validate_points
+    from .models import Employee, EmployeeSchedule, EmployeePresence, Location, TimeEntry
+    from .presence import get_presence_map
+
+    results = [None] * len(events)
+    parsed = {}
+    seen_keys = set()
+
+    def reject(i, error, details=None):
+        results[i] = {
+            'idempotency_key': parsed[i]['idempotency_key'] if i in parsed else (
+                events[i].get('idempotency_key') if isinstance(events[i], dict) else None
+            ),
+            'status': 'rejected',
+            'time_entry_id': None,
+            'error': error,
+            'details': details,
+        }
+        parsed.pop(i, None)
+
+    now = timezone.now()
+    oldest = now - timedelta(days=getattr(settings, 'OFFLINE_INGEST_MAX_AGE_DAYS', 7))
+    newest = now + timedelta(seconds=getattr(settings, 'OFFLINE_INGEST_CLOCK_SKEW_SECONDS', 120))
+    for i, event in enumerate(events):
+        try:
+            values = _parse_event(event)
+        except _Rejected as e:
+            reject(i, e.error, e.details)
+            continue
+        parsed[i] = values
+        seen = (values['employee_id'], values['idempotency_key'])
+        if seen in seen_keys:
+            reject(i, 'Duplicate idempotency_key', 'The key appears more than once in this batch')
+        elif not oldest <= values['event_time'] <= newest:
+            reject(i, 'event_time out of range', f'Events must be between {oldest.isoformat()} and now')
+        else:
+            seen_keys.add(seen)
+
+    # Employees the requester may clock for
+    employees = Employee.objects.select_related('department__location').in_bulk(
+        {values['employee_id'] for values in parsed.values()}
+    )
+    team_member_ids = set()
+    if requester.can_view_team_data() and not requester.can_view_department_data():
+        team_member_ids = set(requester.get_team_members().values_list('id', flat=True))
+    for i in list(parsed):
+        employee = employees.get(parsed[i]['employee_id'])
+        if employee is None:
+            reject(i, 'Employee not found')
+        elif not _can_clock_for(requester, employee, team_member_ids):
+            reject(i, 'Permission denied', 'You cannot submit clock events for this employee')
+
+    # Replays of events already stored
+    stored = {}
+    if parsed:
+        stored = {
+            (employee_id, key): entry_id
+            for employee_id, key, entry_id in TimeEntry.objects.filter(
+                employee_id__in={values['employee_id'] for values in parsed.values()},
+                idempotency_key__in={values['idempotency_key'] for values in parsed.values()}
+            ).values_list('employee_id', 'idempotency_key', 'id')
+        }
+    for i in list(parsed):
+        entry_id = stored.get((parsed[i]['employee_id'], parsed[i]['idempotency_key']))
+        if entry_id is not None:
+            results[i] = {
+                'idempotency_key': parsed[i]['idempotency_key'],
+                'status': 'duplicate',
+                'time_entry_id': entry_id,
+            }
+            del parsed[i]
+
+    # Geofences in one pass (team leaders clock in/out from anywhere)
+    resolved_locations = {}
+    if parsed and requester.role != 'team_leader':
+        indexes = list(parsed)
+        verdicts = validate_points([parsed[i] for i in indexes])
+        for i, verdict in zip(indexes, verdicts):
+            if not verdict['valid']:
+                reject(i, 'Geofence validation failed', verdict['message'])
+            elif verdict.get('location'):
+                resolved_locations[i] = verdict['location']
+
+    # Schedules of every event date and the day before, in one query
+    if parsed:
+        local_dates = [timezone.localtime(values['event_time']).date() for values in parsed.values()]
+        schedules = {
+            (schedule.employee_id, schedule.date): schedule
+            for schedule in EmployeeSchedule.objects.filter(
+                employee_id__in={values['employee_id'] for values in parsed.values()},
+                date__gte=min(local_dates) - timedelta(days=1),
+                date__lte=max(local_dates)
+            )
+        }
+        for i in list(parsed):
+            values = parsed[i]
+            try:
+                _check_schedule(schedules, values['employee_id'], values['entry_type'], values['event_time'])
+            except _Rejected as e:
+                reject(i, e.error, e.details)
+
+    locations = Location.objects.in_bulk(
+        {values['location_id'] for values in parsed.values() if values['location_id']}
+    )
+
+    with transaction.atomic():
+        # Lock the employees' presence rows so concurrent clock-ins see a
+        # consistent state (rows never built are built first)
+        employee_ids = {values['employee_id'] for values in parsed.values()}
+        get_presence_map(employee_ids)
+        presence_by_employee = {
+            presence.employee_id: presence
+            for presence in EmployeePresence.objects.select_for_update().filter(employee_id__in=employee_ids)
+        }
+
+        state = {
+            employee_id: (presence.is_clocked_in, presence.last_entry_at)
+            for employee_id, presence in presence_by_employee.items()
+        }
+        new_entries = []
+        accepted = []
+        for i in sorted(parsed):
+            values = parsed[i]
+            employee = employees[values['employee_id']]
+            clocked_in, last_time = state.get(employee.id, (False, None))
+            # Stored timestamps never run ahead of the server clock (presence
+            # orders by them), so events within the clock skew count as now
+            stamped_at = min(values['event_time'], now)
+            if last_time and stamped_at <= last_time:
+                reject(i, 'Out of order', 'Events must be newer than the employee\'s latest recorded entry')
+                continue
+            if values['entry_type'] == 'time_in' and clocked_in:
+                reject(i, 'Already clocked in', 'Clock out first')
+                continue
+            if values['entry_type'] == 'time_out' and not clocked_in:
+                reject(i, 'No open session', 'There is no open session to clock out from')
+                continue
+            if values['location_id'] and values['location_id'] not in locations:
+                reject(i, 'Specified location not found')
+                continue
+            state[employee.id] = (values['entry_type'] == 'time_in', stamped_at)
+
+            if values['location_id']:
+                location = locations[values['location_id']]
+            elif i in resolved_locations:
+                location = resolved_locations[i]
+            else:
+                location = employee.department.location if employee.department else None
+            new_entries.append(TimeEntry(
+                employee=employee,
+                entry_type=values['entry_type'],
+                event_time=values['event_time'],
+                location=location,
+                latitude=values['latitude'],
+                longitude=values['longitude'],
+                accuracy=values['accuracy'],
+                notes=values['notes'],
+                ip_address=ip_address,
+                device_info=device_info,
+                updated_by=user,
+                idempotency_key=values['idempotency_key'],
+            ))
+            accepted.append(i)
+
+        if new_entries:
+            _store_entries(new_entries, now)
+
+    for i, entry in zip(accepted, new_entries):
+        results[i] = {
+            'idempotency_key': entry.idempotency_key,
+            'status': 'accepted',
+            'time_entry_id': entry.id,
+        }
+
+    counts = defaultdict(int)
+    for result in results:
+        counts[result['status']] += 1
+    logger.info(
+        f"[AUDIT] Offline ingest by {requester.employee_id}: {counts['accepted']} accepted, "
+        f"{counts['duplicate']} duplicates, {counts['rejected']} rejected"
+    )
+    return {
+        'results': results,
+        'accepted': counts['accepted'],
+        'duplicates': counts['duplicate'],
+        'rejected': counts['rejected'],
+    }
+
+
+def _store_entries(entries, now):
+    """
+    Insert accepted entries in bulk and do the work of the TimeEntry signals
+    once for the batch. Runs inside the caller's transaction.
+
+    Args:
+        entries: Unsaved TimeEntry objects
+        now: The ingest time; no entry is stamped later than it
+    """
+    from .clock_events import publish_clock_events
+    from .dashboard_cache import record_dashboard_changes
+    from .models import TimeEntry
+    from .presence import rebuild_presence
+    from .summary_queue import coalesce_summary_recompute
+
+    # timestamp is auto_now_add; the clock time of an offline event is when it
+    # happened, so it is written back after the insert. A device clock ahead
+    # of the server's keeps its event_time but is stamped now: a future
+    # timestamp would sort before every later live entry in presence.
+    TimeEntry.objects.bulk_create(entries)
+    for entry in entries:
+        entry.timestamp = min(entry.event_time, now)
+        entry.updated_on = entry.timestamp
+    TimeEntry.objects.bulk_update(entries, ['timestamp', 'updated_on'])
+
+    employee_ids = {entry.employee_id for entry in entries}
+    for employee_id in employee_ids:
+        rebuild_presence(employee_id)
+    publish_clock_events(entries)
+
+    # Each affected (employee, date) summary is recomputed once, after commit
+    with coalesce_summary_recompute() as collector:
+        collector.add({(entry.employee_id, timezone.localtime(entry.timestamp).date()) for entry in entries})
+    record_dashboard_changes(employee_ids)
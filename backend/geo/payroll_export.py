@@ -0,0 +1,244 @@
+"""
+Typed payroll exports of DailyTimeSummary.
+
+Payroll used to re-import the time attendance CSV and parse formatted strings
+(formatted_billed_minutes, '-' for empty cells). These exports write the
+summaries of a period with typed columns instead: integer minutes, real
+dates and times, and the status as a category.
+
+- Parquet (pyarrow): zstd-compressed, one row group per chunk, status as a
+  dictionary column over the fixed DailyTimeSummary statuses
+- XLSX (XlsxWriter): constant-memory mode, rows flushed to disk as written
+
+Rows are read in chunks with values_list (no model instances) and each chunk
+is converted column by column, so memory is bounded by the chunk size.
+"""
+
+from itertools import islice
+
+PAYROLL_FORMATS = ('parquet', 'xlsx')
+PAYROLL_CHUNK_SIZE = 10000
+
+PAYROLL_CONTENT_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (column, values_list field); *_hours fields are exported as minutes
+PAYROLL_FIELDS = [
+    ('employee_id', 'employee__employee_id'),
+    ('first_name', 'employee__user__first_name'),
+    ('last_name', 'employee__user__last_name'),
+    ('department', 'employee__department__name'),
+    ('date', 'date'),
+    ('status', 'status'),
+    ('scheduled_time_in', 'scheduled_time_in'),
+    ('scheduled_time_out', 'scheduled_time_out'),
+    ('time_in', 'time_in'),
+    ('time_out', 'time_out'),
+    ('billed_minutes', 'billed_hours'),
+    ('late_minutes', 'late_minutes'),
+    ('undertime_minutes', 'undertime_minutes'),
+    ('night_differential_minutes', 'night_differential_hours'),
+    ('overtime_minutes', 'overtime_hours'),
+    ('total_break_minutes', 'total_break_minutes'),
+    ('lunch_break_minutes', 'lunch_break_minutes'),
+    ('is_weekend', 'is_weekend'),
+    ('is_holiday', 'is_holiday'),
+]
+PAYROLL_COLUMNS = [column for column, _ in PAYROLL_FIELDS]
+HOURS_COLUMNS = {'billed_minutes', 'night_differential_minutes', 'overtime_minutes'}
+DATE_COLUMNS = {'date'}
+TIME_COLUMNS = {'scheduled_time_in', 'scheduled_time_out', 'time_in', 'time_out'}
+BOOLEAN_COLUMNS = {'is_weekend', 'is_holiday'}
+
+# Rows per XLSX worksheet (Excel's limit less the header row)
+XLSX_MAX_ROWS = 1048575
+
+
+def hours_to_minutes(hours):
+    """
+    Stored hours (2 decimals, rounded from whole minutes) back to minutes.
+
+    Rounds rather than truncates: 440 minutes is stored as 7.33 hours, and
+    int(7.33 * 60) would give 439.
+    """
+    return int(round(hours * 60)) if hours else 0
+
+
+def payroll_summaries(filters, start_date, end_date):
+    """
+    DailyTimeSummary queryset of the pay period start_date..end_date (inclusive).
+
+    Args:
+        filters: Employee filter kwargs, e.g. from exports.scope_employee_filter()
+    """
+    from .models import DailyTimeSummary
+
+    return DailyTimeSummary.objects.filter(date__gte=start_date, date__lte=end_date, **filters)
+
+
+def payroll_queryset(filters, start_date, end_date):
+    """
+    The pay period's summaries as values_list tuples in PAYROLL_FIELDS order,
+    by employee and date.
+    """
+    return payroll_summaries(filters, start_date, end_date).order_by(
+        'employee_id', 'date'
+    ).values_list(*[field for _, field in PAYROLL_FIELDS])
+
+
+def payroll_column_chunks(queryset, chunk_size=PAYROLL_CHUNK_SIZE):
+    """
+    Generator of column-oriented chunks of a payroll_queryset().
+
+    Yields:
+        dict: column name -> list of values (hours converted to minutes),
+              at most chunk_size rows each
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        columns = dict(zip(PAYROLL_COLUMNS, (list(values) for values in zip(*chunk))))
+        for column in HOURS_COLUMNS:
+            columns[column] = [hours_to_minutes(hours) for hours in columns[column]]
+        yield columns
+
+
+def _status_categories():
+    from .models import DailyTimeSummary
+
+    return [value for value, _ in DailyTimeSummary.STATUS_CHOICES]
+
+
+def payroll_arrow_schema():
+    """Arrow schema of the Parquet export"""
+    import pyarrow as pa
+
+    types = {}
+    for column in PAYROLL_COLUMNS:
+        if column in DATE_COLUMNS:
+            types[column] = pa.date32()
+        elif column in TIME_COLUMNS:
+            types[column] = pa.time64('us')
+        elif column in BOOLEAN_COLUMNS:
+            types[column] = pa.bool_()
+        elif column.endswith('_minutes'):
+            types[column] = pa.int32()
+        elif column == 'status':
+            types[column] = pa.dictionary(pa.int8(), pa.string())
+        else:
+            types[column] = pa.string()
+    return pa.schema([(column, types[column]) for column in PAYROLL_COLUMNS])
+
+
+def write_payroll_parquet(queryset, output, chunk_size=PAYROLL_CHUNK_SIZE, on_progress=None):
+    """
+    Write a payroll_queryset() as Parquet.
+
+    Args:
+        queryset: From payroll_queryset()
+        output: Binary file object or path
+        chunk_size: Rows per database round trip and per row group
+        on_progress: Optional callable(rows_written) called after each chunk
+
+    Returns:
+        int: Rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = payroll_arrow_schema()
+    categories = _status_categories()
+    category_index = {status: i for i, status in enumerate(categories)}
+    category_array = pa.array(categories, pa.string())
+
+    rows = 0
+    with pq.ParquetWriter(output, schema, compression='zstd') as writer:
+        for columns in payroll_column_chunks(queryset, chunk_size):
+            arrays = []
+            for field in schema:
+                values = columns[field.name]
+                if field.name == 'status':
+                    indices = pa.array([category_index.get(status) for status in values], pa.int8())
+                    arrays.append(pa.DictionaryArray.from_arrays(indices, category_array))
+                else:
+                    arrays.append(pa.array(values, field.type))
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            rows += len(columns['date'])
+            if on_progress:
+                on_progress(rows)
+    return rows
+
+
+def write_payroll_xlsx(queryset, output, chunk_size=PAYROLL_CHUNK_SIZE, on_progress=None):
+    """
+    Write a payroll_queryset() as an XLSX workbook with typed cells.
+
+    Uses XlsxWriter's constant-memory mode: each row is flushed to disk once
+    the next one starts. Periods over Excel's row limit continue on further
+    worksheets.
+
+    Args:
+        queryset: From payroll_queryset()
+        output: Binary file object or path
+        chunk_size: Rows per database round trip
+        on_progress: Optional callable(rows_written) called after each chunk
+
+    Returns:
+        int: Rows written
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    time_format = workbook.add_format({'num_format': 'hh:mm'})
+
+    def add_worksheet(number):
+        worksheet = workbook.add_worksheet('Payroll' if number == 1 else f'Payroll {number}')
+        worksheet.write_row(0, 0, PAYROLL_COLUMNS, header_format)
+        worksheet.freeze_panes(1, 0)
+        # The typed write method of each column, skipping write()'s type dispatch
+        writers = []
+        for column in PAYROLL_COLUMNS:
+            if column in DATE_COLUMNS:
+                writers.append((worksheet.write_datetime, date_format))
+            elif column in TIME_COLUMNS:
+                writers.append((worksheet.write_datetime, time_format))
+            elif column in BOOLEAN_COLUMNS:
+                writers.append((worksheet.write_boolean, None))
+            elif column.endswith('_minutes'):
+                writers.append((worksheet.write_number, None))
+            else:
+                writers.append((worksheet.write_string, None))
+        return writers
+
+    sheets = 1
+    writers = add_worksheet(sheets)
+    sheet_row = 0
+    rows = 0
+    for columns in payroll_column_chunks(queryset, chunk_size):
+        for values in zip(*(columns[column] for column in PAYROLL_COLUMNS)):
+            if sheet_row == XLSX_MAX_ROWS:
+                sheets += 1
+                writers = add_worksheet(sheets)
+                sheet_row = 0
+            sheet_row += 1
+            for col, value in enumerate(values):
+                if value is not None:
+                    write, cell_format = writers[col]
+                    write(sheet_row, col, value, cell_format)
+        rows += len(columns['date'])
+        if on_progress:
+            on_progress(rows)
+    workbook.close()
+    return rows
+
+
+PAYROLL_WRITERS = {
+    'parquet': write_payroll_parquet,
+    'xlsx': write_payroll_xlsx,
+}
@@ -0,0 +1,207 @@
+"""
+Live presence: who is clocked in right now.
+
+Answering that used to mean walking each employee's TimeEntry history (last
+time-in, then an exists() for a later time-out). EmployeePresence keeps the
+answer in one row per employee, updated in the same transaction as every
+time entry write (see the TimeEntry signals), so open-session checks and
+active counts are a single indexed lookup.
+
+An employee is clocked in when their latest entry by timestamp is a time-in,
+which is the same rule the old last-entry checks applied.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .summary_engine import local_day_bounds
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _local_date(moment):
+    return timezone.localtime(moment).date()
+
+
+def active_since(now=None):
+    """
+    Earliest session start that still counts as active: the start of
+    yesterday, so a night shift started yesterday and not yet closed counts.
+    """
+    today = timezone.localdate(now or timezone.now())
+    return local_day_bounds(today - timedelta(days=1), today)[0]
+
+
+def presence_values(employee_id):
+    """
+    Derive an employee's presence fields from their time entries.
+
+    Returns:
+        dict: EmployeePresence field values (without the employee)
+    """
+    from .models import TimeEntry
+
+    entries = TimeEntry.objects.filter(employee_id=employee_id)
+    last_entry = entries.order_by('-timestamp', '-id').first()
+    if last_entry is None:
+        return {
+            'state': 'clocked_out',
+            'open_time_in': None,
+            'session_started_at': None,
+            'last_entry': None,
+            'last_entry_at': None,
+            'last_event_time': None,
+            'today_date': None,
+            'first_entry_today': None,
+        }
+
+    today_date = _local_date(last_entry.timestamp)
+    day_start, day_end = local_day_bounds(today_date, today_date)
+    first_entry_today = entries.filter(
+        timestamp__gte=day_start,
+        timestamp__lt=day_end
+    ).order_by('timestamp', 'id').first()
+
+    is_open = last_entry.entry_type == 'time_in'
+    return {
+        'state': 'clocked_in' if is_open else 'clocked_out',
+        'open_time_in': last_entry if is_open else None,
+        'session_started_at': last_entry.timestamp if is_open else None,
+        'last_entry': last_entry,
+        'last_entry_at': last_entry.timestamp,
+        'last_event_time': last_entry.event_time,
+        'today_date': today_date,
+        'first_entry_today': first_entry_today,
+    }
+
+
+def rebuild_presence(employee_id):
+    """
+    Recompute an employee's presence row from their time entries.
+
+    Returns:
+        EmployeePresence or None: None when the employee no longer exists
+    """
+    from .models import Employee, EmployeePresence
+
+    if not Employee.objects.filter(id=employee_id).exists():
+        return None
+    presence, _ = EmployeePresence.objects.update_or_create(
+        employee_id=employee_id,
+        defaults=presence_values(employee_id)
+    )
+    return presence
+
+
+def _flush_presence_rebuilds():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    for employee_id in pending:
+        try:
+            rebuild_presence(employee_id)
+        except Exception as e:
+            logger.error(f"Error rebuilding presence for employee {employee_id}: {str(e)}", exc_info=True)
+
+
+def schedule_presence_rebuild(employee_id):
+    """
+    Rebuild an employee's presence once, on commit (immediately in autocommit
+    mode). Used after deletes, where the employee may be going away too.
+    """
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    _local.pending.add(employee_id)
+    transaction.on_commit(_flush_presence_rebuilds)
+
+
+def apply_clock_event(entry):
+    """
+    Update the presence row for a newly created time entry.
+
+    The common case (the entry is the employee's latest) only touches the
+    locked presence row. Back-dated entries and missing rows fall back to a
+    rebuild from the entries.
+
+    Returns:
+        EmployeePresence
+    """
+    from .models import EmployeePresence
+
+    with transaction.atomic():
+        presence = EmployeePresence.objects.select_for_update().filter(
+            employee_id=entry.employee_id
+        ).first()
+        if presence is None or (presence.last_entry_at and entry.timestamp < presence.last_entry_at):
+            return rebuild_presence(entry.employee_id)
+
+        is_open = entry.entry_type == 'time_in'
+        presence.state = 'clocked_in' if is_open else 'clocked_out'
+        presence.open_time_in = entry if is_open else None
+        presence.session_started_at = entry.timestamp if is_open else None
+        presence.last_entry = entry
+        presence.last_entry_at = entry.timestamp
+        presence.last_event_time = entry.event_time
+
+        entry_date = _local_date(entry.timestamp)
+        if presence.today_date != entry_date or presence.first_entry_today_id is None:
+            presence.today_date = entry_date
+            presence.first_entry_today = entry
+        presence.save()
+        return presence
+
+
+def get_presence(employee):
+    """
+    Return an employee's presence row, building it on first use.
+
+    Returns:
+        EmployeePresence
+    """
+    from .models import EmployeePresence
+
+    presence = EmployeePresence.objects.filter(employee_id=employee.id).first()
+    if presence is None:
+        presence = rebuild_presence(employee.id)
+    return presence
+
+
+def get_presence_map(employee_ids):
+    """
+    Presence rows for many employees in one query (rows missing because they
+    were never backfilled are built on the way).
+
+    Returns:
+        dict: employee id -> EmployeePresence
+    """
+    from .models import EmployeePresence
+
+    employee_ids = list(employee_ids)
+    presence_map = {
+        presence.employee_id: presence
+        for presence in EmployeePresence.objects.filter(employee_id__in=employee_ids)
+    }
+    for employee_id in employee_ids:
+        if employee_id not in presence_map:
+            presence = rebuild_presence(employee_id)
+            if presence is not None:
+                presence_map[employee_id] = presence
+    return presence_map
+
+
+def is_session_active(presence, now=None):
+    """Check if a presence row has an open session started since yesterday"""
+    return bool(
+        presence
+        and presence.state == 'clocked_in'
+        and presence.session_started_at
+        and presence.session_started_at >= active_since(now)
+    )
+
@@ -0,0 +1,487 @@
+"""
+Background report jobs.
+
+Large reports (a year of company time entries, a quarter of the HR report)
+do not fit in a request. Clients submit a ReportJob instead; a worker writes
+the report to a file under REPORT_ARTIFACT_DIR in chunks, recording progress
+on the job, and the client downloads the file once the job has completed.
+
+Jobs are keyed by a hash of their report type and normalized parameters:
+submitting a report that is already pending or running returns that job,
+and a completed artifact is reused for as long as the fingerprint of its
+input rows is unchanged.
+
+The worker runs from the ``run_report_jobs`` management command (the
+geotime-report-jobs systemd unit), or for development from a daemon thread in
+the web process (the REPORT_JOB_THREAD setting). Jobs are claimed with a
+conditional update, so several workers can run at once.
+
+A running job records a heartbeat with its progress and is only requeued
+once the heartbeat stopped. Each claim is a new attempt that writes its own
+files and only records its result while it still owns the job, so an
+attempt presumed dead cannot overwrite a later one.
+"""
+
+from datetime import date, timedelta
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Seconds the worker thread sleeps when it is not woken up by a new job
+WORKER_INTERVAL_SECONDS = 10
+# Running jobs without a heartbeat for this long are assumed lost (worker died)
+STALE_JOB_SECONDS = 900
+# Rows written between progress updates
+PROGRESS_EVERY_ROWS = 5000
+# Employees per page when writing the HR report
+HR_REPORT_PAGE_SIZE = 200
+
+ARTIFACT_EXTENSIONS = {
+    'time_entries_csv': 'csv',
+    'hr_report': 'json',
+    'payroll_parquet': 'parquet',
+    'payroll_xlsx': 'xlsx',
+}
+ARTIFACT_CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'json': 'application/json',
+    'parquet': 'application/vnd.apache.parquet',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+# Reports scoped like time entry exports (scope and department parameters)
+SCOPED_REPORT_TYPES = ('time_entries_csv', 'payroll_parquet', 'payroll_xlsx')
+# Reports written as text; the others are binary
+TEXT_REPORT_TYPES = ('time_entries_csv', 'hr_report')
+
+_worker_thread = None
+_worker_thread_pid = None
+_worker_wakeup = threading.Event()
+_worker_thread_lock = threading.Lock()
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f'Invalid {name}. Use YYYY-MM-DD')
+
+
+def normalize_job_params(employee, report_type, raw_params):
+    """
+    Validate report parameters and check the employee may run the report.
+
+    Args:
+        employee: Employee submitting (or reading) the job
+        report_type: One of ReportJob.REPORT_TYPE_CHOICES
+        raw_params: Dict of request parameters
+
+    Returns:
+        dict: JSON-serializable parameters, identical for identical reports
+
+    Raises:
+        ValueError: Invalid parameters
+        PermissionError: The employee may not run this report
+    """
+    from .exports import EXPORT_SCOPES, scope_employee_filter
+    from .hr_report import HR_REPORT_ROLES
+
+    if report_type not in ARTIFACT_EXTENSIONS:
+        raise ValueError(f'Invalid report_type. Use one of: {", ".join(ARTIFACT_EXTENSIONS)}')
+    if not raw_params.get('start_date') or not raw_params.get('end_date'):
+        raise ValueError('start_date and end_date are required')
+    start_date = _parse_date(raw_params['start_date'], 'start_date')
+    end_date = _parse_date(raw_params['end_date'], 'end_date')
+    if start_date > end_date:
+        raise ValueError('start_date must be on or before end_date')
+    params = {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()}
+
+    if report_type in SCOPED_REPORT_TYPES:
+        scope = raw_params.get('scope') or 'self'
+        if scope not in EXPORT_SCOPES:
+            raise ValueError('Invalid scope')
+        filters = scope_employee_filter(employee, scope, raw_params.get('department'))
+        if filters is None:
+            raise PermissionError('You do not have permission to export this scope')
+        params.update(scope=scope, filters=filters)
+    else:
+        if employee.role not in HR_REPORT_ROLES:
+            raise PermissionError('Access denied. Insufficient permissions for HR report.')
+        department_id = raw_params.get('department_id') or None
+        if department_id is not None:
+            try:
+                department_id = int(department_id)
+            except (TypeError, ValueError):
+                raise ValueError('Invalid department_id')
+        params.update(
+            department_id=department_id,
+            employee_id=raw_params.get('employee_id') or None,
+            status_filter=raw_params.get('status') or None,
+        )
+    return params
+
+
+def params_key(report_type, params):
+    """Hash identifying a report type with its normalized parameters"""
+    payload = json.dumps([report_type, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _hr_report_args(params):
+    return (
+        date.fromisoformat(params['start_date']),
+        date.fromisoformat(params['end_date']),
+    ), {
+        'department_id': params['department_id'],
+        'employee_id': params['employee_id'],
+        'status_filter': params['status_filter'],
+    }
+
+
+def input_fingerprint(report_type, params):
+    """
+    Fingerprint of the rows a report reads: row counts plus the highest id
+    and modification time. Any insert, edit or delete in the report's range
+    changes it, so an artifact built for an older fingerprint is stale.
+    """
+    from .exports import time_entries_for_export
+    from .hr_report import hr_report_querysets
+    from .payroll_export import payroll_summaries
+
+    if report_type == 'time_entries_csv':
+        state = time_entries_for_export(
+            params['filters'],
+            date.fromisoformat(params['start_date']),
+            date.fromisoformat(params['end_date']),
+        ).order_by().aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_on'))
+    elif report_type in SCOPED_REPORT_TYPES:
+        state = payroll_summaries(
+            params['filters'],
+            date.fromisoformat(params['start_date']),
+            date.fromisoformat(params['end_date']),
+        ).order_by().aggregate(count=Count('id'), last_id=Max('id'), updated=Max('updated_at'))
+    else:
+        args, kwargs = _hr_report_args(params)
+        summaries_queryset, employees_queryset = hr_report_querysets(*args, **kwargs)
+        state = {
+            'summaries': summaries_queryset.order_by().aggregate(
+                count=Count('id'), last_id=Max('id'), updated=Max('updated_at')
+            ),
+            'employees': employees_queryset.order_by().aggregate(
+                count=Count('id'), last_id=Max('id'), updated=Max('updated_at')
+            ),
+        }
+    payload = json.dumps(state, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def submit_report_job(employee, report_type, raw_params):
+    """
+    Submit a report, reusing an identical job where possible.
+
+    Args:
+        employee: Employee submitting the report
+        report_type: One of ReportJob.REPORT_TYPE_CHOICES
+        raw_params: Dict of request parameters
+
+    Returns:
+        tuple: (ReportJob, outcome) where outcome is 'created', 'pending'
+               (an identical job is already queued or running) or 'reused'
+               (a completed artifact is still current)
+
+    Raises:
+        ValueError, PermissionError: See normalize_job_params()
+    """
+    from .models import ReportJob
+
+    params = normalize_job_params(employee, report_type, raw_params)
+    key = params_key(report_type, params)
+
+    in_flight = ReportJob.objects.filter(
+        params_key=key, status__in=['pending', 'running']
+    ).order_by('created_at').first()
+    if in_flight:
+        return in_flight, 'pending'
+
+    version = input_fingerprint(report_type, params)
+    for job in ReportJob.objects.filter(params_key=key, status='completed', input_version=version):
+        if os.path.exists(job.artifact_path):
+            return job, 'reused'
+
+    job = ReportJob.objects.create(
+        requested_by=employee,
+        report_type=report_type,
+        params=params,
+        params_key=key,
+    )
+    transaction.on_commit(wake_report_worker)
+    return job, 'created'
+
+
+def can_access_report_job(employee, job):
+    """Whether the employee may see a job: they submitted it or could submit the same report"""
+    if job.requested_by_id == employee.id:
+        return True
+    raw_params = dict(job.params)
+    if job.report_type in SCOPED_REPORT_TYPES:
+        raw_params['department'] = job.params['filters'].get('employee__department_id')
+    else:
+        raw_params['status'] = job.params['status_filter']
+    try:
+        return normalize_job_params(employee, job.report_type, raw_params) == job.params
+    except (ValueError, PermissionError):
+        return False
+
+
+def _artifact_path(job):
+    """Artifact file of the job's current attempt"""
+    return os.path.join(
+        settings.REPORT_ARTIFACT_DIR,
+        f'report-{job.id}-{job.attempt}.{ARTIFACT_EXTENSIONS[job.report_type]}'
+    )
+
+
+def requeue_stale_jobs():
+    """Put running jobs whose worker died back in the queue; returns how many"""
+    from .models import ReportJob
+
+    cutoff = timezone.now() - timedelta(seconds=STALE_JOB_SECONDS)
+    stale = ReportJob.objects.filter(status='running', heartbeat_at__lt=cutoff)
+    # Partial files of the lost attempts
+    for job in stale.only('id', 'report_type', 'attempt'):
+        partial_path = f'{_artifact_path(job)}.part'
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return stale.update(
+        status='pending', started_at=None, heartbeat_at=None, progress=0, rows_written=0
+    )
+
+
+def claim_next_job():
+    """Mark the oldest pending job as running and return it, or None"""
+    from .models import ReportJob
+
+    candidates = ReportJob.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:10]
+    for job_id in candidates:
+        # Only one worker's update matches while the job is still pending
+        now = timezone.now()
+        claimed = ReportJob.objects.filter(id=job_id, status='pending').update(
+            status='running', started_at=now, heartbeat_at=now, attempt=F('attempt') + 1,
+            progress=0, rows_written=0, error=''
+        )
+        if claimed:
+            return ReportJob.objects.get(id=job_id)
+    return None
+
+
+def _report_progress(job, rows_written, total):
+    from .models import ReportJob
+
+    progress = min(99, rows_written * 100 // total) if total else 0
+    ReportJob.objects.filter(id=job.id, attempt=job.attempt).update(
+        progress=progress, rows_written=rows_written, heartbeat_at=timezone.now()
+    )
+
+
+def _write_time_entries_csv(job, output):
+    from .exports import stream_time_entries_csv, time_entries_for_export
+
+    params = job.params
+    entries = time_entries_for_export(
+        params['filters'],
+        date.fromisoformat(params['start_date']),
+        date.fromisoformat(params['end_date']),
+    )
+    total = entries.count()
+    rows = -1  # The header is not a row
+    for line in stream_time_entries_csv(entries, include_employee=params['scope'] != 'self'):
+        output.write(line)
+        rows += 1
+        if rows and rows % PROGRESS_EVERY_ROWS == 0:
+            _report_progress(job, rows, total)
+    return max(rows, 0)
+
+
+def _write_hr_report(job, output):
+    """The same document as DailyTimeSummaryViewSet.hr_report, with every employee"""
+    from .hr_report import hr_report_employee_page, hr_report_querysets, hr_report_totals
+
+    args, kwargs = _hr_report_args(job.params)
+    employees_queryset = hr_report_querysets(*args, **kwargs)[1]
+    if kwargs['employee_id']:
+        employees_queryset = employees_queryset.filter(employee_id=kwargs['employee_id'])
+    total = employees_queryset.count()
+
+    document = hr_report_totals(*args, **kwargs)
+    # Written piecewise so only one page of employees is held in memory
+    output.write(json.dumps(document, cls=DjangoJSONEncoder)[:-1])
+    output.write(', "employees": [')
+
+    rows = 0
+    cursor = 0
+    while cursor is not None:
+        page, next_cursor = hr_report_employee_page(
+            *args, **kwargs, after_id=cursor, limit=HR_REPORT_PAGE_SIZE
+        )
+        for employee_data in page:
+            if rows:
+                output.write(', ')
+            output.write(json.dumps(employee_data, cls=DjangoJSONEncoder))
+            rows += 1
+        _report_progress(job, rows, total)
+        cursor = int(next_cursor) if next_cursor else None
+    output.write(']}')
+    return rows
+
+
+def _write_payroll(job, output):
+    from .payroll_export import PAYROLL_WRITERS, payroll_queryset
+
+    params = job.params
+    rows = payroll_queryset(
+        params['filters'],
+        date.fromisoformat(params['start_date']),
+        date.fromisoformat(params['end_date']),
+    )
+    total = rows.count()
+    writer = PAYROLL_WRITERS[ARTIFACT_EXTENSIONS[job.report_type]]
+    return writer(rows, output, on_progress=lambda written: _report_progress(job, written, total))
+
+
+ARTIFACT_WRITERS = {
+    'time_entries_csv': _write_time_entries_csv,
+    'hr_report': _write_hr_report,
+    'payroll_parquet': _write_payroll,
+    'payroll_xlsx': _write_payroll,
+}
+
+
+def run_report_job(job):
+    """
+    Write a claimed job's artifact to disk and mark it completed (or failed).
+
+    The file is written under a temporary name and renamed when complete,
+    so a download never sees a partial artifact. Both names include the
+    attempt; the result is only recorded while the attempt still owns the job
+    (it was not requeued and claimed again meanwhile).
+    """
+    from .models import ReportJob
+
+    artifact_dir = settings.REPORT_ARTIFACT_DIR
+    path = _artifact_path(job)
+    partial_path = f'{path}.part'
+    owned = ReportJob.objects.filter(id=job.id, attempt=job.attempt, status='running')
+    try:
+        os.makedirs(artifact_dir, exist_ok=True)
+        # Taken before reading: rows changed while writing make the artifact
+        # stale instead of being missed
+        version = input_fingerprint(job.report_type, job.params)
+        if job.report_type in TEXT_REPORT_TYPES:
+            output = open(partial_path, 'w', newline='', encoding='utf-8')
+        else:
+            output = open(partial_path, 'wb')
+        with output:
+            rows = ARTIFACT_WRITERS[job.report_type](job, output)
+        os.replace(partial_path, path)
+        recorded = owned.update(
+            status='completed',
+            progress=100,
+            rows_written=rows,
+            input_version=version,
+            artifact_path=path,
+            artifact_size=os.path.getsize(path),
+            finished_at=timezone.now(),
+        )
+        if recorded:
+            logger.info(f"Report job {job.id} ({job.report_type}) wrote {rows} rows to {path}")
+        else:
+            logger.warning(f"Report job {job.id} attempt {job.attempt} was taken over; discarding {path}")
+            os.remove(path)
+    except Exception as e:
+        logger.error(f"Error running report job {job.id}: {str(e)}", exc_info=True)
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        owned.update(status='failed', error=str(e), finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Run queued jobs until the queue is empty (or limit jobs ran); returns how many ran"""
+    requeue_stale_jobs()
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_report_job(job)
+        ran += 1
+    return ran
+
+
+def prune_report_jobs(older_than):
+    """
+    Delete finished jobs (and their artifacts) created before older_than.
+
+    Returns:
+        int: Jobs deleted
+    """
+    from .models import ReportJob
+
+    finished = ReportJob.objects.filter(
+        status__in=['completed', 'failed'], created_at__lt=older_than
+    )
+    for path in finished.exclude(artifact_path='').values_list('artifact_path', flat=True):
+        if os.path.exists(path):
+            os.remove(path)
+    deleted, _ = finished.delete()
+    return deleted
+
+
+def _worker_loop():
+    from django.db import close_old_connections
+
+    # Runs the queue on start too, so jobs left pending by a restart resume
+    while True:
+        _worker_wakeup.clear()
+        try:
+            close_old_connections()
+            run_pending_jobs()
+        except Exception as e:
+            logger.error(f"Error running report jobs: {str(e)}", exc_info=True)
+        finally:
+            close_old_connections()
+        _worker_wakeup.wait(WORKER_INTERVAL_SECONDS)
+
+
+def ensure_report_worker():
+    """Start the in-process report worker thread once per process, if enabled"""
+    global _worker_thread, _worker_thread_pid
+
+    if not getattr(settings, 'REPORT_JOB_THREAD', False):
+        return None
+
+    with _worker_thread_lock:
+        # A thread started before a fork does not exist in the child
+        if _worker_thread is None or _worker_thread_pid != os.getpid() or not _worker_thread.is_alive():
+            _worker_thread = threading.Thread(
+                target=_worker_loop, name='report-jobs', daemon=True
+            )
+            _worker_thread_pid = os.getpid()
+            _worker_thread.start()
+    return _worker_thread
+
+
+def wake_report_worker():
+    """Ask the report worker thread to run now instead of at its next interval"""
+    if ensure_report_worker():
+        _worker_wakeup.set()
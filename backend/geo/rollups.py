@@ -0,0 +1,470 @@
+"""
+Materialized rollups of DailyTimeSummary rows.
+
+EmployeePeriodRollup holds per-employee weekly and monthly totals, so report
+totals come from a few indexed rollup rows instead of re-summing every daily
+row on each request. DepartmentDailyStats holds per-department status counts
+and summed hours for each date, so dashboards and headcounts read one row per
+department. Whenever summaries change (batch engine writes, model saves and
+deletes) the affected periods and dates are recomputed with grouped
+aggregates and upserted.
+
+Rollups for existing data are built with the ``rebuild_summary_rollups``
+management command (run by the deploy scripts). Until then, and for ranges
+older than the backfill, readers aggregate DailyTimeSummary directly wherever
+rollup rows are missing, so totals are never read as zeros from empty tables.
+"""
+
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+import logging
+import threading
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Statuses counted as a day worked (as on the TIME ATTENDANCE report)
+WORKED_STATUSES = ('present', 'late', 'half_day')
+PERIOD_TYPES = ('week', 'month')
+# Employees refreshed per aggregate query
+EMPLOYEE_CHUNK_SIZE = 200
+
+COUNT_FIELDS = ['days_recorded', 'days_worked', 'present_days', 'late_days', 'absent_days',
+                'late_minutes', 'undertime_minutes']
+DECIMAL_FIELDS = ['billed_hours', 'night_differential_hours', 'overtime_hours', 'total_overtime_hours']
+ROLLUP_FIELDS = COUNT_FIELDS + DECIMAL_FIELDS
+AGGREGATE_PREFIX = 'rollup_'
+
+DEPARTMENT_COUNT_FIELDS = ['summaries_count', 'clocked_in_count', 'present_count', 'late_count',
+                           'undertime_count', 'absent_count', 'late_minutes', 'undertime_minutes']
+DEPARTMENT_DECIMAL_FIELDS = ['billed_hours', 'night_differential_hours', 'overtime_hours']
+DEPARTMENT_STATS_FIELDS = DEPARTMENT_COUNT_FIELDS + DEPARTMENT_DECIMAL_FIELDS
+# Dates aggregated per department stats query
+DATE_CHUNK_SIZE = 31
+
+_local = threading.local()
+
+
+def period_start(period_type, day):
+    """Monday of the day's week or first day of its month"""
+    if period_type == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def period_end(period_type, start):
+    """Last day of the period starting on start"""
+    if period_type == 'week':
+        return start + timedelta(days=6)
+    next_month = (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def empty_totals():
+    totals = {field: 0 for field in COUNT_FIELDS}
+    totals.update({field: Decimal('0.00') for field in DECIMAL_FIELDS})
+    return totals
+
+
+def summary_aggregates():
+    """
+    Aggregate expressions computing every rollup field from DailyTimeSummary
+    rows, keyed AGGREGATE_PREFIX + field (plain names clash with model fields).
+    """
+    worked = Q(status__in=WORKED_STATUSES)
+    aggregates = {
+        'days_recorded': Count('id'),
+        'days_worked': Count('id', filter=worked),
+        'present_days': Count('id', filter=Q(status='present')),
+        'late_days': Count('id', filter=Q(status='late')),
+        'absent_days': Count('id', filter=Q(status='absent')),
+        'billed_hours': Sum('billed_hours', filter=worked),
+        'late_minutes': Sum('late_minutes', filter=worked),
+        'undertime_minutes': Sum('undertime_minutes', filter=worked),
+        'night_differential_hours': Sum('night_differential_hours', filter=worked),
+        'overtime_hours': Sum('overtime_hours', filter=worked),
+        'total_overtime_hours': Sum('overtime_hours'),
+    }
+    return {AGGREGATE_PREFIX + field: expression for field, expression in aggregates.items()}
+
+
+def totals_from_summaries(summaries):
+    """
+    Totals of every rollup field from DailyTimeSummary objects already loaded,
+    with the same rules as summary_aggregates (for callers that need the rows
+    anyway, where another aggregate query would be wasted).
+
+    Returns:
+        dict: Totals as from empty_totals
+    """
+    totals = empty_totals()
+    for summary in summaries:
+        worked = summary.status in WORKED_STATUSES
+        totals['days_recorded'] += 1
+        totals['days_worked'] += 1 if worked else 0
+        totals['present_days'] += 1 if summary.status == 'present' else 0
+        totals['late_days'] += 1 if summary.status == 'late' else 0
+        totals['absent_days'] += 1 if summary.status == 'absent' else 0
+        totals['total_overtime_hours'] += Decimal(str(summary.overtime_hours or 0))
+        if worked:
+            totals['billed_hours'] += Decimal(str(summary.billed_hours or 0))
+            totals['late_minutes'] += summary.late_minutes or 0
+            totals['undertime_minutes'] += summary.undertime_minutes or 0
+            totals['night_differential_hours'] += Decimal(str(summary.night_differential_hours or 0))
+            totals['overtime_hours'] += Decimal(str(summary.overtime_hours or 0))
+    return totals
+
+
+def _add_totals(totals, row, prefix=''):
+    for field in ROLLUP_FIELDS:
+        value = row.get(prefix + field)
+        if value:
+            totals[field] += Decimal(str(value)) if field in DECIMAL_FIELDS else value
+
+
+def refresh_period_rollups(keys, employee_chunk_size=EMPLOYEE_CHUNK_SIZE):
+    """
+    Recompute the week and month rollups containing the given (employee_id, date) keys.
+
+    Args:
+        keys: Iterable of (employee_id, date) tuples whose summaries changed
+        employee_chunk_size: Employees aggregated per query
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    from .models import DailyTimeSummary, EmployeePeriodRollup
+
+    affected = defaultdict(set)
+    for employee_id, day in keys:
+        for period_type in PERIOD_TYPES:
+            affected[employee_id].add((period_type, period_start(period_type, day)))
+    employee_ids = list(affected)
+
+    written = 0
+    for offset in range(0, len(employee_ids), employee_chunk_size):
+        chunk = employee_ids[offset:offset + employee_chunk_size]
+        wanted = {
+            (employee_id, period_type, start)
+            for employee_id in chunk
+            for period_type, start in affected[employee_id]
+        }
+
+        rollups = {}
+        for period_type, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+            starts = {start for _, kind, start in wanted if kind == period_type}
+            rows = (
+                DailyTimeSummary.objects.filter(
+                    employee_id__in=chunk,
+                    date__gte=min(starts),
+                    date__lte=period_end(period_type, max(starts))
+                )
+                .order_by()
+                .annotate(period_start=trunc('date'))
+                .values('employee_id', 'period_start')
+                .annotate(**summary_aggregates())
+            )
+            for row in rows:
+                key = (row['employee_id'], period_type, row['period_start'])
+                if key not in wanted:
+                    continue
+                totals = empty_totals()
+                _add_totals(totals, row, AGGREGATE_PREFIX)
+                rollups[key] = EmployeePeriodRollup(
+                    employee_id=key[0], period_type=period_type, period_start=key[2], **totals
+                )
+
+        with transaction.atomic():
+            if rollups:
+                EmployeePeriodRollup.objects.bulk_create(
+                    list(rollups.values()),
+                    update_conflicts=True,
+                    unique_fields=['employee', 'period_type', 'period_start'],
+                    update_fields=ROLLUP_FIELDS + ['updated_at'],
+                    batch_size=500,
+                )
+            # Periods whose daily rows are all gone
+            emptied = wanted - set(rollups)
+            if emptied:
+                condition = Q()
+                for employee_id, period_type, start in emptied:
+                    condition |= Q(employee_id=employee_id, period_type=period_type, period_start=start)
+                EmployeePeriodRollup.objects.filter(condition).delete()
+        written += len(rollups)
+
+    return written
+
+
+def department_stats_aggregates():
+    """Aggregate expressions computing every DepartmentDailyStats field, keyed like summary_aggregates()"""
+    aggregates = {
+        'summaries_count': Count('id'),
+        'clocked_in_count': Count('id', filter=Q(time_in__isnull=False)),
+        'present_count': Count('id', filter=Q(status='present')),
+        'late_count': Count('id', filter=Q(status='late')),
+        'undertime_count': Count('id', filter=Q(status='undertime')),
+        'absent_count': Count('id', filter=Q(status='absent')),
+        'billed_hours': Sum('billed_hours'),
+        'late_minutes': Sum('late_minutes'),
+        'undertime_minutes': Sum('undertime_minutes'),
+        'night_differential_hours': Sum('night_differential_hours'),
+        'overtime_hours': Sum('overtime_hours'),
+    }
+    return {AGGREGATE_PREFIX + field: expression for field, expression in aggregates.items()}
+
+
+def empty_department_stats():
+    stats = {field: 0 for field in DEPARTMENT_COUNT_FIELDS}
+    stats.update({field: Decimal('0.00') for field in DEPARTMENT_DECIMAL_FIELDS})
+    return stats
+
+
+def add_department_stats(stats, row, prefix=''):
+    for field in DEPARTMENT_STATS_FIELDS:
+        value = row.get(prefix + field)
+        if value:
+            stats[field] += Decimal(str(value)) if field in DEPARTMENT_DECIMAL_FIELDS else value
+
+
+def refresh_department_daily_stats(dates, date_chunk_size=DATE_CHUNK_SIZE):
+    """
+    Recompute DepartmentDailyStats for every department on the given dates.
+
+    Whole dates are recomputed (grouped by the employees' current department),
+    so an employee who moved department is counted in the right place.
+
+    Returns:
+        int: Number of stats rows written
+    """
+    from .models import DailyTimeSummary, DepartmentDailyStats
+
+    dates = sorted(set(dates))
+    written = 0
+    for offset in range(0, len(dates), date_chunk_size):
+        chunk = dates[offset:offset + date_chunk_size]
+        rows = (
+            DailyTimeSummary.objects.filter(date__in=chunk)
+            .order_by()
+            .values('employee__department_id', 'date')
+            .annotate(**department_stats_aggregates())
+        )
+        stats_rows = []
+        for row in rows:
+            stats = empty_department_stats()
+            add_department_stats(stats, row, AGGREGATE_PREFIX)
+            stats_rows.append(DepartmentDailyStats(
+                department_id=row['employee__department_id'], date=row['date'], **stats
+            ))
+
+        with transaction.atomic():
+            if stats_rows:
+                DepartmentDailyStats.objects.bulk_create(
+                    stats_rows,
+                    update_conflicts=True,
+                    unique_fields=['department', 'date'],
+                    update_fields=DEPARTMENT_STATS_FIELDS + ['updated_at'],
+                    batch_size=500,
+                )
+            # Departments left without summaries on these dates
+            kept = {(stats.department_id, stats.date) for stats in stats_rows}
+            stale_ids = [
+                stats_id
+                for stats_id, department_id, day in DepartmentDailyStats.objects.filter(
+                    date__in=chunk
+                ).values_list('id', 'department_id', 'date')
+                if (department_id, day) not in kept
+            ]
+            if stale_ids:
+                DepartmentDailyStats.objects.filter(id__in=stale_ids).delete()
+        written += len(stats_rows)
+
+    return written
+
+
+def get_department_stats(start_date, end_date, department_ids=None):
+    """
+    DepartmentDailyStats summed per department over start_date..end_date.
+
+    Dates without any stats row (not backfilled yet) are aggregated from
+    DailyTimeSummary instead: one query for the built dates, one for the
+    others when there are any.
+
+    Returns:
+        dict: department_id -> dict of summed stats (departments without rows are absent)
+    """
+    from .models import DailyTimeSummary, DepartmentDailyStats
+
+    stats_rows = DepartmentDailyStats.objects.filter(date__gte=start_date, date__lte=end_date)
+    # Stats cover every department of a date, so a date is built or not as a whole
+    built_dates = set(stats_rows.order_by().values_list('date', flat=True).distinct())
+    missing_dates = [
+        start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)
+        if start_date + timedelta(days=i) not in built_dates
+    ]
+    if department_ids is not None:
+        stats_rows = stats_rows.filter(department_id__in=department_ids)
+    rows = list(
+        stats_rows.order_by()
+        .values('department_id')
+        .annotate(**{AGGREGATE_PREFIX + field: Sum(field) for field in DEPARTMENT_STATS_FIELDS})
+    )
+    if missing_dates:
+        summaries = DailyTimeSummary.objects.filter(date__in=missing_dates)
+        if department_ids is not None:
+            summaries = summaries.filter(employee__department_id__in=department_ids)
+        rows += [
+            dict(row, department_id=row['employee__department_id'])
+            for row in summaries.order_by().values('employee__department_id')
+            .annotate(**department_stats_aggregates())
+        ]
+
+    result = {}
+    for row in rows:
+        stats = result.setdefault(row['department_id'], empty_department_stats())
+        add_department_stats(stats, row, AGGREGATE_PREFIX)
+    return result
+
+
+def refresh_rollups(keys):
+    """Bring every rollup derived from the given (employee_id, date) summaries up to date"""
+    keys = set(keys)
+    if not keys:
+        return
+    refresh_period_rollups(keys)
+    refresh_department_daily_stats(day for _, day in keys)
+
+    # Dashboards show today's department and company stats
+    from .dashboard_cache import record_dashboard_changes
+    today = timezone.localdate()
+    changed_today = {employee_id for employee_id, day in keys if day == today}
+    if changed_today:
+        record_dashboard_changes(changed_today)
+
+
+def _flush_summary_changes():
+    pending = getattr(_local, 'pending', None)
+    if not pending:
+        return
+    _local.pending = set()
+    try:
+        refresh_rollups(pending)
+    except Exception as e:
+        logger.error(f"Error refreshing summary rollups: {str(e)}", exc_info=True)
+
+
+def record_summary_changes(keys):
+    """
+    Record (employee_id, date) keys whose DailyTimeSummary rows were written or
+    deleted. The rollups are refreshed once per transaction, on commit
+    (immediately in autocommit mode).
+    """
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    _local.pending.update(keys)
+    transaction.on_commit(_flush_summary_changes)
+
+
+def split_into_periods(start_date, end_date):
+    """
+    Cover start_date..end_date with whole months, then whole weeks, and the
+    remaining single days.
+
+    Returns:
+        tuple: (list of (period_type, period_start), list of (start, end) day ranges)
+    """
+    periods = []
+    day_ranges = []
+    current = start_date
+    while current <= end_date:
+        month_last = period_end('month', current)
+        if current.day == 1 and month_last <= end_date:
+            periods.append(('month', current))
+            current = month_last + timedelta(days=1)
+        elif current.weekday() == 0 and current + timedelta(days=6) <= end_date:
+            periods.append(('week', current))
+            current += timedelta(days=7)
+        else:
+            if day_ranges and day_ranges[-1][1] == current - timedelta(days=1):
+                day_ranges[-1] = (day_ranges[-1][0], current)
+            else:
+                day_ranges.append((current, current))
+            current += timedelta(days=1)
+    return periods, day_ranges
+
+
+def get_period_totals(employee_ids, start_date, end_date):
+    """
+    Totals of every rollup field per employee over start_date..end_date.
+
+    Whole months and weeks are read from EmployeePeriodRollup; the remaining
+    edge days, and the periods of employees without a rollup row for them
+    (not backfilled yet, or no summaries at all), are aggregated from
+    DailyTimeSummary in the database. Either part is a single query.
+
+    Args:
+        employee_ids: Employee primary keys (a list or a values_list queryset)
+        start_date: First date of the range
+        end_date: Last date of the range (inclusive)
+
+    Returns:
+        dict: employee_id -> dict of totals (employees without rows are absent)
+    """
+    from .models import DailyTimeSummary, EmployeePeriodRollup
+
+    periods, day_ranges = split_into_periods(start_date, end_date)
+    totals = defaultdict(empty_totals)
+    live_condition = Q()
+    for range_start, range_end in day_ranges:
+        live_condition |= Q(date__gte=range_start, date__lte=range_end)
+
+    if periods:
+        employee_ids = list(employee_ids)
+        covered = defaultdict(set)
+        starts_by_type = defaultdict(list)
+        for period_type, start in periods:
+            starts_by_type[period_type].append(start)
+        condition = Q()
+        for period_type, starts in starts_by_type.items():
+            condition |= Q(period_type=period_type, period_start__in=starts)
+        rows = EmployeePeriodRollup.objects.filter(
+            condition, employee_id__in=employee_ids
+        ).order_by().values('employee_id', 'period_type', 'period_start', *ROLLUP_FIELDS)
+        for row in rows:
+            _add_totals(totals[row['employee_id']], row)
+            covered[(row['period_type'], row['period_start'])].add(row['employee_id'])
+
+        # Periods without a rollup row are aggregated live for those employees
+        requested = set(employee_ids)
+        for period_type, start in periods:
+            missing = requested - covered[(period_type, start)]
+            if missing:
+                live_condition |= Q(
+                    employee_id__in=missing,
+                    date__gte=start,
+                    date__lte=period_end(period_type, start)
+                )
+
+    if live_condition:
+        rows = (
+            DailyTimeSummary.objects.filter(live_condition, employee_id__in=employee_ids)
+            .order_by()
+            .values('employee_id')
+            .annotate(**summary_aggregates())
+        )
+        for row in rows:
+            _add_totals(totals[row['employee_id']], row, AGGREGATE_PREFIX)
+
+    return dict(totals)
+
+
+def sum_totals(totals_by_employee):
+    """Add up per-employee totals from get_period_totals"""
+    combined = empty_totals()
+    for totals in totals_by_employee.values():
+        _add_totals(combined, totals)
+    return combined
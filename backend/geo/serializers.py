@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from .models import (
     Location, Department, Employee, TimeEntry, WorkSession, 
     TimeCorrectionRequest, OvertimeRequest, LeaveRequest, ChangeScheduleRequest,
-    ScheduleTemplate, EmployeeSchedule, DailyTimeSummary
+    ScheduleTemplate, EmployeeSchedule, DailyTimeSummary, ReportJob
 )
 
 
@@ -460,6 +460,17 @@ class DailyTimeSummarySerializer(serializers.ModelSerializer):
         read_only_fields = ['calculated_at', 'updated_at']
 
 
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Serializer for ReportJob model (status polling; the artifact path stays server-side)"""
+    class Meta:
+        model = ReportJob
+        fields = [
+            'id', 'report_type', 'params', 'status', 'progress', 'rows_written',
+            'artifact_size', 'error', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
 # Bulk Schedule Creation Serializer
 class BulkScheduleSerializer(serializers.Serializer):
     template_id = serializers.IntegerField()
@@ -0,0 +1,191 @@
+"""
+Interval-based attribution of time entries to work dates.
+
+A night shift's time-out lands on the next calendar day, so looking entries
+up by calendar date needs several probing queries per day. Instead, one pass
+over an employee's entries sorted by event time pairs every time-in with the
+time-out that closes it, and assigns the pair to a work date using the
+employee's schedule intervals. The cost is O(n) in the number of entries of
+the range plus two range queries.
+"""
+
+from datetime import datetime, timedelta
+
+from .summary_engine import MANILA_TZ, local_day_bounds
+
+# How long before a scheduled start a time-in still belongs to that shift
+EARLY_CLOCK_IN = timedelta(hours=4)
+# Longest time-in -> time-out gap paired across midnight (the old window search)
+SHIFT_PAIRING_WINDOW = timedelta(hours=12)
+
+
+class AttributedShift:
+    """Time-in/time-out sessions attributed to one work date"""
+
+    def __init__(self, work_date):
+        self.work_date = work_date
+        # [time_in_entry, time_out_entry]; either side may be None
+        self.sessions = []
+        self.entries = []
+
+    @property
+    def time_in_entry(self):
+        """First time-in of the shift"""
+        for time_in_entry, _ in self.sessions:
+            if time_in_entry:
+                return time_in_entry
+        return None
+
+    @property
+    def time_out_entry(self):
+        """Last time-out of the shift"""
+        for _, time_out_entry in reversed(self.sessions):
+            if time_out_entry:
+                return time_out_entry
+        return None
+
+
+def entry_moment(entry):
+    """The time an entry is attributed by (event_time, falling back to timestamp)"""
+    return entry.event_time or entry.timestamp
+
+
+def schedule_interval(schedule):
+    """
+    Return the aware (start, end) of a schedule, with end on the next day for
+    overnight shifts, or None when the schedule has no times.
+    """
+    if not schedule or not schedule.scheduled_time_in or not schedule.scheduled_time_out:
+        return None
+    start = MANILA_TZ.localize(datetime.combine(schedule.date, schedule.scheduled_time_in))
+    end = MANILA_TZ.localize(datetime.combine(schedule.date, schedule.scheduled_time_out))
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+def _work_date_for_time_in(local_moment, schedules_by_date):
+    """
+    A time-in belongs to the previous day when it falls inside that day's
+    overnight shift (e.g. a late clock-in at 00:30 for a 22:00-06:00 shift);
+    otherwise to its own calendar date.
+    """
+    day = local_moment.date()
+    for candidate in (day, day - timedelta(days=1)):
+        interval = schedule_interval(schedules_by_date.get(candidate))
+        if interval and interval[0] - EARLY_CLOCK_IN <= local_moment < interval[1]:
+            return candidate
+    return day
+
+
+def attribute_shifts(entries, schedules_by_date):
+    """
+    Pair time-ins with time-outs and attribute each pair to a work date.
+
+    Args:
+        entries: One employee's TimeEntry objects sorted by event_time
+        schedules_by_date: Dict of date -> EmployeeSchedule for the range
+                           (including the days around it)
+
+    Returns:
+        dict: work date -> AttributedShift
+
+    A time-out closes the open time-in when it is on the same calendar day or
+    within SHIFT_PAIRING_WINDOW of it. A time-out with nothing to close is
+    attributed to its own calendar date.
+    """
+    shifts = {}
+    open_shift = None
+    open_session = None
+    open_moment = None
+
+    def shift_for(work_date):
+        if work_date not in shifts:
+            shifts[work_date] = AttributedShift(work_date)
+        return shifts[work_date]
+
+    for entry in entries:
+        local_moment = entry_moment(entry).astimezone(MANILA_TZ)
+
+        if entry.entry_type == 'time_in':
+            open_shift = shift_for(_work_date_for_time_in(local_moment, schedules_by_date))
+            open_session = [entry, None]
+            open_shift.sessions.append(open_session)
+            open_shift.entries.append(entry)
+            open_moment = local_moment
+        elif entry.entry_type == 'time_out':
+            if open_shift is not None and (
+                local_moment.date() == open_moment.date()
+                or local_moment - open_moment <= SHIFT_PAIRING_WINDOW
+            ):
+                open_session[1] = entry
+                open_shift.entries.append(entry)
+            else:
+                shift = shift_for(local_moment.date())
+                shift.sessions.append([None, entry])
+                shift.entries.append(entry)
+            open_shift = None
+            open_session = None
+            open_moment = None
+
+    return shifts
+
+
+def load_attribution_entries(employee, start_date, end_date):
+    """
+    Entries attribute_shifts needs for work dates start_date..end_date, in one
+    range query.
+
+    Entries start a day early so a time-out closing the previous night shift
+    is not mistaken for one of start_date, and run a day late so night shifts
+    of end_date get their morning time-out.
+
+    Returns:
+        list: TimeEntry objects sorted by event_time
+    """
+    from .models import TimeEntry
+
+    window_start, window_end = local_day_bounds(
+        start_date - timedelta(days=1), end_date + timedelta(days=1)
+    )
+    return list(
+        TimeEntry.objects.filter(
+            employee=employee,
+            event_time__gte=window_start,
+            event_time__lt=window_end
+        ).order_by('event_time', 'id')
+    )
+
+
+def load_attribution_schedules(employee, start_date, end_date):
+    """
+    Schedules attribute_shifts needs for work dates start_date..end_date, in
+    one range query.
+
+    Returns:
+        dict: date -> EmployeeSchedule
+    """
+    from .models import EmployeeSchedule
+
+    return {
+        schedule.date: schedule
+        for schedule in EmployeeSchedule.objects.filter(
+            employee=employee,
+            date__gte=start_date - timedelta(days=1),
+            date__lte=end_date + timedelta(days=1)
+        )
+    }
+
+
+def load_attribution_inputs(employee, start_date, end_date):
+    """
+    Load what attribute_shifts needs for work dates start_date..end_date in
+    two range queries.
+
+    Returns:
+        tuple: (entries sorted by event_time, dict of date -> EmployeeSchedule)
+    """
+    return (
+        load_attribution_entries(employee, start_date, end_date),
+        load_attribution_schedules(employee, start_date, end_date),
+    )
@@ -2,10 +2,16 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from datetime import date
+from django.db import transaction
 import logging
 
-from .models import TimeEntry, DailyTimeSummary, EmployeeSchedule
-from .utils import generate_daily_time_summary_from_entries
+from .models import TimeEntry, DailyTimeSummary, EmployeeSchedule, Location
+from .summary_queue import record_dirty
+from .rollups import record_summary_changes
+from .presence import apply_clock_event, rebuild_presence, schedule_presence_rebuild
+from .dashboard_cache import record_dashboard_changes
+from .clock_events import publish_clock_event
+from .geofence_index import invalidate_geofence_index
 
 logger = logging.getLogger(__name__)
 
@@ -30,16 +36,10 @@ def update_daily_summary_on_time_entry_save(sender, instance, created, **kwargs)
         manila_timestamp = utc_timestamp.astimezone(manila_tz)
         entry_date = manila_timestamp.date()
         
-        logger.info(f"Updating daily summary for employee {instance.employee.employee_id} on {entry_date} after {'creating' if created else 'updating'} time entry")
+        # Record the date as dirty; it is queued (or recomputed) once on commit
+        record_dirty([(instance.employee_id, entry_date)])
         
-        # Generate/update the daily summary for this specific date
-        result = generate_daily_time_summary_from_entries(
-            employee=instance.employee,
-            start_date=entry_date,
-            end_date=entry_date
-        )
-        
-        logger.info(f"Successfully updated daily summary for {entry_date}: {result}")
+        logger.info(f"Recorded dirty daily summary for employee {instance.employee_id} on {entry_date} after {'creating' if created else 'updating'} time entry")
         
     except Exception as e:
         logger.error(f"Error updating daily summary for time entry {instance.id}: {str(e)}", exc_info=True)
@@ -64,20 +64,64 @@ def update_daily_summary_on_time_entry_delete(sender, instance, **kwargs):
         manila_timestamp = utc_timestamp.astimezone(manila_tz)
         entry_date = manila_timestamp.date()
         
-        logger.info(f"Updating daily summary for employee {instance.employee.employee_id} on {entry_date} after deleting time entry")
-        
-        # Generate/update the daily summary for this specific date
-        result = generate_daily_time_summary_from_entries(
-            employee=instance.employee,
-            start_date=entry_date,
-            end_date=entry_date
-        )
+        # Record the date as dirty; it is queued (or recomputed) once on commit
+        record_dirty([(instance.employee_id, entry_date)])
         
-        logger.info(f"Successfully updated daily summary for {entry_date} after deletion: {result}")
+        logger.info(f"Recorded dirty daily summary for employee {instance.employee_id} on {entry_date} after deleting time entry")
         
     except Exception as e:
         logger.error(f"Error updating daily summary after deleting time entry {instance.id}: {str(e)}", exc_info=True)
 
+@receiver(post_save, sender=TimeEntry)
+def update_presence_on_time_entry_save(sender, instance, created, **kwargs):
+    """
+    Keep EmployeePresence in step with time entries and append the clock event
+    for live boards. Runs inside the writer's transaction, so the entry, the
+    presence row and the event commit together.
+    """
+    try:
+        if created:
+            presence = apply_clock_event(instance)
+        else:
+            # Edits (corrections) can change which entry is the latest
+            presence = rebuild_presence(instance.employee_id)
+        # Feed live boards (server-sent events) from the same transaction
+        publish_clock_event(instance, presence, change='created' if created else 'updated')
+    except Exception as e:
+        logger.error(f"Error updating presence for time entry {instance.id}: {str(e)}", exc_info=True)
+
+@receiver(post_delete, sender=TimeEntry)
+def update_presence_on_time_entry_delete(sender, instance, **kwargs):
+    """
+    Rebuild EmployeePresence after a time entry is deleted. Deferred to commit
+    because the employee itself may be the one being deleted.
+    """
+    try:
+        schedule_presence_rebuild(instance.employee_id)
+    except Exception as e:
+        logger.error(f"Error scheduling presence rebuild after deleting time entry {instance.id}: {str(e)}", exc_info=True)
+
+@receiver(post_save, sender=TimeEntry)
+def invalidate_dashboards_on_time_entry_save(sender, instance, created, **kwargs):
+    """
+    Invalidate the cached dashboards of the employee, their department and the
+    company once the clock event commits.
+    """
+    try:
+        record_dashboard_changes([instance.employee_id])
+    except Exception as e:
+        logger.error(f"Error invalidating dashboards for time entry {instance.id}: {str(e)}", exc_info=True)
+
+@receiver(post_delete, sender=TimeEntry)
+def invalidate_dashboards_on_time_entry_delete(sender, instance, **kwargs):
+    """
+    Invalidate the cached dashboards affected by a deleted time entry.
+    """
+    try:
+        record_dashboard_changes([instance.employee_id])
+    except Exception as e:
+        logger.error(f"Error invalidating dashboards after deleting time entry {instance.id}: {str(e)}", exc_info=True)
+
 @receiver(post_save, sender=EmployeeSchedule)
 def update_daily_summary_on_schedule_save(sender, instance, created, **kwargs):
     """
@@ -86,18 +130,11 @@ def update_daily_summary_on_schedule_save(sender, instance, created, **kwargs):
     """
     try:
         schedule_date = instance.date
-        employee = instance.employee
-        
-        logger.info(f"Updating daily summary for employee {employee.employee_id} on {schedule_date} after {'creating' if created else 'updating'} schedule")
         
-        # Generate/update the daily summary for this specific date
-        result = generate_daily_time_summary_from_entries(
-            employee=employee,
-            start_date=schedule_date,
-            end_date=schedule_date
-        )
+        # Record the date as dirty; it is queued (or recomputed) once on commit
+        record_dirty([(instance.employee_id, schedule_date)])
         
-        logger.info(f"Successfully updated daily summary for {schedule_date} after schedule {'creation' if created else 'update'}: {result}")
+        logger.info(f"Recorded dirty daily summary for employee {instance.employee_id} on {schedule_date} after {'creating' if created else 'updating'} schedule")
         
     except Exception as e:
         logger.error(f"Error updating daily summary for schedule {instance.id}: {str(e)}", exc_info=True)
@@ -109,18 +146,46 @@ def update_daily_summary_on_schedule_delete(sender, instance, **kwargs):
     """
     try:
         schedule_date = instance.date
-        employee = instance.employee
-        
-        logger.info(f"Updating daily summary for employee {employee.employee_id} on {schedule_date} after deleting schedule")
         
-        # Generate/update the daily summary for this specific date
-        result = generate_daily_time_summary_from_entries(
-            employee=employee,
-            start_date=schedule_date,
-            end_date=schedule_date
-        )
+        # Record the date as dirty; it is queued (or recomputed) once on commit
+        record_dirty([(instance.employee_id, schedule_date)])
         
-        logger.info(f"Successfully updated daily summary for {schedule_date} after schedule deletion: {result}")
+        logger.info(f"Recorded dirty daily summary for employee {instance.employee_id} on {schedule_date} after deleting schedule")
         
     except Exception as e:
         logger.error(f"Error updating daily summary after deleting schedule {instance.id}: {str(e)}", exc_info=True)
+
+@receiver(post_save, sender=DailyTimeSummary)
+def update_rollups_on_summary_save(sender, instance, created, **kwargs):
+    """
+    Keep the period rollups in step with daily summaries saved one at a time.
+    Bulk writes from the summary engine record their changes themselves.
+    """
+    try:
+        record_summary_changes([(instance.employee_id, instance.date)])
+    except Exception as e:
+        logger.error(f"Error recording rollup change for daily summary {instance.id}: {str(e)}", exc_info=True)
+
+@receiver(post_delete, sender=DailyTimeSummary)
+def update_rollups_on_summary_delete(sender, instance, **kwargs):
+    """
+    Keep the period rollups in step when a daily summary is deleted.
+    """
+    try:
+        record_summary_changes([(instance.employee_id, instance.date)])
+    except Exception as e:
+        logger.error(f"Error recording rollup change after deleting daily summary {instance.id}: {str(e)}", exc_info=True)
+
+@receiver(post_save, sender=Location)
+def invalidate_geofence_index_on_location_save(sender, instance, created, **kwargs):
+    """
+    Rebuild every worker's geofence index after a Location is added or moved.
+    """
+    transaction.on_commit(invalidate_geofence_index)
+
+@receiver(post_delete, sender=Location)
+def invalidate_geofence_index_on_location_delete(sender, instance, **kwargs):
+    """
+    Rebuild every worker's geofence index after a Location is deleted.
+    """
+    transaction.on_commit(invalidate_geofence_index)
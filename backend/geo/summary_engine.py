@@ -0,0 +1,573 @@
+"""
+Batch rebuild engine for DailyTimeSummary.
+
+Rebuilding summaries one (employee, day) at a time costs a get_or_create, a
+schedule lookup and a full save per row. This module loads every TimeEntry,
+EmployeeSchedule and existing DailyTimeSummary for a set of employees and a
+date window in a few range queries, computes all rows in memory and writes
+them back with bulk_create/bulk_update in chunks.
+
+The per-row rules are the same ones used by
+``generate_daily_time_summary_from_entries``; status and metrics are computed
+for the whole chunk at once by ``geo.metrics_kernel``.
+
+Every row written by the engine stores SUMMARY_CALC_VERSION and a fingerprint
+of its inputs. Rows whose inputs and calculation version are unchanged are
+neither recomputed nor written unless the caller passes force=True.
+recalculate_summaries() applies the same rule to rows chosen by the caller.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import hashlib
+import logging
+
+import pytz
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+MANILA_TZ = pytz.timezone('Asia/Manila')
+
+# Employees handled per load/compute/write cycle (bounds memory use)
+EMPLOYEE_CHUNK_SIZE = 200
+# Rows per INSERT/UPDATE statement
+WRITE_BATCH_SIZE = 500
+# Bump whenever the status/metrics rules change so stored rows get recomputed
+SUMMARY_CALC_VERSION = 1
+
+SUMMARY_UPDATE_FIELDS = [
+    'time_in', 'time_out', 'time_in_entry', 'time_out_entry',
+    'scheduled_time_in', 'scheduled_time_out', 'schedule_reference',
+    'status', 'billed_hours', 'late_minutes', 'undertime_minutes',
+    'night_differential_hours', 'overtime_hours',
+    'total_break_minutes', 'lunch_break_minutes', 'updated_at',
+    'calc_version', 'input_fingerprint',
+]
+
+
+def local_day_bounds(start_date, end_date):
+    """
+    Return the aware datetimes bounding the Manila-local days start_date..end_date.
+
+    Returns:
+        tuple: (window_start, window_end) where window_end is exclusive
+    """
+    window_start = MANILA_TZ.localize(datetime.combine(start_date, time.min))
+    window_end = MANILA_TZ.localize(datetime.combine(end_date + timedelta(days=1), time.min))
+    return window_start, window_end
+
+
+def load_entries_by_day(employee_ids, start_date, end_date):
+    """
+    Load time entries for the employees in one range query and bucket them by
+    (employee_id, Manila-local date), each bucket ordered by timestamp.
+
+    Entries are bucketed by the calendar day they were recorded on, the same
+    rule as generate_daily_time_summary_from_entries: a night shift's morning
+    time-out belongs to the next day's bucket, not the shift's. Reports that
+    pair night-shift time-outs with their shift go through
+    shift_attribution.attribute_shifts instead.
+    """
+    from .models import TimeEntry
+
+    window_start, window_end = local_day_bounds(start_date, end_date)
+    entries = TimeEntry.objects.filter(
+        employee_id__in=employee_ids,
+        timestamp__gte=window_start,
+        timestamp__lt=window_end
+    ).order_by('employee_id', 'timestamp', 'id')
+
+    buckets = defaultdict(list)
+    for entry in entries:
+        local_date = entry.timestamp.astimezone(MANILA_TZ).date()
+        buckets[(entry.employee_id, local_date)].append(entry)
+    return buckets
+
+
+def assign_sources(summary, employee, schedule, time_entries):
+    """
+    Copy the day's time in/out, schedule and break minutes onto a summary.
+
+    Args:
+        summary: DailyTimeSummary instance (saved or unsaved)
+        employee: Employee the summary belongs to
+        schedule: EmployeeSchedule for the date or None
+        time_entries: The day's TimeEntry list ordered by timestamp
+    """
+    from .utils import BreakDetector
+
+    time_in_entry = None
+    time_out_entry = None
+    time_in = None
+    time_out = None
+
+    for entry in time_entries:
+        manila_timestamp = entry.timestamp.astimezone(MANILA_TZ)
+        if entry.entry_type == 'time_in' and not time_in_entry:
+            time_in_entry = entry
+            time_in = manila_timestamp.time()
+        elif entry.entry_type == 'time_out' and not time_out_entry:
+            time_out_entry = entry
+            time_out = manila_timestamp.time()
+
+    summary.employee = employee
+    summary.time_in = time_in
+    summary.time_out = time_out
+    summary.time_in_entry = time_in_entry
+    summary.time_out_entry = time_out_entry
+
+    if schedule:
+        summary.scheduled_time_in = schedule.scheduled_time_in
+        summary.scheduled_time_out = schedule.scheduled_time_out
+        summary.schedule_reference = schedule
+    else:
+        summary.scheduled_time_in = None
+        summary.scheduled_time_out = None
+        summary.schedule_reference = None
+
+    if time_in and time_out and len(time_entries) > 2:
+        breaks = BreakDetector.detect_breaks(time_entries, employee.break_threshold_minutes)
+        summary.total_break_minutes = sum(b['duration_minutes'] for b in breaks)
+    elif time_in and time_out:
+        summary.total_break_minutes = int(employee.flexible_break_hours * 60)
+    return summary
+
+
+def summary_input_fingerprint(employee, day, schedule, time_entries, today):
+    """
+    Hash everything a summary row is computed from.
+
+    Covers the day's entries (ids, types, timestamps and event times), the
+    schedule's in/out times, the employee's attendance policy fields and
+    whether the day is in the past, today or the future (which decides
+    between absent and scheduled).
+
+    Returns:
+        str: 40-character hex digest
+    """
+    day_phase = (day > today) - (day < today)
+    parts = [
+        day.isoformat(),
+        str(day_phase),
+        str(employee.daily_work_hours),
+        str(employee.overtime_threshold_hours),
+        str(employee.flexible_break_hours),
+        str(employee.break_threshold_minutes),
+        str(employee.grace_period_minutes),
+    ]
+    if schedule:
+        parts.append(f'{schedule.id}:{schedule.scheduled_time_in}:{schedule.scheduled_time_out}')
+    else:
+        parts.append('-')
+    for entry in time_entries:
+        parts.append(
+            f'{entry.id}:{entry.entry_type}:{entry.timestamp.isoformat()}:'
+            f'{entry.event_time.isoformat() if entry.event_time else ""}'
+        )
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def current_input_fingerprints(summaries, today=None, employee_chunk_size=EMPLOYEE_CHUNK_SIZE):
+    """
+    Fingerprint the current inputs of existing summary rows.
+
+    Entries and schedules are range-loaded per chunk of employees, so this
+    costs two queries per chunk.
+
+    Returns:
+        dict: summary pk -> fingerprint
+    """
+    from .models import EmployeeSchedule
+
+    if today is None:
+        today = date.today()
+
+    by_employee = defaultdict(list)
+    for summary in summaries:
+        by_employee[summary.employee_id].append(summary)
+    employee_ids = list(by_employee)
+
+    fingerprints = {}
+    for offset in range(0, len(employee_ids), employee_chunk_size):
+        chunk_ids = employee_ids[offset:offset + employee_chunk_size]
+        chunk = [summary for employee_id in chunk_ids for summary in by_employee[employee_id]]
+        start_date = min(summary.date for summary in chunk)
+        end_date = max(summary.date for summary in chunk)
+
+        entries_by_day = load_entries_by_day(chunk_ids, start_date, end_date)
+        schedules = {
+            (s.employee_id, s.date): s
+            for s in EmployeeSchedule.objects.filter(
+                employee_id__in=chunk_ids,
+                date__gte=start_date,
+                date__lte=end_date
+            )
+        }
+        for summary in chunk:
+            key = (summary.employee_id, summary.date)
+            fingerprints[summary.pk] = summary_input_fingerprint(
+                summary.employee, summary.date, schedules.get(key),
+                entries_by_day.get(key, []), today
+            )
+    return fingerprints
+
+
+def recalculate_summaries(summaries, today=None, force=False):
+    """
+    Bring existing summary rows up to date, for the recalculation commands.
+
+    Rows whose inputs changed since they were computed (or that have no
+    fingerprint yet) are rebuilt from their entries and schedule by the
+    engine, which stores the new fingerprint. Rows whose inputs are unchanged
+    but were computed by an older calculation version (any row with
+    force=True) only have their metrics recomputed. Other rows are left alone.
+
+    Args:
+        summaries: DailyTimeSummary instances with employee loaded; rows
+                   recalculated in place are updated on these instances
+
+    Returns:
+        dict: {'recalculated': list of rows whose metrics were recomputed,
+               'rebuilt': list of (employee_id, date) keys rebuilt,
+               'unchanged': int, 'skipped': int}
+    """
+    if today is None:
+        today = date.today()
+
+    fingerprints = current_input_fingerprints(summaries, today=today)
+    recalculated = []
+    rebuilt = []
+    unchanged_count = 0
+    for summary in summaries:
+        if summary.input_fingerprint != fingerprints[summary.pk]:
+            rebuilt.append((summary.employee_id, summary.date))
+        elif force or summary.calc_version != SUMMARY_CALC_VERSION:
+            recalculated.append(summary)
+        else:
+            unchanged_count += 1
+
+    for offset in range(0, len(recalculated), WRITE_BATCH_SIZE):
+        chunk = recalculated[offset:offset + WRITE_BATCH_SIZE]
+        compute_summaries(chunk, today=today, include_status=False)
+        for summary in chunk:
+            summary.calc_version = SUMMARY_CALC_VERSION
+        write_summaries([], chunk)
+
+    skipped_count = 0
+    if rebuilt:
+        skipped_count = rebuild_summary_keys(rebuilt, force=True)['skipped']
+
+    return {
+        'recalculated': recalculated,
+        'rebuilt': rebuilt,
+        'unchanged': unchanged_count,
+        'skipped': skipped_count,
+    }
+
+
+def compute_summaries(summaries, today=None, include_status=True):
+    """
+    Compute status and metrics for a list of summaries in one vectorized pass.
+
+    Applies the same rules, in the same order, as calling
+    calculate_comprehensive_status() then calculate_metrics() on each row, but
+    through geo.metrics_kernel. Nothing is saved; emergency time-outs are
+    queued on the rows for write_summaries. With include_status=False only
+    the calculate_metrics() part is applied.
+    """
+    import numpy as np
+    from .metrics_kernel import (
+        STATUS_CODES, compute_status, compute_metrics, time_to_minutes, minutes_to_time
+    )
+
+    if not summaries:
+        return summaries
+    if today is None:
+        today = date.today()
+
+    sched_in = np.array([time_to_minutes(s.scheduled_time_in) for s in summaries])
+    sched_out = np.array([time_to_minutes(s.scheduled_time_out) for s in summaries])
+    time_in = np.array([time_to_minutes(s.time_in) for s in summaries])
+    time_out = np.array([time_to_minutes(s.time_out) for s in summaries])
+    day_offset = np.array([(s.date - today).days for s in summaries])
+    flexible_break = np.array([int(s.employee.flexible_break_hours * 60) for s in summaries])
+    grace = np.array([s.employee.grace_period_minutes for s in summaries])
+    daily_work = np.array([int(s.employee.daily_work_hours * 60) for s in summaries])
+    ot_threshold = np.array([float(s.employee.overtime_threshold_hours) for s in summaries])
+
+    status_codes, shift_void = compute_status(sched_in, sched_out, time_in, time_out, day_offset)
+    metrics = compute_metrics(
+        sched_in, sched_out, time_in, time_out, flexible_break, grace, daily_work, ot_threshold
+    )
+
+    for i, summary in enumerate(summaries):
+        if include_status:
+            summary.status = STATUS_CODES[status_codes[i]]
+        if include_status and shift_void[i]:
+            # calculate_comprehensive_status zeroes a void shift before
+            # calculate_metrics recomputes it; only the lunch break survives
+            summary.lunch_break_minutes = 0
+
+        if not metrics['computed'][i]:
+            continue
+
+        billed_hours = float(metrics['billed_hours'][i])
+        summary.billed_hours = billed_hours
+        if metrics['has_late'][i]:
+            summary.late_minutes = int(metrics['late_minutes'][i])
+        summary.undertime_minutes = int(metrics['undertime_minutes'][i])
+        if metrics['overtime_hours'][i] > 0:
+            summary.overtime_hours = Decimal(str(billed_hours)) - summary.employee.overtime_threshold_hours
+        else:
+            summary.overtime_hours = Decimal('0.00')
+        night_differential = float(metrics['night_differential_hours'][i])
+        summary.night_differential_hours = night_differential if night_differential > 0 else Decimal('0.00')
+
+        if not np.isnan(metrics['emergency_minutes'][i]):
+            actual_time_out = datetime.combine(
+                summary.date, minutes_to_time(metrics['emergency_time_out'][i])
+            )
+            if not hasattr(summary, '_pending_emergency_timeouts'):
+                summary._pending_emergency_timeouts = []
+            summary._pending_emergency_timeouts.append(
+                (int(metrics['emergency_minutes'][i]), actual_time_out)
+            )
+    return summaries
+
+
+def write_summaries(to_create, to_update):
+    """
+    Write computed summaries in chunks, apply any deferred emergency flags and
+    record the changed rows for the period rollups.
+    """
+    from .models import DailyTimeSummary
+    from .rollups import record_summary_changes
+
+    now = timezone.now()
+    for summary in to_update:
+        summary.updated_at = now
+
+    with transaction.atomic():
+        if to_create:
+            # Another writer (a drain or a post-commit recompute) may have
+            # created the same day meanwhile: update its row instead of failing
+            DailyTimeSummary.objects.bulk_create(
+                to_create,
+                batch_size=WRITE_BATCH_SIZE,
+                update_conflicts=True,
+                unique_fields=['employee', 'date'],
+                update_fields=SUMMARY_UPDATE_FIELDS,
+            )
+        if to_update:
+            DailyTimeSummary.objects.bulk_update(
+                to_update, SUMMARY_UPDATE_FIELDS, batch_size=WRITE_BATCH_SIZE
+            )
+        record_summary_changes(
+            (summary.employee_id, summary.date) for summary in list(to_create) + list(to_update)
+        )
+
+    # Emergency time-out requests reference the summary row, so they can only
+    # be recorded once the rows exist. They are rare, so one write each is fine.
+    # Upserted rows come back without a primary key: look up the flagged ones.
+    unsaved = {
+        (summary.employee_id, summary.date): summary for summary in to_create
+        if summary.pk is None and getattr(summary, '_pending_emergency_timeouts', None)
+    }
+    if unsaved:
+        for summary_id, employee_id, day in DailyTimeSummary.objects.filter(
+            employee_id__in={employee_id for employee_id, _ in unsaved},
+            date__in={day for _, day in unsaved},
+        ).values_list('id', 'employee_id', 'date'):
+            if (employee_id, day) in unsaved:
+                unsaved[(employee_id, day)].pk = summary_id
+    for summary in list(to_create) + list(to_update):
+        pending = getattr(summary, '_pending_emergency_timeouts', None)
+        if not pending or summary.pk is None:
+            continue
+        for time_out_diff_minutes, actual_time_out in pending:
+            summary._flag_emergency_timeout(time_out_diff_minutes, actual_time_out)
+        summary._pending_emergency_timeouts = []
+
+
+def _rebuild_chunk(employees, dates_by_employee, start_date, end_date, force=False):
+    """
+    Rebuild the given dates for a chunk of employees.
+
+    Loads entries, schedules and existing summaries for the chunk over
+    [start_date, end_date] with three range queries, computes the requested
+    rows whose inputs changed (all of them with force=True) and writes them
+    in bulk.
+
+    Returns:
+        tuple: (created, updated, skipped, unchanged)
+    """
+    from .models import EmployeeSchedule, DailyTimeSummary
+
+    employee_ids = [emp.id for emp in employees]
+
+    entries_by_day = load_entries_by_day(employee_ids, start_date, end_date)
+    schedules = {
+        (s.employee_id, s.date): s
+        for s in EmployeeSchedule.objects.filter(
+            employee_id__in=employee_ids,
+            date__gte=start_date,
+            date__lte=end_date
+        )
+    }
+    existing = {
+        (s.employee_id, s.date): s
+        for s in DailyTimeSummary.objects.filter(
+            employee_id__in=employee_ids,
+            date__gte=start_date,
+            date__lte=end_date
+        )
+    }
+
+    today = date.today()
+    to_create = []
+    to_update = []
+    skipped_count = 0
+    unchanged_count = 0
+
+    for emp in employees:
+        for day in dates_by_employee[emp.id]:
+            key = (emp.id, day)
+            summary = existing.get(key)
+            is_new = summary is None
+            schedule = schedules.get(key)
+            time_entries = entries_by_day.get(key, [])
+            fingerprint = summary_input_fingerprint(emp, day, schedule, time_entries, today)
+
+            if (not force and not is_new
+                    and summary.calc_version == SUMMARY_CALC_VERSION
+                    and summary.input_fingerprint == fingerprint):
+                unchanged_count += 1
+                continue
+
+            if is_new:
+                summary = DailyTimeSummary(
+                    employee=emp,
+                    date=day,
+                    status='absent',
+                    is_weekend=day.weekday() >= 5,
+                )
+
+            try:
+                assign_sources(summary, emp, schedule, time_entries)
+            except Exception as e:
+                logger.error(f"Error processing {day} for {emp.full_name}: {e}")
+                skipped_count += 1
+                continue
+            summary.calc_version = SUMMARY_CALC_VERSION
+            summary.input_fingerprint = fingerprint
+
+            if is_new:
+                to_create.append(summary)
+            else:
+                to_update.append(summary)
+
+    compute_summaries(to_create + to_update, today=today)
+    write_summaries(to_create, to_update)
+    return len(to_create), len(to_update), skipped_count, unchanged_count
+
+
+def rebuild_daily_summaries(employees, start_date, end_date,
+                            employee_chunk_size=EMPLOYEE_CHUNK_SIZE, force=False):
+    """
+    Rebuild DailyTimeSummary rows for employees × [start_date, end_date] in bulk.
+
+    Each chunk of employees costs three range reads (entries, schedules,
+    existing summaries) plus chunked bulk writes, independent of the number
+    of days in the window.
+
+    Args:
+        employees: Iterable of Employee instances
+        start_date: First date to rebuild
+        end_date: Last date to rebuild (inclusive)
+        employee_chunk_size: Employees loaded and written per cycle
+        force: Recompute rows even when their input fingerprint is unchanged
+
+    Returns:
+        dict: created/updated/skipped/unchanged/total_processed counts
+    """
+    employees = list(employees)
+    dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        dates.append(current_date)
+        current_date += timedelta(days=1)
+
+    created_count = 0
+    updated_count = 0
+    skipped_count = 0
+    unchanged_count = 0
+
+    for offset in range(0, len(employees), employee_chunk_size):
+        chunk = employees[offset:offset + employee_chunk_size]
+        created, updated, skipped, unchanged = _rebuild_chunk(
+            chunk, {emp.id: dates for emp in chunk}, start_date, end_date, force=force
+        )
+        created_count += created
+        updated_count += updated
+        skipped_count += skipped
+        unchanged_count += unchanged
+
+    return {
+        'created': created_count,
+        'updated': updated_count,
+        'skipped': skipped_count,
+        'unchanged': unchanged_count,
+        'total_processed': created_count + updated_count + skipped_count + unchanged_count
+    }
+
+
+def rebuild_summary_keys(keys, employee_chunk_size=EMPLOYEE_CHUNK_SIZE, force=False):
+    """
+    Rebuild DailyTimeSummary rows for a set of (employee_id, date) keys in bulk.
+
+    Duplicate keys are coalesced, so each (employee, date) is computed once.
+
+    Args:
+        keys: Iterable of (employee_id, date) tuples
+        employee_chunk_size: Employees loaded and written per cycle
+        force: Recompute rows even when their input fingerprint is unchanged
+
+    Returns:
+        dict: created/updated/skipped/unchanged/total_processed counts
+    """
+    from .models import Employee
+
+    dates_by_employee = defaultdict(set)
+    for employee_id, day in keys:
+        dates_by_employee[employee_id].add(day)
+
+    employees = list(Employee.objects.filter(id__in=list(dates_by_employee)))
+
+    created_count = 0
+    updated_count = 0
+    skipped_count = 0
+    unchanged_count = 0
+
+    for offset in range(0, len(employees), employee_chunk_size):
+        chunk = employees[offset:offset + employee_chunk_size]
+        chunk_dates = {emp.id: sorted(dates_by_employee[emp.id]) for emp in chunk}
+        start_date = min(dates[0] for dates in chunk_dates.values())
+        end_date = max(dates[-1] for dates in chunk_dates.values())
+        created, updated, skipped, unchanged = _rebuild_chunk(
+            chunk, chunk_dates, start_date, end_date, force=force
+        )
+        created_count += created
+        updated_count += updated
+        skipped_count += skipped
+        unchanged_count += unchanged
+
+    return {
+        'created': created_count,
+        'updated': updated_count,
+        'skipped': skipped_count,
+        'unchanged': unchanged_count,
+        'total_processed': created_count + updated_count + skipped_count + unchanged_count
+    }
@@ -0,0 +1,274 @@
+"""
+Persistent dirty-queue for incremental DailyTimeSummary maintenance.
+
+Signals no longer recompute summaries inside the request. They upsert a
+SummaryDirtyMark for each affected (employee, date) and a drain worker later
+recomputes every marked key once through the batch engine. Repeated edits to
+the same day collapse into a single mark and therefore a single recompute.
+
+The drain runs from the ``drain_summary_marks`` management command (the
+geotime-summary-drain systemd unit), or for development from a daemon thread
+started lazily in the web process (the SUMMARY_DRAIN_THREAD setting). Marks
+are not claimed, so a single drain process is expected; the engine upserts
+its rows, so a post-commit recompute of the same day does not conflict.
+
+Signals go through ``record_dirty``, which collects keys per transaction and
+upserts them once in ``transaction.on_commit``. Bulk operations can wrap their
+work in ``coalesce_summary_recompute()`` to have every collected key recomputed
+exactly once, right after commit, instead of being queued.
+"""
+
+from contextlib import contextmanager
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Marks handled per drain batch
+DRAIN_BATCH_SIZE = 2000
+# Seconds the drain thread sleeps when it is not woken up by a new mark
+DRAIN_INTERVAL_SECONDS = 5
+
+_drain_thread = None
+_drain_thread_pid = None
+_drain_wakeup = threading.Event()
+_drain_thread_lock = threading.Lock()
+
+# Per-thread collector stack and keys waiting for the current transaction
+_local = threading.local()
+
+
+def mark_dirty(keys):
+    """
+    Upsert dirty marks for (employee_id, date) keys.
+
+    An existing mark has its marked_at bumped so that a drain already working
+    on the older mark does not delete it.
+    """
+    from .models import SummaryDirtyMark
+
+    now = timezone.now()
+    marks = [
+        SummaryDirtyMark(employee_id=employee_id, date=day, marked_at=now)
+        for employee_id, day in set(keys)
+    ]
+    if not marks:
+        return 0
+
+    SummaryDirtyMark.objects.bulk_create(
+        marks,
+        update_conflicts=True,
+        unique_fields=['employee', 'date'],
+        update_fields=['marked_at'],
+    )
+    transaction.on_commit(wake_drain_thread)
+    return len(marks)
+
+
+def drain_dirty_marks(limit=DRAIN_BATCH_SIZE):
+    """
+    Recompute the summaries of up to ``limit`` dirty marks, oldest first.
+
+    Marks re-marked while the batch was being computed are kept for the
+    next drain.
+
+    Returns:
+        dict: marks drained plus the engine's created/updated/skipped/unchanged counts
+    """
+    from .models import SummaryDirtyMark
+    from .summary_engine import rebuild_summary_keys
+
+    snapshot = timezone.now()
+    marks = list(
+        SummaryDirtyMark.objects.filter(marked_at__lte=snapshot)
+        .order_by('marked_at')
+        .values_list('id', 'employee_id', 'date')[:limit]
+    )
+    if not marks:
+        return {'marks': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'unchanged': 0, 'total_processed': 0}
+
+    result = rebuild_summary_keys((employee_id, day) for _, employee_id, day in marks)
+
+    SummaryDirtyMark.objects.filter(
+        id__in=[mark_id for mark_id, _, _ in marks],
+        marked_at__lte=snapshot
+    ).delete()
+
+    result['marks'] = len(marks)
+    return result
+
+
+def drain_all(limit=DRAIN_BATCH_SIZE):
+    """Drain batches until the queue is empty; returns summed counts"""
+    totals = {'marks': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'unchanged': 0, 'total_processed': 0}
+    while True:
+        result = drain_dirty_marks(limit)
+        for key in totals:
+            totals[key] += result.get(key, 0)
+        if result['marks'] < limit:
+            return totals
+
+
+def _drain_loop():
+    from django.db import close_old_connections
+
+    while True:
+        _drain_wakeup.wait(DRAIN_INTERVAL_SECONDS)
+        _drain_wakeup.clear()
+        try:
+            close_old_connections()
+            result = drain_all()
+            if result['marks']:
+                logger.info(f"Drained {result['marks']} summary dirty marks: {result}")
+        except Exception as e:
+            logger.error(f"Error draining summary dirty marks: {str(e)}", exc_info=True)
+        finally:
+            close_old_connections()
+
+
+def ensure_drain_thread():
+    """Start the in-process drain thread once per process, if enabled"""
+    global _drain_thread, _drain_thread_pid
+
+    if not getattr(settings, 'SUMMARY_DRAIN_THREAD', False):
+        return None
+
+    with _drain_thread_lock:
+        # A thread started before a fork does not exist in the child
+        if _drain_thread is None or _drain_thread_pid != os.getpid() or not _drain_thread.is_alive():
+            _drain_thread = threading.Thread(
+                target=_drain_loop, name='summary-drain', daemon=True
+            )
+            _drain_thread_pid = os.getpid()
+            _drain_thread.start()
+    return _drain_thread
+
+
+def wake_drain_thread():
+    """Ask the drain thread to run now instead of at its next interval"""
+    if ensure_drain_thread():
+        _drain_wakeup.set()
+
+
+class SummaryRecomputeCollector:
+    """
+    Collects (employee_id, date) keys touched inside a coalesce_summary_recompute()
+    block and recomputes each distinct key once after commit.
+    """
+
+    def __init__(self):
+        self.keys = set()
+        self.overrides = {}
+
+    def add(self, keys, recompute=None):
+        """
+        Add keys to recompute on commit.
+
+        Args:
+            keys: Iterable of (employee_id, date) tuples
+            recompute: Optional callable(employee_id, date) used instead of the
+                       batch engine for these keys (runs after the engine)
+        """
+        for key in keys:
+            self.keys.add(key)
+            if recompute is not None:
+                self.overrides[key] = recompute
+
+    def merge_into(self, other):
+        other.keys |= self.keys
+        other.overrides.update(self.overrides)
+
+    def flush(self):
+        """Recompute every collected key once; queue them if that fails"""
+        from .summary_engine import rebuild_summary_keys
+
+        engine_keys = self.keys - set(self.overrides)
+        if engine_keys:
+            try:
+                rebuild_summary_keys(engine_keys)
+            except Exception as e:
+                logger.error(f"Error recomputing collected summaries, queueing instead: {str(e)}", exc_info=True)
+                mark_dirty(engine_keys)
+
+        for (employee_id, day), recompute in self.overrides.items():
+            try:
+                recompute(employee_id, day)
+            except Exception as e:
+                logger.error(f"Error recomputing summary for employee {employee_id} on {day}: {str(e)}", exc_info=True)
+                mark_dirty([(employee_id, day)])
+
+        self.keys = set()
+        self.overrides = {}
+
+
+def _collector_stack():
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    return _local.collectors
+
+
+def _flush_pending():
+    pending = getattr(_local, 'pending', None)
+    if pending:
+        _local.pending = set()
+        mark_dirty(pending)
+
+
+def record_dirty(keys):
+    """
+    Record (employee_id, date) keys whose summaries need recomputing.
+
+    Inside coalesce_summary_recompute() the keys go to that block's collector.
+    Otherwise they are gathered for the current transaction and upserted as
+    dirty marks once, on commit (immediately in autocommit mode).
+    """
+    collectors = _collector_stack()
+    if collectors:
+        collectors[-1].add(keys)
+        return
+
+    if not hasattr(_local, 'pending'):
+        _local.pending = set()
+    _local.pending.update(keys)
+    # Every call registers the flush so keys survive a rolled-back savepoint;
+    # the first callback to run flushes everything and the rest are no-ops
+    transaction.on_commit(_flush_pending)
+
+
+@contextmanager
+def coalesce_summary_recompute():
+    """
+    Defer and deduplicate summary recomputes for a bulk operation.
+
+    Signals fired inside the block only collect keys. When the block exits the
+    collected keys are recomputed once each in transaction.on_commit (straight
+    away when no transaction is open). Nested blocks hand their keys to the
+    outermost one. If the block raises, the keys are queued as dirty marks.
+
+    Usage:
+        with coalesce_summary_recompute() as collector:
+            ...save entries / schedules...
+            collector.add([(employee.id, date)])
+    """
+    collectors = _collector_stack()
+    collector = SummaryRecomputeCollector()
+    collectors.append(collector)
+    try:
+        yield collector
+    except Exception:
+        collectors.pop()
+        if collector.keys:
+            keys = set(collector.keys)
+            transaction.on_commit(lambda: mark_dirty(keys))
+        raise
+    else:
+        collectors.pop()
+        if collectors:
+            collector.merge_into(collectors[-1])
+        elif collector.keys:
+            transaction.on_commit(collector.flush)
@@ -0,0 +1,137 @@
+"""
+Process-pool sharding for summary regeneration commands.
+
+Employees are split into shards and each shard is handled by a worker process
+with its own database connection. Shard tasks are module-level functions so
+they can be pickled; each returns a dict of counts that the parent adds up.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Shards per worker, so a slow shard does not hold up the whole run
+SHARDS_PER_WORKER = 4
+
+
+def _init_worker():
+    """Give each worker process its own, fresh database connection"""
+    import django
+    from django.apps import apps
+    from django.db import connections
+
+    if not apps.ready:
+        django.setup()
+    # Connections inherited from the parent through fork must not be shared
+    connections.close_all()
+
+
+def split_into_shards(items, shard_count):
+    """Split a list into at most shard_count contiguous, non-empty shards"""
+    items = list(items)
+    if not items:
+        return []
+    shard_count = max(1, min(shard_count, len(items)))
+    size, remainder = divmod(len(items), shard_count)
+    shards = []
+    start = 0
+    for i in range(shard_count):
+        end = start + size + (1 if i < remainder else 0)
+        shards.append(items[start:end])
+        start = end
+    return shards
+
+
+def rebuild_shard(employee_ids, start_date, end_date, force=False):
+    """Rebuild summaries for one shard of employees with the batch engine"""
+    from .models import Employee
+    from .summary_engine import rebuild_daily_summaries
+
+    employees = list(Employee.objects.filter(id__in=employee_ids))
+    result = rebuild_daily_summaries(employees, start_date, end_date, force=force)
+    result['employees_processed'] = len(employees)
+    return result
+
+
+def recalculate_shard(employee_ids, start_date, end_date, force=False):
+    """
+    Recalculate existing summaries (with time in/out) for one shard.
+
+    Rows whose inputs changed are rebuilt, rows from an older calculation
+    version (all rows with force set) have their metrics recomputed, and the
+    rest are left alone (see summary_engine.recalculate_summaries).
+    """
+    from .models import DailyTimeSummary
+    from .summary_engine import recalculate_summaries
+
+    summaries = list(
+        DailyTimeSummary.objects.filter(
+            employee_id__in=employee_ids,
+            date__range=[start_date, end_date],
+            time_in__isnull=False,
+            time_out__isnull=False
+        ).select_related('employee')
+    )
+    result = recalculate_summaries(summaries, force=force)
+    return {
+        'processed': len(result['recalculated']) + len(result['rebuilt']),
+        'rebuilt': len(result['rebuilt']),
+        'unchanged': result['unchanged'],
+    }
+
+
+def run_sharded(task, employee_ids, workers, task_args=(), progress=None):
+    """
+    Run task(shard_employee_ids, *task_args) over employee shards in a process pool.
+
+    Args:
+        task: Module-level shard function returning a dict of numeric counts
+        employee_ids: Employee primary keys to process
+        workers: Number of worker processes
+        task_args: Extra positional arguments passed to every shard
+        progress: Optional callable(done_shards, total_shards, totals, error)
+                  called in the parent as each shard finishes
+
+    Returns:
+        dict: Summed counts of all successful shards plus 'shards' and 'errors'
+              (a list of {'shard', 'employee_ids', 'error'} for failed shards)
+    """
+    from django.db import connections
+
+    shards = split_into_shards(employee_ids, max(1, workers) * SHARDS_PER_WORKER)
+    totals = {}
+    errors = []
+
+    # Do not hand the parent's open connection to forked children
+    connections.close_all()
+
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker) as executor:
+        futures = {
+            executor.submit(task, shard, *task_args): index
+            for index, shard in enumerate(shards)
+        }
+        done = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            done += 1
+            error = None
+            try:
+                result = future.result()
+                for key, value in result.items():
+                    if isinstance(value, (int, float)):
+                        totals[key] = totals.get(key, 0) + value
+            except Exception as e:
+                error = {
+                    'shard': index,
+                    'employee_ids': shards[index],
+                    'error': str(e),
+                }
+                errors.append(error)
+                logger.error(f"Summary shard {index} failed: {e}")
+            if progress:
+                progress(done, len(shards), totals, error)
+
+    totals['shards'] = len(shards)
+    totals['errors'] = errors
+    return totals
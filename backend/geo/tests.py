@@ -1,3 +1,294 @@
+import contextlib
+import io
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.utils import timezone
+
+from .models import (
+    DailyTimeSummary, Department, EmergencyTimeOutRequest, Employee, EmployeeSchedule,
+    Location, TimeEntry,
+)
+
+# Summary fields the bulk engine must compute exactly like the model methods
+METRIC_FIELDS = [
+    'status', 'billed_hours', 'late_minutes', 'undertime_minutes',
+    'night_differential_hours', 'overtime_hours', 'lunch_break_minutes',
+]
+SUMMARY_FIELDS = METRIC_FIELDS + [
+    'time_in', 'time_out', 'time_in_entry_id', 'time_out_entry_id',
+    'scheduled_time_in', 'scheduled_time_out', 'schedule_reference_id',
+    'total_break_minutes', 'is_weekend',
+]
+
+DAYSHIFT = (time(9, 0), time(18, 0))
+NIGHTSHIFT = (time(22, 0), time(7, 0))
+
+
+def _quiet():
+    """The model methods print their rule decisions; keep test output readable"""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def _same(a, b):
+    if isinstance(a, (float, Decimal)) or isinstance(b, (float, Decimal)):
+        return round(Decimal(str(a)), 2) == round(Decimal(str(b)), 2)
+    return a == b
+
+
+def _at(day, clock, days_after=0):
+    return timezone.make_aware(datetime.combine(day + timedelta(days=days_after), clock))
+
+
+class SummaryTestCase(TestCase):
+    """Employees with schedules and time entries, like the clock-in flow leaves them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.location = Location.objects.create(
+            name='HQ', latitude=Decimal('14.5'), longitude=Decimal('121.0'), geofence_radius=200
+        )
+        cls.department = Department.objects.create(name='Operations', code='OPS', location=cls.location)
+
+    def make_employee(self, employee_id, role='employee'):
+        user = User.objects.create(username=employee_id.lower(), first_name=employee_id, last_name='Test')
+        employee = Employee.objects.create(
+            user=user, employee_id=employee_id, department=self.department,
+            role=role, hire_date=date(2024, 1, 1)
+        )
+        # Reloaded so the decimal hour settings are Decimals, not the float defaults
+        return Employee.objects.get(pk=employee.pk)
+
+    def schedule(self, employee, day, shift):
+        return EmployeeSchedule.objects.create(
+            employee=employee, date=day, scheduled_time_in=shift[0], scheduled_time_out=shift[1]
+        )
+
+    def clock(self, employee, *events):
+        """
+        Store (entry_type, aware datetime) events as time entries. timestamp is
+        auto_now_add, so it is written back after the insert.
+        """
+        entries = TimeEntry.objects.bulk_create([
+            TimeEntry(employee=employee, entry_type=entry_type, location=self.location, event_time=when)
+            for entry_type, when in events
+        ])
+        for entry, (_, when) in zip(entries, events):
+            TimeEntry.objects.filter(pk=entry.pk).update(timestamp=when, event_time=when)
+        return entries
+
+
+class MetricsKernelParityTests(SummaryTestCase):
+    """compute_summaries() against calculate_comprehensive_status() + calculate_metrics()"""
+
+    # (shift, time in, time out) per row, one past day each
+    CASES = [
+        (DAYSHIFT, time(8, 55), time(18, 5)),      # present
+        (DAYSHIFT, time(9, 20), time(18, 0)),      # late
+        (DAYSHIFT, time(9, 0), time(16, 30)),      # undertime
+        (DAYSHIFT, time(8, 10), time(18, 0)),      # early arrival kept
+        (DAYSHIFT, time(9, 3), time(19, 40)),      # late departure rounded down
+        (DAYSHIFT, time(9, 0), time(21, 30)),      # emergency time-out
+        (DAYSHIFT, time(6, 0), time(8, 0)),        # shift void
+        (DAYSHIFT, time(9, 0), None),              # incomplete
+        (DAYSHIFT, None, None),                    # absent
+        (NIGHTSHIFT, time(21, 50), time(7, 10)),   # present, night differential
+        (NIGHTSHIFT, time(22, 30), time(6, 0)),    # late and undertime
+        (NIGHTSHIFT, time(21, 0), time(10, 30)),   # long nightshift, rounded
+        ((None, None), time(9, 0), time(18, 0)),   # not yet scheduled
+    ]
+
+    def test_kernel_matches_model_methods(self):
+        from .summary_engine import compute_summaries
+
+        employee = self.make_employee('K1')
+        today = date.today()
+        by_method = []
+        by_kernel = []
+        for offset, (shift, time_in, time_out) in enumerate(self.CASES, start=1):
+            values = dict(
+                employee=employee, date=today - timedelta(days=offset),
+                scheduled_time_in=shift[0], scheduled_time_out=shift[1],
+                time_in=time_in, time_out=time_out,
+            )
+            # Saved: the model methods flag emergencies against a stored row
+            by_method.append(DailyTimeSummary.objects.create(**values))
+            by_kernel.append(DailyTimeSummary(**values))
+
+        with _quiet():
+            for summary in by_method:
+                summary.calculate_comprehensive_status()
+                summary.calculate_metrics()
+        compute_summaries(by_kernel, today=today)
+
+        for method_row, kernel_row in zip(by_method, by_kernel):
+            for field in METRIC_FIELDS:
+                with self.subTest(date=method_row.date, field=field):
+                    self.assertTrue(
+                        _same(getattr(method_row, field), getattr(kernel_row, field)),
+                        f'{getattr(method_row, field)!r} != {getattr(kernel_row, field)!r}'
+                    )
+
+        flagged = {
+            (request.date, request.time_out_diff_minutes, request.actual_time_out)
+            for request in EmergencyTimeOutRequest.objects.filter(employee=employee)
+        }
+        queued = {
+            (summary.date, minutes, actual_time_out.time())
+            for summary in by_kernel
+            for minutes, actual_time_out in getattr(summary, '_pending_emergency_timeouts', [])
+        }
+        self.assertTrue(flagged)
+        self.assertEqual(flagged, queued)
+
+
+class SummaryEngineTests(SummaryTestCase):
+
+    def setUp(self):
+        self.start = date.today() - timedelta(days=14)
+        self.end = date.today() - timedelta(days=1)
+        self.dayshift = self.make_employee('D1')
+        self.nightshift = self.make_employee('N1')
+
+        day = self.start
+        while day <= self.end:
+            offset = (day - self.start).days
+            if day.weekday() < 5:
+                self.schedule(self.dayshift, day, DAYSHIFT)
+                self.schedule(self.nightshift, day, NIGHTSHIFT)
+            if offset % 5 == 4:
+                # No-show
+                day += timedelta(days=1)
+                continue
+            late = timedelta(minutes=offset * 7 % 40 - 10)
+            if offset % 3 == 0:
+                # With a break
+                self.clock(
+                    self.dayshift,
+                    ('time_in', _at(day, DAYSHIFT[0]) + late),
+                    ('time_out', _at(day, time(12, 0))),
+                    ('time_in', _at(day, time(12, 45))),
+                    ('time_out', _at(day, DAYSHIFT[1]) + late),
+                )
+            else:
+                self.clock(
+                    self.dayshift,
+                    ('time_in', _at(day, DAYSHIFT[0]) + late),
+                    ('time_out', _at(day, DAYSHIFT[1]) - late * 3),
+                )
+            self.clock(
+                self.nightshift,
+                ('time_in', _at(day, NIGHTSHIFT[0]) + late),
+                ('time_out', _at(day, NIGHTSHIFT[1], days_after=1) + late * 2),
+            )
+            day += timedelta(days=1)
+
+    def snapshot(self):
+        return {
+            (row['employee_id'], row['date']): row
+            for row in DailyTimeSummary.objects.values('employee_id', 'date', *SUMMARY_FIELDS)
+        }
+
+    def test_engine_matches_per_employee_generation(self):
+        from .summary_engine import rebuild_daily_summaries
+        from .utils import generate_daily_time_summary_from_entries
+
+        with _quiet():
+            for employee in (self.dayshift, self.nightshift):
+                generate_daily_time_summary_from_entries(employee, self.start, self.end)
+        expected = self.snapshot()
+        expected_flags = set(EmergencyTimeOutRequest.objects.values_list('employee_id', 'date', 'time_out_diff_minutes'))
+
+        DailyTimeSummary.objects.all().delete()
+        EmergencyTimeOutRequest.objects.all().delete()
+        result = rebuild_daily_summaries([self.dayshift, self.nightshift], self.start, self.end)
+
+        self.assertEqual(result['created'], len(expected))
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(
+            set(EmergencyTimeOutRequest.objects.values_list('employee_id', 'date', 'time_out_diff_minutes')),
+            expected_flags
+        )
+
+    def test_unchanged_inputs_are_skipped(self):
+        from .summary_engine import rebuild_daily_summaries
+
+        employees = [self.dayshift, self.nightshift]
+        rebuild_daily_summaries(employees, self.start, self.end)
+        before = self.snapshot()
+
+        result = rebuild_daily_summaries(employees, self.start, self.end)
+        self.assertEqual(result['unchanged'], len(before))
+        self.assertEqual(self.snapshot(), before)
+
+    def test_period_totals_match_live_aggregate(self):
+        from .rollups import get_period_totals, totals_from_summaries
+        from .summary_engine import rebuild_daily_summaries
+
+        employees = [self.dayshift, self.nightshift]
+        with self.captureOnCommitCallbacks(execute=True):
+            rebuild_daily_summaries(employees, self.start, self.end)
+
+        ranges = [
+            (self.start, self.end),
+            (self.start + timedelta(days=3), self.end - timedelta(days=2)),
+            (self.end, self.end),
+        ]
+        for start_date, end_date in ranges:
+            with self.subTest(start=start_date, end=end_date):
+                totals = get_period_totals([employee.id for employee in employees], start_date, end_date)
+                for employee in employees:
+                    live = totals_from_summaries(DailyTimeSummary.objects.filter(
+                        employee=employee, date__gte=start_date, date__lte=end_date
+                    ))
+                    self.assertEqual(totals.get(employee.id), live)
+
+
+class OfflineIngestTests(SummaryTestCase):
+
+    def setUp(self):
+        self.employee = self.make_employee('O1')
+        self.yesterday = timezone.localdate() - timedelta(days=1)
+        self.schedule(self.employee, self.yesterday, DAYSHIFT)
+        self.schedule(self.employee, timezone.localdate(), (time(0, 1), time(23, 59)))
+
+    def event(self, key, entry_type, when):
+        return {
+            'idempotency_key': key,
+            'employee_id': self.employee.id,
+            'entry_type': entry_type,
+            'event_time': when.isoformat(),
+            'latitude': 14.5,
+            'longitude': 121.0,
+            'accuracy': 10,
+        }
+
+    def test_replay_returns_duplicate(self):
+        from .offline_ingest import ingest_clock_events
+
+        events = [
+            self.event('shift-in', 'time_in', _at(self.yesterday, time(8, 58))),
+            self.event('shift-out', 'time_out', _at(self.yesterday, time(18, 2))),
+        ]
+        first = ingest_clock_events(events, self.employee)
+        self.assertEqual([result['status'] for result in first['results']], ['accepted', 'accepted'])
+
+        replay = ingest_clock_events(events, self.employee)
+        self.assertEqual([result['status'] for result in replay['results']], ['duplicate', 'duplicate'])
+        self.assertEqual(
+            [result['time_entry_id'] for result in replay['results']],
+            [result['time_entry_id'] for result in first['results']]
+        )
+        self.assertEqual(TimeEntry.objects.filter(employee=self.employee).count(), 2)
+
+    def test_future_event_is_stamped_now(self):
+        from .offline_ingest import ingest_clock_events
+
+        event_time = timezone.now() + timedelta(seconds=30)
+        result = ingest_clock_events([self.event('ahead', 'time_in', event_time)], self.employee)
 
-# Create your tests here.
+        entry = TimeEntry.objects.get(id=result['results'][0]['time_entry_id'])
+        self.assertEqual(entry.event_time, event_time)
+        self.assertLessEqual(entry.timestamp, timezone.now())
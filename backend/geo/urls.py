@@ -4,7 +4,7 @@ from .views import (
     LocationViewSet, DepartmentViewSet, EmployeeViewSet,
     DashboardAPIView, SearchAPIView, EmployeeHierarchyAPIView,
     TimeEntryViewSet, TimeInOutAPIView, TimeReportAPIView,
-    GeofenceValidationAPIView, LoginAPIView, LogoutAPIView, UserProfileAPIView,
+    GeofenceValidationAPIView, GeofenceBatchValidationAPIView, OfflineClockEventIngestAPIView, LoginAPIView, LogoutAPIView, UserProfileAPIView,
     ChangePasswordAPIView,  # Add this import
     WorkSessionViewSet,
     ReportDownloadAPIView,
@@ -18,6 +18,10 @@ from .views import (
     EmployeeScheduleViewSet,
     DailyTimeSummaryViewSet,
     DailyTimeSummaryAdminViewSet,
+    ClockEventStreamView,
+    ClockEventStreamTicketAPIView,
+    ReportJobViewSet,
+    PayrollExportAPIView,
 )
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -39,6 +43,7 @@ router.register(r'schedule-templates', ScheduleTemplateViewSet, basename='schedu
 router.register(r'schedules', EmployeeScheduleViewSet, basename='schedule')
 router.register(r'daily-summaries', DailyTimeSummaryViewSet, basename='dailytimesummary')
 router.register(r'daily-summaries-admin', DailyTimeSummaryAdminViewSet, basename='dailytimesummaryadmin')
+router.register(r'report-jobs', ReportJobViewSet, basename='reportjob')
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
@@ -60,9 +65,14 @@ urlpatterns = [
     path('api/time-out/', TimeInOutAPIView.as_view(), {'action': 'time-out'}, name='time-out'),
     path('api/time-reports/', TimeReportAPIView.as_view(), name='time-reports'),
     path('api/geofence/validate/', GeofenceValidationAPIView.as_view(), name='geofence-validate'),
+    path('api/geofence/validate-batch/', GeofenceBatchValidationAPIView.as_view(), name='geofence-validate-batch'),
     path('api/tl-departments-locations/', tl_departments_and_locations, name='tl_departments-and_locations'),
+    path('api/clock-events/stream/', ClockEventStreamView.as_view(), name='clock-event-stream'),
+    path('api/clock-events/stream-ticket/', ClockEventStreamTicketAPIView.as_view(), name='clock-event-stream-ticket'),
+    path('api/clock-events/ingest/', OfflineClockEventIngestAPIView.as_view(), name='clock-event-ingest'),
 ] 
 urlpatterns += [
     path('api/reports/download/', ReportDownloadAPIView.as_view(), name='report-download'),
     path('api/reports/preview/', ReportPreviewAPIView.as_view(), name='report-preview'),
+    path('api/reports/payroll/', PayrollExportAPIView.as_view(), name='report-payroll'),
 ] 
\ No newline at end of file
@@ -178,17 +178,23 @@ class OvertimeCalculator:
         self.lunch_break_minutes = employee.lunch_break_minutes
         self.break_threshold_minutes = employee.break_threshold_minutes
     
-    def analyze_daily_sessions(self, date: datetime.date) -> Dict:
+    def analyze_daily_sessions(self, date: datetime.date, time_entries: Optional[List[TimeEntry]] = None) -> Dict:
         """
-        Analyze all time entries for a given date and return detailed breakdown
+        Analyze all time entries for a given date and return detailed breakdown.
+        
+        Args:
+            date: Local date to analyze
+            time_entries: The date's entries ordered by timestamp, if already
+                          loaded (otherwise they are fetched in one query)
         """
         # Get all time entries for the date
-        time_entries = TimeEntry.objects.filter(
-            employee=self.employee,
-            timestamp__date=date
-        ).order_by('timestamp')
+        if time_entries is None:
+            time_entries = list(TimeEntry.objects.filter(
+                employee=self.employee,
+                timestamp__date=date
+            ).order_by('timestamp'))
         
-        if not time_entries.exists():
+        if not time_entries:
             return {
                 'date': date,
                 'total_hours': 0,
@@ -299,50 +305,53 @@ class OvertimeCalculator:
         else:
             return 'regular'
     
-    def get_current_session_status(self) -> Dict:
+    def get_current_session_status(self, entries: Optional[List[TimeEntry]] = None, presence=None) -> Dict:
         """
-        Get current session status with overtime alerts
+        Get current session status with overtime alerts.
+        
+        Uses at most two queries (today's entries and the presence row), and
+        none when both are passed in.
+        
+        Args:
+            entries: Prefetched entries of the employee covering today (any
+                     order, other days are ignored)
+            presence: Prefetched EmployeePresence row of the employee
         """
-        from datetime import datetime, time
         from django.utils import timezone
-        local_tz = timezone.get_current_timezone()
-        today_local = timezone.localtime(timezone.now(), local_tz).date()
-        start_of_day = datetime.combine(today_local, time.min)
-        end_of_day = datetime.combine(today_local, time.max)
-        start_of_day = timezone.make_aware(start_of_day, local_tz)
-        end_of_day = timezone.make_aware(end_of_day, local_tz)
+        from .summary_engine import local_day_bounds
+        today_local = timezone.localdate()
+        start_of_day, end_of_day = local_day_bounds(today_local, today_local)
 
-        today_entries = TimeEntry.objects.filter(
-            employee=self.employee,
-            timestamp__gte=start_of_day,
-            timestamp__lte=end_of_day
-        ).order_by('timestamp')
-        today_analysis = self.analyze_daily_sessions(today_local)
+        if entries is None:
+            today_entries = list(TimeEntry.objects.filter(
+                employee=self.employee,
+                timestamp__gte=start_of_day,
+                timestamp__lt=end_of_day
+            ).order_by('timestamp'))
+        else:
+            today_entries = sorted(
+                (entry for entry in entries if start_of_day <= entry.timestamp < end_of_day),
+                key=lambda entry: entry.timestamp
+            )
+        today_analysis = self.analyze_daily_sessions(today_local, time_entries=today_entries)
 
-        # Find any open session (time_in with no time_out after it)
-        last_time_in = TimeEntry.objects.filter(
-            employee=self.employee,
-            entry_type='time_in'
-        ).order_by('-timestamp').first()
+        # Find any open session (time_in with no time_out after it) from the
+        # employee's presence row
+        if presence is None:
+            from .presence import get_presence
+            presence = get_presence(self.employee)
         active_session = None
-        if last_time_in:
-            # Is there a time_out after this time_in?
-            has_time_out = TimeEntry.objects.filter(
-                employee=self.employee,
-                entry_type='time_out',
-                timestamp__gt=last_time_in.timestamp
-            ).exists()
-            if not has_time_out:
-                # Calculate current session duration
-                current_duration = (timezone.now() - last_time_in.timestamp).total_seconds() / 3600
-                # Calculate actual work hours including current session
-                actual_work_hours = today_analysis['total_hours'] + current_duration
-                active_session = {
-                    'start_time': last_time_in.timestamp,
-                    'current_duration': round(current_duration, 2),
-                    'is_overtime': actual_work_hours > self.overtime_threshold,
-                    'hours_until_overtime': max(0, self.overtime_threshold - today_analysis['actual_work_hours'])
-                }
+        if presence and presence.is_clocked_in and presence.session_started_at:
+            # Calculate current session duration
+            current_duration = (timezone.now() - presence.session_started_at).total_seconds() / 3600
+            # Calculate actual work hours including current session
+            actual_work_hours = today_analysis['total_hours'] + current_duration
+            active_session = {
+                'start_time': presence.session_started_at,
+                'current_duration': round(current_duration, 2),
+                'is_overtime': actual_work_hours > self.overtime_threshold,
+                'hours_until_overtime': max(0, self.overtime_threshold - today_analysis['actual_work_hours'])
+            }
 
         return {
             'today_analysis': today_analysis,
@@ -388,6 +397,43 @@ class OvertimeCalculator:
         return work_sessions
 
 
+def get_current_session_statuses(employees) -> Dict:
+    """
+    get_current_session_status for many employees in two queries (today's
+    entries of all of them and their presence rows).
+    
+    Args:
+        employees: Iterable of Employee instances
+    
+    Returns:
+        dict: employee id -> session status (as get_current_session_status)
+    """
+    from collections import defaultdict
+    from .presence import get_presence_map
+    from .summary_engine import local_day_bounds
+    
+    employees = list(employees)
+    today_local = timezone.localdate()
+    start_of_day, end_of_day = local_day_bounds(today_local, today_local)
+    
+    entries_by_employee = defaultdict(list)
+    for entry in TimeEntry.objects.filter(
+        employee__in=employees,
+        timestamp__gte=start_of_day,
+        timestamp__lt=end_of_day
+    ).order_by('timestamp'):
+        entries_by_employee[entry.employee_id].append(entry)
+    presence_map = get_presence_map(employee.id for employee in employees)
+    
+    return {
+        employee.id: OvertimeCalculator(employee).get_current_session_status(
+            entries=entries_by_employee.get(employee.id, []),
+            presence=presence_map.get(employee.id)
+        )
+        for employee in employees
+    }
+
+
 class BreakDetector:
     """Utility class for detecting and analyzing breaks"""
     
@@ -448,8 +494,8 @@ def calculate_daily_summary(employee, date):
     
     FIXED VERSION: Properly handles event_time vs timestamp and cross-day time entries
     """
-    from .models import DailyTimeSummary, TimeEntry, EmployeeSchedule
-    from datetime import datetime, timedelta
+    from .models import DailyTimeSummary
+    from .shift_attribution import attribute_shifts, load_attribution_inputs
     
     # Get or create daily summary
     summary, created = DailyTimeSummary.objects.get_or_create(
@@ -461,83 +507,20 @@ def calculate_daily_summary(employee, date):
         }
     )
     
-    # Get time entries for this date using event_time (actual working time)
-    time_in_entry = TimeEntry.objects.filter(
-        employee=employee,
-        entry_type='time_in',
-        event_time__date=date
-    ).first()
-    
-    time_out_entry = TimeEntry.objects.filter(
-        employee=employee,
-        entry_type='time_out',
-        event_time__date=date
-    ).first()
-    
-    # ENHANCED: Comprehensive night shift time out detection
-    if not time_out_entry:
-        # Strategy 1: Check next day for time out (common night shift pattern)
-        next_day = date + timedelta(days=1)
-        next_day_time_out = TimeEntry.objects.filter(
-            employee=employee,
-            entry_type='time_out',
-            event_time__date=next_day
-        ).first()
-        
-        if next_day_time_out:
-            # Verify this time out belongs to the current day's shift
-            # Check if time out is before 6 AM (typical night shift end time)
-            if next_day_time_out.event_time.time().hour < 6:
-                time_out_entry = next_day_time_out
-        
-        # Strategy 2: Check previous day for time out (if this is a time out day)
-        if not time_out_entry:
-            prev_day = date - timedelta(days=1)
-            prev_day_time_in = TimeEntry.objects.filter(
-                employee=employee,
-                entry_type='time_in',
-                event_time__date=prev_day
-            ).first()
-            
-            if prev_day_time_in and prev_day_time_in.event_time.time().hour >= 18:  # Started at 6 PM or later
-                # This might be a night shift that ended today
-                current_day_time_out = TimeEntry.objects.filter(
-                    employee=employee,
-                    entry_type='time_out',
-                    event_time__date=date
-                ).first()
-                
-                if current_day_time_out and current_day_time_out.event_time.time().hour < 6:
-                    # This time out belongs to the previous day's night shift
-                    # We need to update the previous day's summary, not this one
-                    pass  # This will be handled when processing the previous day
-        
-        # Strategy 3: Look for time out within a reasonable time window
-        if not time_out_entry:
-            # Search for time out entries within 12 hours after time in
-            if time_in_entry and time_in_entry.event_time:
-                time_in_dt = time_in_entry.event_time
-                # Look for time out within 12 hours after time in
-                time_window_end = time_in_dt + timedelta(hours=12)
-                
-                # Search in a broader range
-                potential_time_out = TimeEntry.objects.filter(
-                    employee=employee,
-                    entry_type='time_out',
-                    event_time__gte=time_in_dt,
-                    event_time__lte=time_window_end
-                ).order_by('event_time').first()
-                
-                if potential_time_out:
-                    time_out_entry = potential_time_out
+    # Pair the entries around this date into shifts in one pass, so a night
+    # shift's time-out on the next morning is attributed to this date
+    entries, schedules = load_attribution_inputs(employee, date, date)
+    shift = attribute_shifts(entries, schedules).get(date)
+    time_in_entry = shift.time_in_entry if shift else None
+    time_out_entry = shift.time_out_entry if shift else None
     
     # Get scheduled times for this date
-    try:
-        schedule = EmployeeSchedule.objects.get(employee=employee, date=date)
+    schedule = schedules.get(date)
+    if schedule:
         summary.scheduled_time_in = schedule.scheduled_time_in
         summary.scheduled_time_out = schedule.scheduled_time_out
         summary.schedule_reference = schedule
-    except EmployeeSchedule.DoesNotExist:
+    else:
         summary.scheduled_time_in = None
         summary.scheduled_time_out = None
         summary.schedule_reference = None
@@ -601,6 +584,7 @@ def apply_template_to_schedule(employee, template, start_date, end_date, weekday
         dict: Contains 'schedules_created', 'dates_updated', 'dates_skipped', 'skipped_dates_list'
     """
     from .models import EmployeeSchedule
+    from .summary_queue import coalesce_summary_recompute
     from datetime import timedelta
     
     schedules_created = 0
@@ -609,44 +593,46 @@ def apply_template_to_schedule(employee, template, start_date, end_date, weekday
     skipped_dates_list = []
     current_date = start_date
     
-    while current_date <= end_date:
-        # Skip weekends if weekdays_only is True
-        if weekdays_only and current_date.weekday() >= 5:
-            current_date += timedelta(days=1)
-            continue
+    # Recompute each affected summary once after commit instead of once per schedule save
+    with coalesce_summary_recompute():
+        while current_date <= end_date:
+            # Skip weekends if weekdays_only is True
+            if weekdays_only and current_date.weekday() >= 5:
+                current_date += timedelta(days=1)
+                continue
         
-        # Check if schedule already exists for this date
-        existing_schedule = EmployeeSchedule.objects.filter(
-            employee=employee,
-            date=current_date
-        ).first()
+            # Check if schedule already exists for this date
+            existing_schedule = EmployeeSchedule.objects.filter(
+                employee=employee,
+                date=current_date
+            ).first()
         
-        if existing_schedule:
-            if overwrite_existing:
-                # Update existing schedule
-                existing_schedule.scheduled_time_in = template.time_in
-                existing_schedule.scheduled_time_out = template.time_out
-                existing_schedule.is_night_shift = template.is_night_shift
-                existing_schedule.template_used = template
-                existing_schedule.save()
-                dates_updated += 1
+            if existing_schedule:
+                if overwrite_existing:
+                    # Update existing schedule
+                    existing_schedule.scheduled_time_in = template.time_in
+                    existing_schedule.scheduled_time_out = template.time_out
+                    existing_schedule.is_night_shift = template.is_night_shift
+                    existing_schedule.template_used = template
+                    existing_schedule.save()
+                    dates_updated += 1
+                else:
+                    # Skip this date and record it
+                    dates_skipped += 1
+                    skipped_dates_list.append(current_date.strftime('%Y-%m-%d'))
             else:
-                # Skip this date and record it
-                dates_skipped += 1
-                skipped_dates_list.append(current_date.strftime('%Y-%m-%d'))
-        else:
-            # Create new schedule
-            EmployeeSchedule.objects.create(
-                employee=employee,
-                date=current_date,
-                scheduled_time_in=template.time_in,
-                scheduled_time_out=template.time_out,
-                is_night_shift=template.is_night_shift,
-                template_used=template,
-            )
-            schedules_created += 1
+                # Create new schedule
+                EmployeeSchedule.objects.create(
+                    employee=employee,
+                    date=current_date,
+                    scheduled_time_in=template.time_in,
+                    scheduled_time_out=template.time_out,
+                    is_night_shift=template.is_night_shift,
+                    template_used=template,
+                )
+                schedules_created += 1
         
-        current_date += timedelta(days=1)
+            current_date += timedelta(days=1)
     
     return {
         'schedules_created': schedules_created,
@@ -667,6 +653,7 @@ def copy_schedule_from_previous_month(employee, target_month, target_year, flip_
         flip_am_pm: If True, flip AM/PM times when copying
     """
     from .models import EmployeeSchedule
+    from .summary_queue import coalesce_summary_recompute
     from datetime import datetime, timedelta
     import calendar
     
@@ -694,57 +681,59 @@ def copy_schedule_from_previous_month(employee, target_month, target_year, flip_
     
     schedules_created = 0
     
-    for prev_schedule in prev_schedules:
-        # Calculate corresponding date in target month
-        day_of_month = prev_schedule.date.day
+    # Recompute each affected summary once after commit instead of once per schedule save
+    with coalesce_summary_recompute():
+        for prev_schedule in prev_schedules:
+            # Calculate corresponding date in target month
+            day_of_month = prev_schedule.date.day
         
-        # Handle cases where target month has fewer days
-        try:
-            target_date = datetime(target_year, target_month, day_of_month).date()
-        except ValueError:
-            # If day doesn't exist in target month (e.g., Feb 30), skip it
-            continue
+            # Handle cases where target month has fewer days
+            try:
+                target_date = datetime(target_year, target_month, day_of_month).date()
+            except ValueError:
+                # If day doesn't exist in target month (e.g., Feb 30), skip it
+                continue
         
-        if target_date > target_end_date:
-            continue
+            if target_date > target_end_date:
+                continue
         
-        # Create new schedule
-        new_schedule = EmployeeSchedule.objects.create(
-            employee=employee,
-            date=target_date,
-            scheduled_time_in=prev_schedule.scheduled_time_in,
-            scheduled_time_out=prev_schedule.scheduled_time_out,
-            is_night_shift=prev_schedule.is_night_shift,
-            template_used=prev_schedule.template_used,
-            notes=f"Copied from {prev_schedule.date.strftime('%B %Y')}"
-        )
+            # Create new schedule
+            new_schedule = EmployeeSchedule.objects.create(
+                employee=employee,
+                date=target_date,
+                scheduled_time_in=prev_schedule.scheduled_time_in,
+                scheduled_time_out=prev_schedule.scheduled_time_out,
+                is_night_shift=prev_schedule.is_night_shift,
+                template_used=prev_schedule.template_used,
+                notes=f"Copied from {prev_schedule.date.strftime('%B %Y')}"
+            )
         
-        # Flip AM/PM if requested
-        if flip_am_pm:
-            # Convert times to datetime for easier manipulation
-            from datetime import datetime, timedelta
+            # Flip AM/PM if requested
+            if flip_am_pm:
+                # Convert times to datetime for easier manipulation
+                from datetime import datetime, timedelta
             
-            start_dt = datetime.combine(datetime.today(), new_schedule.scheduled_time_in)
-            end_dt = datetime.combine(datetime.today(), new_schedule.scheduled_time_out)
+                start_dt = datetime.combine(datetime.today(), new_schedule.scheduled_time_in)
+                end_dt = datetime.combine(datetime.today(), new_schedule.scheduled_time_out)
             
-            # Flip AM/PM
-            if start_dt.hour < 12:  # AM to PM
-                start_dt += timedelta(hours=12)
-            else:  # PM to AM
-                start_dt -= timedelta(hours=12)
+                # Flip AM/PM
+                if start_dt.hour < 12:  # AM to PM
+                    start_dt += timedelta(hours=12)
+                else:  # PM to AM
+                    start_dt -= timedelta(hours=12)
             
-            if end_dt.hour < 12:  # AM to PM
-                end_dt += timedelta(hours=12)
-            else:  # PM to AM
-                end_dt -= timedelta(hours=12)
+                if end_dt.hour < 12:  # AM to PM
+                    end_dt += timedelta(hours=12)
+                else:  # PM to AM
+                    end_dt -= timedelta(hours=12)
             
-            # Update the schedule
-            new_schedule.scheduled_time_in = start_dt.time()
-            new_schedule.scheduled_time_out = end_dt.time()
-            new_schedule.is_night_shift = not new_schedule.is_night_shift
-            new_schedule.save()
+                # Update the schedule
+                new_schedule.scheduled_time_in = start_dt.time()
+                new_schedule.scheduled_time_out = end_dt.time()
+                new_schedule.is_night_shift = not new_schedule.is_night_shift
+                new_schedule.save()
         
-        schedules_created += 1
+            schedules_created += 1
     
     return schedules_created
 
@@ -900,6 +889,7 @@ def generate_daily_time_summary_from_entries(employee, start_date, end_date=None
     """
     from datetime import date, timedelta
     from .models import TimeEntry, EmployeeSchedule, DailyTimeSummary
+    from .summary_engine import load_entries_by_day
     
     if end_date is None:
         end_date = start_date
@@ -908,21 +898,15 @@ def generate_daily_time_summary_from_entries(employee, start_date, end_date=None
     updated_count = 0
     skipped_count = 0
     
+    # Load the employee's entries for the whole range once (bounded by Manila-local
+    # day boundaries) instead of scanning their full history for every day
+    entries_by_day = load_entries_by_day([employee.id], start_date, end_date)
+    
     current_date = start_date
     while current_date <= end_date:
         try:
-            # Get time entries for this date (convert to Manila timezone for proper date filtering)
-            import pytz
-            manila_tz = pytz.timezone('Asia/Manila')
-            
-            # Get all time entries for the employee and filter by Manila timezone date
-            all_time_entries = TimeEntry.objects.filter(employee=employee).order_by('timestamp')
-            time_entries = []
-            
-            for entry in all_time_entries:
-                manila_timestamp = entry.timestamp.astimezone(manila_tz)
-                if manila_timestamp.date() == current_date:
-                    time_entries.append(entry)
+            # Get time entries for this date (bucketed by Manila timezone date)
+            time_entries = entries_by_day.get((employee.id, current_date), [])
             
             # Get schedule for this date
             try:
@@ -1035,7 +1019,7 @@ def generate_daily_time_summary_from_entries(employee, start_date, end_date=None
     }
 
 
-def generate_daily_summaries_for_period(start_date, end_date, employee=None):
+def generate_daily_summaries_for_period(start_date, end_date, employee=None, force=False):
     """
     Generate DailyTimeSummary records for all employees or a specific employee for a date range.
     
@@ -1043,33 +1027,31 @@ def generate_daily_summaries_for_period(start_date, end_date, employee=None):
         start_date: Start date for summary generation
         end_date: End date for summary generation
         employee: Specific employee (optional, if None processes all employees)
+        force: Recompute rows even when their inputs are unchanged
     
     Returns:
         dict: Summary of processing results
+    
+    Rows are rebuilt by the batch engine (geo.summary_engine), which range-loads
+    entries, schedules and existing summaries and writes back in bulk.
     """
     from .models import Employee
+    from .summary_engine import rebuild_daily_summaries
     
     if employee:
         employees = [employee]
     else:
-        employees = Employee.objects.filter(employment_status='active')
+        employees = list(Employee.objects.filter(employment_status='active'))
     
-    total_created = 0
-    total_updated = 0
-    total_skipped = 0
-    
-    for emp in employees:
-        result = generate_daily_time_summary_from_entries(emp, start_date, end_date)
-        total_created += result['created']
-        total_updated += result['updated']
-        total_skipped += result['skipped']
+    result = rebuild_daily_summaries(employees, start_date, end_date, force=force)
     
     return {
         'employees_processed': len(employees),
-        'total_created': total_created,
-        'total_updated': total_updated,
-        'total_skipped': total_skipped,
-        'total_processed': total_created + total_updated + total_skipped
+        'total_created': result['created'],
+        'total_updated': result['updated'],
+        'total_skipped': result['skipped'],
+        'total_unchanged': result['unchanged'],
+        'total_processed': result['total_processed']
     }
 
 
@@ -1122,8 +1104,13 @@ def get_employee_time_attendance_report(employee, start_date, end_date):
     Returns:
         dict: Complete report data
     """
-    from .models import DailyTimeSummary, TimeEntry, EmployeeSchedule
-    from datetime import date, timedelta
+    from .models import DailyTimeSummary
+    from .shift_attribution import (
+        attribute_shifts, entry_moment, load_attribution_entries, load_attribution_schedules
+    )
+    from .rollups import totals_from_summaries
+    from .summary_engine import MANILA_TZ
+    from datetime import timedelta
     import logging
     
     logger = logging.getLogger(__name__)
@@ -1131,55 +1118,58 @@ def get_employee_time_attendance_report(employee, start_date, end_date):
     try:
         logger.info(f"Starting time attendance report generation for employee {employee.employee_id} from {start_date} to {end_date}")
         
-        # Get all daily summaries for the period
-        summaries = DailyTimeSummary.objects.filter(
+        # The period's summaries and entries in one range query each, merged
+        # below in date order in a single pass
+        summaries = list(DailyTimeSummary.objects.filter(
             employee=employee,
             date__gte=start_date,
             date__lte=end_date
-        ).order_by('date')
+        ).order_by('date'))
+        entries = load_attribution_entries(employee, start_date, end_date)
+        
+        logger.info(f"Found {len(summaries)} daily summaries for the period")
         
-        logger.info(f"Found {summaries.count()} daily summaries for the period")
+        # Period totals from the rows already loaded (same rules as the rollups)
+        totals = totals_from_summaries(summaries)
+        days_worked = totals['days_worked']
+        
+        # Only days clocked in without a time out need the shift pairing (and
+        # the schedules it uses) to find a time out on the next day
+        shifts = {}
+        if any(summary.time_in and not summary.time_out for summary in summaries):
+            shifts = attribute_shifts(entries, load_attribution_schedules(employee, start_date, end_date))
         
         # Convert to report format
         report_data = []
-        total_billed_hours = 0
-        total_late_minutes = 0
-        total_undertime_minutes = 0
-        total_night_differential = 0
-        days_worked = 0
+        summary_index = 0
+        entry_index = 0
         
         current_date = start_date
         while current_date <= end_date:
-            try:
-                summary = summaries.get(date=current_date)
-            except DailyTimeSummary.DoesNotExist:
-                summary = None
-            except Exception as e:
-                logger.warning(f"Error getting summary for {current_date}: {str(e)}")
-                summary = None
+            # Advance both sorted lists to the current date
+            summary = None
+            while summary_index < len(summaries) and summaries[summary_index].date <= current_date:
+                if summaries[summary_index].date == current_date:
+                    summary = summaries[summary_index]
+                    # Shares the loaded employee (formatted_billed_minutes reads it)
+                    summary.employee = employee
+                summary_index += 1
             
-            if summary and summary.status in ['present', 'late', 'half_day']:
-                days_worked += 1
-                try:
-                    total_billed_hours += float(summary.billed_hours or 0)
-                    total_late_minutes += summary.late_minutes or 0
-                    total_undertime_minutes += summary.undertime_minutes or 0
-                    total_night_differential += float(summary.night_differential_hours or 0)
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Error processing summary metrics for {current_date}: {str(e)}")
+            date_entries = []
+            while entry_index < len(entries):
+                entry_date = entry_moment(entries[entry_index]).astimezone(MANILA_TZ).date()
+                if entry_date > current_date:
+                    break
+                if entry_date == current_date:
+                    date_entries.append(entries[entry_index])
+                entry_index += 1
             
             # Create report record with safe property access
             try:
                 # ENHANCED: Include TimeEntry data directly for better time out handling
                 time_entries_data = []
                 if summary:
-                    # Get all time entries for this date
-                    from .models import TimeEntry
-                    date_entries = TimeEntry.objects.filter(
-                        employee=employee,
-                        event_time__date=current_date
-                    ).order_by('event_time')
-                    
+                    # All time entries for this date
                     for entry in date_entries:
                         time_entries_data.append({
                             'entry_type': entry.entry_type,
@@ -1188,29 +1178,17 @@ def get_employee_time_attendance_report(employee, start_date, end_date):
                             'notes': entry.notes or ''
                         })
                     
-                    # Also check for time out entries that might belong to this day's shift
+                    # Also include the time out that closes this day's shift on the next day
                     if summary.time_in and not summary.time_out:
-                        # Look for time out within reasonable time window
-                        from datetime import datetime, timedelta
-                        if summary.time_in:
-                            time_in_dt = datetime.combine(current_date, summary.time_in)
-                            time_window_end = time_in_dt + timedelta(hours=12)
-                            
-                            # Search for time out entries within 12 hours
-                            potential_time_out = TimeEntry.objects.filter(
-                                employee=employee,
-                                entry_type='time_out',
-                                event_time__gte=time_in_dt,
-                                event_time__lte=time_window_end
-                            ).order_by('event_time').first()
-                            
-                            if potential_time_out:
-                                time_entries_data.append({
-                                    'entry_type': 'time_out',
-                                    'event_time': potential_time_out.event_time.strftime('%H:%M:%S'),
-                                    'timestamp': potential_time_out.timestamp.strftime('%H:%M:%S'),
-                                    'notes': 'Found via time window search'
-                                })
+                        shift = shifts.get(current_date)
+                        shift_time_out = shift.time_out_entry if shift else None
+                        if shift_time_out and shift_time_out not in date_entries:
+                            time_entries_data.append({
+                                'entry_type': 'time_out',
+                                'event_time': shift_time_out.event_time.strftime('%H:%M:%S'),
+                                'timestamp': shift_time_out.timestamp.strftime('%H:%M:%S'),
+                                'notes': 'Attributed to this shift'
+                            })
                 
                 report_data.append({
                     'date': current_date,
@@ -1260,10 +1238,10 @@ def get_employee_time_attendance_report(employee, start_date, end_date):
             },
             'summary': {
                 'days_worked': days_worked,
-                'total_billed_hours': int(total_billed_hours * 60),  # Convert to minutes
-                'total_late_minutes': total_late_minutes,
-                'total_undertime_minutes': total_undertime_minutes,
-                'total_night_differential': round(total_night_differential, 2),
+                'total_billed_hours': int(totals['billed_hours'] * 60),  # Convert to minutes
+                'total_late_minutes': totals['late_minutes'],
+                'total_undertime_minutes': totals['undertime_minutes'],
+                'total_night_differential': float(round(totals['night_differential_hours'], 2)),
             },
             'daily_records': report_data
         }
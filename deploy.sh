@@ -18,6 +18,9 @@ APP_DIR="/opt/geoTime"  # Updated to match production server location
 BACKEND_DIR="$APP_DIR/backend"
 FRONTEND_DIR="$APP_DIR/frontend"
 SERVICE_NAME="geotime"
+REPORT_SERVICE_NAME="geotime-report-jobs"
+DRAIN_SERVICE_NAME="geotime-summary-drain"
+STREAM_SERVICE_NAME="geotime-stream"
 DOMAIN="iais.online"  # Updated to match production domain
 
 echo -e "${GREEN}Starting GeoTime Deployment...${NC}"
@@ -75,10 +78,20 @@ pip install -r requirements.txt
 print_status "Running database migrations..."
 python manage.py migrate
 
+# Create the shared cache table (no-op unless CACHE_URL is dbcache://)
+python manage.py createcachetable
+
+# Backfill summary rollups (idempotent; reports read live data where rows are missing)
+print_status "Rebuilding summary rollups..."
+python manage.py rebuild_summary_rollups
+
 # Collect static files
 print_status "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Directory of background report artifacts (writable by the report worker)
+mkdir -p report_artifacts
+
 # Step 3: Frontend deployment
 print_status "Deploying frontend..."
 cd $FRONTEND_DIR
@@ -96,6 +109,14 @@ print_status "Restarting services..."
 sudo systemctl restart $SERVICE_NAME
 sudo systemctl restart nginx
 
+# Background workers (report jobs, daily summary drain) and the clock event
+# stream server
+print_status "Installing background worker services..."
+sudo cp $APP_DIR/$REPORT_SERVICE_NAME.service $APP_DIR/$DRAIN_SERVICE_NAME.service $APP_DIR/$STREAM_SERVICE_NAME.service /etc/systemd/system/
+sudo systemctl daemon-reload
+sudo systemctl enable $REPORT_SERVICE_NAME $DRAIN_SERVICE_NAME $STREAM_SERVICE_NAME
+sudo systemctl restart $REPORT_SERVICE_NAME $DRAIN_SERVICE_NAME $STREAM_SERVICE_NAME
+
 # Step 5: Check service status
 print_status "Checking service status..."
 if sudo systemctl is-active --quiet $SERVICE_NAME; then
@@ -106,6 +127,30 @@ else
     exit 1
 fi
 
+if sudo systemctl is-active --quiet $REPORT_SERVICE_NAME; then
+    print_success "Report job worker is running"
+else
+    print_error "Report job worker failed to start"
+    sudo systemctl status $REPORT_SERVICE_NAME
+    exit 1
+fi
+
+if sudo systemctl is-active --quiet $DRAIN_SERVICE_NAME; then
+    print_success "Summary drain worker is running"
+else
+    print_error "Summary drain worker failed to start"
+    sudo systemctl status $DRAIN_SERVICE_NAME
+    exit 1
+fi
+
+if sudo systemctl is-active --quiet $STREAM_SERVICE_NAME; then
+    print_success "Clock event stream server is running"
+else
+    print_error "Clock event stream server failed to start"
+    sudo systemctl status $STREAM_SERVICE_NAME
+    exit 1
+fi
+
 if sudo systemctl is-active --quiet nginx; then
     print_success "Nginx service is running"
 else
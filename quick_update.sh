@@ -17,6 +17,9 @@ APP_DIR="/opt/geoTime"  # Updated to match production server location
 BACKEND_DIR="$APP_DIR/backend"
 FRONTEND_DIR="$APP_DIR/frontend"
 SERVICE_NAME="geotime"
+REPORT_SERVICE_NAME="geotime-report-jobs"
+DRAIN_SERVICE_NAME="geotime-summary-drain"
+STREAM_SERVICE_NAME="geotime-stream"
 
 print_status() {
     echo -e "${YELLOW}[INFO]${NC} $1"
@@ -43,6 +46,8 @@ cd $BACKEND_DIR
 source .venv/bin/activate
 pip install -r requirements.txt
 python manage.py migrate --noinput
+python manage.py createcachetable
+python manage.py rebuild_summary_rollups
 python manage.py collectstatic --noinput
 
 # Quick frontend update
@@ -54,6 +59,7 @@ npm run build
 # Restart services
 print_status "Restarting services..."
 sudo systemctl restart $SERVICE_NAME
+sudo systemctl restart $REPORT_SERVICE_NAME $DRAIN_SERVICE_NAME $STREAM_SERVICE_NAME
 sudo systemctl restart nginx
 
 print_success "Quick update completed!" 
\ No newline at end of file
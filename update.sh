@@ -19,6 +19,9 @@ APP_DIR="/opt/geoTime"  # Updated to match production server location
 BACKEND_DIR="$APP_DIR/backend"
 FRONTEND_DIR="$APP_DIR/frontend"
 SERVICE_NAME="geotime"
+REPORT_SERVICE_NAME="geotime-report-jobs"
+DRAIN_SERVICE_NAME="geotime-summary-drain"
+STREAM_SERVICE_NAME="geotime-stream"
 DOMAIN="iais.online"  # Updated to match production domain
 BACKUP_DIR="/opt/geoTime/backups"  # Updated to match production server location
 
@@ -153,6 +156,13 @@ update_backend() {
         print_success "No pending migrations"
     fi
     
+    # Create the shared cache table (no-op unless CACHE_URL is dbcache://)
+    python manage.py createcachetable
+    
+    # Backfill summary rollups (idempotent; reports read live data where rows are missing)
+    print_status "Rebuilding summary rollups..."
+    python manage.py rebuild_summary_rollups
+    
     # Collect static files
     print_status "Collecting static files..."
     python manage.py collectstatic --noinput
@@ -194,6 +204,10 @@ restart_services() {
     print_status "Restarting backend service..."
     sudo systemctl restart $SERVICE_NAME
     
+    # Restart the background workers and the stream server (they run the updated code)
+    print_status "Restarting background workers..."
+    sudo systemctl restart $REPORT_SERVICE_NAME $DRAIN_SERVICE_NAME $STREAM_SERVICE_NAME
+    
     # Wait a moment for service to start
     sleep 5
     